@@ -0,0 +1,303 @@
+"""
+Simulator throughput suite: how fast we can evaluate, not how well we drive.
+
+Every measurement uses a fixed scripted policy, so no LLM (and no API key) is needed:
+- env_steps_per_s: env.step() with friction-aware vehicles (Rain);
+- primitives_updates_per_s / sensor_calls_per_s: LLMDriverPrimitives on recorded observations;
+- policy_calls_per_s / batched_policy_calls_per_s: one policy step per scenario, each
+  call under its own alarm, and as run_scenario_batch evaluates same-policy views
+  (one alarm_window per group of --policy-batch);
+- scenarios_per_hour_headless / _recording: run_single_scenario end to end;
+- peak_rss_mb: peak resident memory of the whole suite.
+
+Results are written as JSON and compared against a stored baseline; any metric more
+than --tolerance worse than the baseline is reported and the exit code is 1.
+
+Usage:
+    python benchmarks/perf_suite.py                     # run and compare
+    python benchmarks/perf_suite.py --update-baseline   # run and store as the new baseline
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+import run_benchmark
+from lmp_driver import logger as bench_logger
+from lmp_driver.envs.adapters import apply_weather_friction, make_lmp_driver_env
+from lmp_driver.envs.pool import EnvPool
+from lmp_driver.executor import PolicyExecutor, alarm_window
+from lmp_driver.primitives import LLMDriverPrimitives
+from lmp_driver.results_store import write_json_atomic
+
+BASELINE_FILE = os.path.join(REPO_ROOT, "benchmarks", "perf_baseline.json")
+RESULTS_FILE = os.path.join("results", "perf_results.json")
+DATASET_PATH = os.path.join(REPO_ROOT, "dataset", "LaMPilot-Bench.json")
+ENV_ID = "highway-v0"
+
+# Metric -> True if higher is better
+METRICS = {
+    "env_steps_per_s": True,
+    "primitives_updates_per_s": True,
+    "sensor_calls_per_s": True,
+    "policy_calls_per_s": True,
+    "batched_policy_calls_per_s": True,
+    "scenarios_per_hour_headless": True,
+    "scenarios_per_hour_recording": True,
+    "peak_rss_mb": False,
+}
+
+SCRIPTED_POLICY = '''def policy(api):
+    dist = api.get_distance_to_lead()
+    if dist < 0.15:
+        api.slow_down()
+    elif dist < 0.3 and api.get_relative_speed_to_lead() > 0:
+        if api.is_lane_free("left"):
+            api.change_lane_left()
+        elif api.is_lane_free("right"):
+            api.change_lane_right()
+        else:
+            api.slow_down()
+    elif api.get_ego_speed() < 0.8:
+        api.speed_up()
+    else:
+        api.keep_speed()
+'''
+
+
+class ScriptedAgent:
+    """Stands in for LLMAgent: every scenario gets SCRIPTED_POLICY, instantly."""
+
+    last_cache_hit = None
+    last_call_latency = None
+
+    def generate_policy(self, instruction, env_info):
+        return SCRIPTED_POLICY
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """Runs the block inside a temporary directory (scenario logs and videos land there)."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="perf_suite_") as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
+
+
+def measure_env_steps(n_steps, seed=0):
+    """Returns (steps per second, observations seen) for IDLE steps on a rainy road."""
+    env = make_lmp_driver_env(ENV_ID, density=1.5)
+    obs, info = env.reset(seed=seed)
+    apply_weather_friction(env, "Rain")
+    observations = [obs]
+
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        obs, reward, done, truncated, info = env.step(1)
+        observations.append(obs)
+        if done or truncated:
+            seed += 1
+            obs, info = env.reset(seed=seed)
+            apply_weather_friction(env, "Rain")
+    elapsed = time.perf_counter() - start
+
+    env.close()
+    return n_steps / elapsed, observations
+
+
+def measure_primitives(observations, repeats):
+    """Returns (update() calls per second, sensor calls per second) over recorded observations."""
+    primitives = LLMDriverPrimitives(env=None)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for obs in observations:
+            primitives.update(obs)
+    updates_per_s = repeats * len(observations) / (time.perf_counter() - start)
+
+    sensors = (
+        primitives.get_ego_speed,
+        primitives.get_distance_to_lead,
+        primitives.get_relative_speed_to_lead,
+        lambda: primitives.is_lane_free("left"),
+        lambda: primitives.is_lane_free("right"),
+    )
+    calls = 0
+    elapsed = 0.0
+    for _ in range(repeats):
+        for obs in observations:
+            primitives.update(obs)
+            start = time.perf_counter()
+            for sensor in sensors:
+                sensor()
+            elapsed += time.perf_counter() - start
+            calls += len(sensors)
+    return updates_per_s, calls / elapsed
+
+
+def measure_policy_calls(observations, repeats, batch_size):
+    """
+    Returns (calls per second one at a time, calls per second grouped) for SCRIPTED_POLICY
+    over batch_size views loaded with the recorded observations. Only the policy calls are timed.
+    """
+    views = [LLMDriverPrimitives(env=None) for _ in range(batch_size)]
+    executors = [PolicyExecutor(SCRIPTED_POLICY) for _ in range(batch_size)]
+    elapsed = {False: 0.0, True: 0.0}
+    try:
+        for _ in range(repeats):
+            for obs in observations:
+                for view in views:
+                    view.update(obs)
+                for grouped in (False, True):
+                    start = time.perf_counter()
+                    with alarm_window(batch_size if grouped else 0):
+                        for view, executor in zip(views, executors):
+                            view.decide(executor)
+                    elapsed[grouped] += time.perf_counter() - start
+    finally:
+        for executor in executors:
+            executor.close()
+    calls = repeats * len(observations) * batch_size
+    return calls / elapsed[False], calls / elapsed[True]
+
+
+def measure_scenarios(scenarios, record_video):
+    """Scenarios per hour through run_single_scenario with the scripted policy."""
+    agent = ScriptedAgent()
+    env_pool = EnvPool()
+    with scratch_dir() as path:
+        video_folder = os.path.join(path, "videos")
+        start = time.perf_counter()
+        for scenario in scenarios:
+            run_benchmark.run_single_scenario(scenario, video_folder, agent, record_video=record_video,
+                                              env_pool=env_pool)
+        elapsed = time.perf_counter() - start
+        run_benchmark.flush_logs()
+    env_pool.close()
+    return len(scenarios) * 3600.0 / elapsed
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def run_suite(args):
+    with open(DATASET_PATH, 'r') as f:
+        scenarios = json.load(f)
+
+    metrics = {}
+    print(f"⏱️ env.step x {args.env_steps}...")
+    metrics["env_steps_per_s"], observations = measure_env_steps(args.env_steps)
+
+    print(f"⏱️ LLMDriverPrimitives x {args.sensor_repeats} passes over {len(observations)} observations...")
+    metrics["primitives_updates_per_s"], metrics["sensor_calls_per_s"] = measure_primitives(
+        observations, args.sensor_repeats
+    )
+
+    print(f"⏱️ Policy calls x {args.sensor_repeats} passes, {args.policy_batch} views...")
+    metrics["policy_calls_per_s"], metrics["batched_policy_calls_per_s"] = measure_policy_calls(
+        observations, args.sensor_repeats, args.policy_batch
+    )
+
+    print(f"⏱️ {args.scenarios} scenarios headless...")
+    metrics["scenarios_per_hour_headless"] = measure_scenarios(scenarios[:args.scenarios], record_video=False)
+
+    print(f"⏱️ {args.recorded_scenarios} scenarios recording video...")
+    metrics["scenarios_per_hour_recording"] = measure_scenarios(scenarios[:args.recorded_scenarios],
+                                                                record_video=True)
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return {name: round(value, 2) for name, value in metrics.items()}
+
+
+def compare(metrics, baseline, tolerance):
+    """Returns the list of (metric, baseline, current, change) more than `tolerance` worse than the baseline."""
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        reference = baseline.get(name)
+        if not reference or name not in metrics:
+            continue
+        change = (metrics[name] - reference) / reference
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append((name, reference, metrics[name], change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure simulator throughput and compare with a baseline.")
+    parser.add_argument("--env-steps", type=int, default=500)
+    parser.add_argument("--sensor-repeats", type=int, default=20)
+    parser.add_argument("--policy-batch", type=int, default=8,
+                        help="Same-policy views per group for the batched policy calls.")
+    parser.add_argument("--scenarios", type=int, default=10, help="Scenarios for the headless run.")
+    parser.add_argument("--recorded-scenarios", type=int, default=3, help="Scenarios for the recording run.")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to write this run's metrics (JSON).")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown (or memory growth) before a metric counts as a regression.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run's metrics as the new baseline instead of comparing.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bench_logger.set_level("warning")
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "metrics": run_suite(args),
+    }
+    write_json_atomic(args.output, report)
+    print(f"    💾 Perf results saved to {args.output}")
+
+    print("\n" + "=" * 40)
+    for name, value in report["metrics"].items():
+        print(f"  {name:<30} {value:>12,.2f}")
+    print("=" * 40)
+
+    if args.update_baseline:
+        write_json_atomic(args.baseline, report)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)["metrics"]
+
+    regressions = compare(report["metrics"], baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ No regression beyond {args.tolerance:.0%} of the baseline.")
+        return 0
+
+    print(f"❌ {len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}:")
+    for name, reference, current, change in regressions:
+        print(f"    {name}: {reference:,.2f} -> {current:,.2f} ({change:+.1%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
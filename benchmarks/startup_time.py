@@ -0,0 +1,141 @@
+"""
+Startup benchmark: what a fresh process pays before it does any work.
+
+Every worker process and every single-scenario debug run starts cold, so import
+time adds up. Reports:
+- import_run_benchmark_s: `import run_benchmark`, from `python -X importtime`
+  (best of --repeats fresh interpreters), with the heaviest modules;
+- eagerly loaded heavy dependencies: any of HEAVY_MODULES imported by that import
+  alone (they should only load in the processes that use them);
+- first_step_s: `run_benchmark.py run-one <id>` with the mock backend, time from
+  process start to the first env.step(), and the whole command's wall time.
+
+The exit code is 1 if a heavy dependency is imported eagerly.
+
+Usage: python benchmarks/startup_time.py [--scenario ID] [--repeats N] [--top K] [--output FILE]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from lmp_driver.results_store import write_json_atomic
+
+DATASET_PATH = os.path.join(REPO_ROOT, "dataset", "LaMPilot-Bench.json")
+RESULTS_FILE = os.path.join("results", "startup_results.json")
+
+# Dependencies a process should only import once it needs them
+HEAVY_MODULES = ("openai", "httpx", "dotenv", "gymnasium", "highway_env", "moviepy", "matplotlib", "scipy")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+FIRST_STEP_LINE = re.compile(r"First env\.step after ([\d.]+)s")
+
+
+def import_times(module="run_benchmark"):
+    """
+    Imports `module` in a fresh interpreter under -X importtime.
+    Returns {module name: (self_s, cumulative_s, depth)} for every module it loaded.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2)
+    return modules
+
+
+def measure_imports(repeats, top):
+    """Best-of-`repeats` import of run_benchmark: (total s, heaviest top-level modules, eager heavy modules)."""
+    best = None
+    for _ in range(repeats):
+        modules = import_times()
+        if best is None or modules["run_benchmark"][1] < best["run_benchmark"][1]:
+            best = modules
+
+    # importtime lists a module after its imports: run_benchmark's direct imports are the depth-1
+    # entries since the previous top-level one (anything earlier was loaded by site, not by us)
+    children = []
+    for name, (_, cumulative, depth) in reversed(list(best.items())[:list(best).index("run_benchmark")]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, cumulative))
+    children.sort(key=lambda item: -item[1])
+    eager = sorted(name for name in HEAVY_MODULES if name in best)
+    return best["run_benchmark"][1], children[:top], eager
+
+
+def measure_first_step(scenario_id):
+    """Runs `run-one` (mock backend, no policy cache) in a scratch dir: (first env.step s, wall s)."""
+    with tempfile.TemporaryDirectory(prefix="startup_time_") as path:
+        # A copy of the dataset, so its .jsonl index is built in the scratch dir rather than the repo
+        dataset = shutil.copy(DATASET_PATH, path)
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, os.path.join(REPO_ROOT, "run_benchmark.py"), "run-one", str(scenario_id),
+             "--dataset", dataset, "--llm-backend", "mock", "--no-policy-cache", "--log-level", "warning"],
+            cwd=path, capture_output=True, text=True, check=True
+        )
+        wall = time.perf_counter() - start
+
+    match = FIRST_STEP_LINE.search(completed.stdout)
+    if match is None:
+        raise RuntimeError(f"run-one did not report its first step:\n{completed.stdout}\n{completed.stderr}")
+    return float(match.group(1)), wall
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time to the first env.step().")
+    parser.add_argument("--scenario", default="100", help="Scenario id for the run-one measurement.")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters for the import measurement.")
+    parser.add_argument("--top", type=int, default=10, help="How many of the heaviest imports to list.")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to write the metrics (JSON).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f"⏱️ import run_benchmark x {args.repeats}...")
+    import_s, heaviest, eager = measure_imports(args.repeats, args.top)
+    print(f"⏱️ run-one {args.scenario}...")
+    first_step_s, run_one_wall_s = measure_first_step(args.scenario)
+
+    metrics = {
+        "import_run_benchmark_s": round(import_s, 4),
+        "first_step_s": round(first_step_s, 4),
+        "run_one_wall_s": round(run_one_wall_s, 4),
+        "heaviest_imports": {name: round(seconds, 4) for name, seconds in heaviest},
+        "eager_heavy_modules": eager,
+    }
+    write_json_atomic(args.output, metrics)
+    print(f"    💾 Startup results saved to {args.output}")
+
+    print("\n" + "=" * 40)
+    print(f"  {'import run_benchmark':<30} {import_s:>10.3f}s")
+    print(f"  {'run-one: first env.step':<30} {first_step_s:>10.3f}s")
+    print(f"  {'run-one: whole command':<30} {run_one_wall_s:>10.3f}s")
+    print("  Heaviest imports:")
+    for name, seconds in heaviest:
+        print(f"    {name:<28} {seconds:>10.3f}s")
+    print("=" * 40)
+
+    if eager:
+        print(f"❌ Heavy dependencies imported eagerly by run_benchmark: {', '.join(eager)}")
+        return 1
+    print("✅ No heavy dependency is imported eagerly.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
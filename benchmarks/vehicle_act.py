@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: cost of vehicle act() with weather friction, before and after.
+
+act() runs for every vehicle at every simulation substep, so its overhead is paid
+(vehicles x substeps) times per env.step(). Reports, per act() call:
+- the friction step alone (grip limit on the action dict), previous np.clip
+  implementation vs. lmp_driver.vehicle's;
+- the whole act(), for plain highway-env traffic and both implementations.
+
+Usage: python benchmarks/vehicle_act.py [--calls N] [--repeats R] [--weather Rain]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from highway_env.vehicle.behavior import IDMVehicle
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.envs.adapters import make_lmp_driver_env
+from lmp_driver.vehicle import FrictionIDMVehicle, weather_friction
+
+
+class ClipFrictionIDMVehicle(FrictionIDMVehicle):
+    """The previous PhysicsVehicle.act, applied to traffic: np.clip on every call."""
+
+    def act(self, action=None):
+        IDMVehicle.act(self, action)
+        if self.action is not None:
+            self._apply_grip_limit()
+
+    def _apply_grip_limit(self):
+        current_accel = self.action.get('acceleration', 0)
+        max_grip_accel = 5.0 * self.friction
+        self.action['acceleration'] = np.clip(current_accel, -max_grip_accel, max_grip_accel)
+        if 'steering' in self.action:
+            self.action['steering'] *= self.friction
+
+
+def best_per_call(fn, vehicles, calls, repeats):
+    """Fastest of `repeats` runs, in seconds per call, round-robin over `vehicles`."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(calls):
+            fn(vehicles[i % len(vehicles)])
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time vehicle act() with and without friction.")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--weather", default="Rain")
+    args = parser.parse_args(argv)
+
+    env = make_lmp_driver_env("highway-v0", density=1.5)
+    env.reset(seed=0)
+    traffic = [v for v in env.unwrapped.road.vehicles if isinstance(v, IDMVehicle)]
+    friction = weather_friction(args.weather)
+
+    def convert(cls, friction):
+        vehicles = [cls.create_from(v) for v in traffic]
+        for v in vehicles:
+            v.set_friction(friction)
+            v.act()  # Fills v.action
+        return vehicles
+
+    clip_vehicles = convert(ClipFrictionIDMVehicle, friction)
+    fast_vehicles = convert(FrictionIDMVehicle, friction)
+    plain_vehicles = [IDMVehicle.create_from(v) for v in traffic]
+    dry_vehicles = convert(FrictionIDMVehicle, 1.0)
+
+    def grip_limit(v):
+        v._apply_grip_limit()
+
+    def act(v):
+        v.act()
+
+    print(f"{len(traffic)} vehicles, weather {args.weather} (friction {friction}), "
+          f"best of {args.repeats} x {args.calls} calls")
+
+    print("Friction step only:")
+    before = best_per_call(grip_limit, clip_vehicles, args.calls * 10, args.repeats)
+    after = best_per_call(grip_limit, fast_vehicles, args.calls * 10, args.repeats)
+    print(f"  {'np.clip (before)':<28} {before * 1e6:8.3f} us/call")
+    print(f"  {'min/max (after)':<28} {after * 1e6:8.3f} us/call  ({before / after:.1f}x faster)")
+
+    print("Whole act():")
+    for name, vehicles in [
+        ("IDMVehicle (no friction)", plain_vehicles),
+        ("np.clip (before)", clip_vehicles),
+        ("min/max (after)", fast_vehicles),
+        ("min/max, dry road", dry_vehicles),
+    ]:
+        print(f"  {name:<28} {best_per_call(act, vehicles, args.calls, args.repeats) * 1e6:8.2f} us/call")
+
+    env.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
+import argparse
+import contextlib
+import functools
+import itertools
 import json
 import random
 import os
+from multiprocessing import Pool
+
+from lmp_driver.dataset import DatasetWriter, shard_path, write_dataset
 
 OUTPUT_FILE = "dataset/LaMPilot-Bench.json"
 NUM_SAMPLES = 400
+DATASET_SEED = 2024  # Same seed -> same dataset, including every scenario's env seed
+CHUNK_SIZE = 2048  # Samples per parallel work unit. Part of what a seed means: changing it changes the dataset
+SAMPLING_MODES = ("stratified", "lhs", "random")
 
 SCENARIOS = ["highway-fast-v0", "highway-v0"]
 
@@ -49,6 +59,14 @@ INSTRUCTIONS = {
     ]
 }
 
+CATEGORY_POOL = ["aggressive", "cautious", "neutral", "contextual"]
+# Bias towards harder scenarios for benchmark
+CATEGORY_WEIGHTS = [0.3, 0.2, 0.2, 0.3]
+CATEGORY_SLOTS = [3, 2, 2, 3]  # CATEGORY_WEIGHTS as whole samples per grid cell, for stratified rounds
+
+# Factors the stratified and LHS samplers balance, in sample order
+GRID = (SCENARIOS, WEATHER_CONDITIONS, TIME_OF_DAY, DENSITIES, CATEGORY_POOL)
+
 
 def determine_risk(category, weather, density):
     """
@@ -81,39 +99,26 @@ def determine_risk(category, weather, density):
         return "Low"
 
 
-def generate_sample(sample_id):
-    weather = random.choice(WEATHER_CONDITIONS)
-    time_day = random.choice(TIME_OF_DAY)
-    density = random.choice(DENSITIES)
-    scenario = random.choice(SCENARIOS)
-
-    category_pool = ["aggressive", "cautious", "neutral", "contextual"]
-    # Bias towards harder scenarios for benchmark
-    weights = [0.3, 0.2, 0.2, 0.3]
-    category = random.choices(category_pool, weights=weights, k=1)[0]
-
+def instruction_pool(category, weather, time_day):
+    """(instruction texts, actual intent) a category draws from under these conditions."""
     if category == "contextual":
         if weather in ["Rain", "Snow"]:
-            text = random.choice(INSTRUCTIONS["rain_specific"])
-            actual_intent = "cautious"  # These are actually safe instructions
+            return INSTRUCTIONS["rain_specific"], "cautious"  # These are actually safe instructions
         elif time_day == "Night":
-            text = random.choice(INSTRUCTIONS["night_specific"])
-            actual_intent = "cautious"
+            return INSTRUCTIONS["night_specific"], "cautious"
         else:
-            text = random.choice(INSTRUCTIONS["neutral"])
-            actual_intent = "neutral"
-    else:
-        text = random.choice(INSTRUCTIONS[category])
-        actual_intent = category
+            return INSTRUCTIONS["neutral"], "neutral"
+    return INSTRUCTIONS[category], category
 
-    expected_risk = determine_risk(actual_intent, weather, density)
 
+def make_sample(sample_id, scenario, weather, time_day, density, text, actual_intent, seed):
     return {
         "id": str(sample_id),
         "scenario": scenario,
         "instruction": text,
         "intent_category": actual_intent,  # Useful for analysis
-        "expected_risk": expected_risk,  # New Field
+        "expected_risk": determine_risk(actual_intent, weather, density),  # New Field
+        "seed": seed,  # Passed to env.reset() so the traffic is reproducible
         "environment": {
             "weather": weather,
             "time_of_day": time_day,
@@ -122,25 +127,234 @@ def generate_sample(sample_id):
     }
 
 
-def main():
-    print(f"Generating {NUM_SAMPLES} benchmark samples...")
+def generate_sample(sample_id, rng=random):
+    weather = rng.choice(WEATHER_CONDITIONS)
+    time_day = rng.choice(TIME_OF_DAY)
+    density = rng.choice(DENSITIES)
+    scenario = rng.choice(SCENARIOS)
+    category = rng.choices(CATEGORY_POOL, weights=CATEGORY_WEIGHTS, k=1)[0]
+
+    texts, actual_intent = instruction_pool(category, weather, time_day)
+    text = rng.choice(texts)
+    return make_sample(sample_id, scenario, weather, time_day, density, text, actual_intent, rng.randrange(2 ** 31))
+
+
+@functools.lru_cache(maxsize=None)
+def distinct_prompts():
+    """How many different prompt_key()s the GRID and INSTRUCTIONS can produce (every sampler draws from them)."""
+    keys = set()
+    for scenario, weather, time_day, density, category in itertools.product(*GRID):
+        texts, _ = instruction_pool(category, weather, time_day)
+        keys.update((scenario, text, weather, time_day, density) for text in texts)
+    return len(keys)
+
+
+def min_per_prompt(num_samples):
+    """The smallest max_per_prompt that leaves room for num_samples samples."""
+    return -(-num_samples // distinct_prompts())
+
+
+def prompt_key(sample):
+    """
+    Samples with the same key get the same LLM prompt (instruction and context) on the
+    same road type; they differ at most in their traffic seed.
+    """
+    env = sample["environment"]
+    return sample["scenario"], sample["instruction"], env["weather"], env["time_of_day"], env["density"]
+
+
+@functools.lru_cache(maxsize=None)
+def _round_slots(seed, round_index):
+    """
+    Sampling order of one stratified round: every grid cell once (shuffled), then the
+    cells whose category has more CATEGORY_SLOTS again, pass by pass. Any prefix of a
+    round is therefore spread over the grid before any cell repeats. Entries are
+    (cell, visit of that cell within the round, visits per round).
+    """
+    rng = random.Random(f"{seed}:round:{round_index}")
+    order = []
+    for visit in range(max(CATEGORY_SLOTS)):
+        cells = [cell for cell in itertools.product(*GRID) if CATEGORY_SLOTS[CATEGORY_POOL.index(cell[-1])] > visit]
+        rng.shuffle(cells)
+        order.extend((cell, visit, CATEGORY_SLOTS[CATEGORY_POOL.index(cell[-1])]) for cell in cells)
+    return order
+
+
+@functools.lru_cache(maxsize=None)
+def _text_rotation(seed, cell, n_texts):
+    """Shuffled order in which a grid cell cycles through its instruction texts."""
+    order = list(range(n_texts))
+    random.Random(f"{seed}:texts:{cell}").shuffle(order)
+    return order
+
+
+def _balanced(values, slots, n, rng):
+    """n values in random order, each appearing in proportion to its slots (LHS strata of one factor)."""
+    pattern = [value for value, k in zip(values, slots) for _ in range(k)]
+    rng.shuffle(pattern)  # So the leftover of a partial repeat is not always the same values
+    column = (pattern * (n // len(pattern) + 1))[:n]
+    rng.shuffle(column)
+    return column
+
+
+def generate_chunk(seed, sampling, chunk_index):
+    """
+    Samples chunk_index * CHUNK_SIZE ... + CHUNK_SIZE (without ids), depending only on
+    (seed, sampling, chunk_index), so chunks can be generated in any process and order.
+    - stratified: consecutive rounds each cover the whole GRID, categories weighted by
+      CATEGORY_SLOTS; each cell rotates through its instruction texts across visits.
+    - lhs: Latin hypercube over the categorical factors: within a chunk every factor's
+      levels appear in proportion (CATEGORY_WEIGHTS for the category), independently shuffled.
+    - random: independent draws, as generate_sample().
+    """
+    # Chunk 0 of a seed continues random.Random(seed), the original single-stream generator
+    rng = random.Random(seed if chunk_index == 0 else f"{seed}:{chunk_index}")
+
+    if sampling == "random":
+        return [generate_sample(None, rng) for _ in range(CHUNK_SIZE)]
+
+    if sampling == "lhs":
+        slots = [[1] * len(values) for values in GRID[:-1]] + [CATEGORY_SLOTS]
+        columns = [_balanced(values, k, CHUNK_SIZE, rng) for values, k in zip(GRID, slots)]
+        samples = []
+        for scenario, weather, time_day, density, category in zip(*columns):
+            texts, actual_intent = instruction_pool(category, weather, time_day)
+            samples.append(make_sample(None, scenario, weather, time_day, density, rng.choice(texts),
+                                       actual_intent, rng.randrange(2 ** 31)))
+        return samples
+
+    round_size = len(_round_slots(seed, 0))
+    first = chunk_index * CHUNK_SIZE
+    samples = []
+    for i in range(first, first + CHUNK_SIZE):
+        round_index, position = divmod(i, round_size)
+        cell, visit, visits_per_round = _round_slots(seed, round_index)[position]
+        scenario, weather, time_day, density, category = cell
+        texts, actual_intent = instruction_pool(category, weather, time_day)
+        rotation = _text_rotation(seed, cell, len(texts))
+        text = texts[rotation[(round_index * visits_per_round + visit) % len(texts)]]
+        samples.append(make_sample(None, scenario, weather, time_day, density, text, actual_intent,
+                                   rng.randrange(2 ** 31)))
+    return samples
+
+
+def _generate_chunk_job(job):
+    return generate_chunk(*job)
+
+
+def iter_samples(num_samples, sampling="stratified", seed=DATASET_SEED, workers=1, max_per_prompt=1, start_id=100):
+    """
+    Streams num_samples samples with consecutive ids from start_id, in chunk order, so
+    the output depends on (seed, sampling, max_per_prompt) but not on workers.
+
+    max_per_prompt: keep at most this many samples per prompt_key() (each with its own
+    traffic seed); 0 keeps duplicates. Duplicates are replaced by the next samples in
+    the stream. Raises ValueError if num_samples cannot fit (see min_per_prompt()), or
+    if the sampler stops finding prompts with room left before num_samples are produced.
+    """
+    if max_per_prompt and num_samples > max_per_prompt * distinct_prompts():
+        raise ValueError(f"{num_samples} samples need --max-per-prompt {min_per_prompt(num_samples)} or more: "
+                         f"there are only {distinct_prompts()} distinct prompts.")
+
+    per_prompt = {}
+    kept = 0
+    wave = max(workers, 1) * 4  # Chunks in flight; a bounded wave keeps imap from running ahead forever
+
+    pool = Pool(processes=workers) if workers > 1 else None
+    try:
+        for first_chunk in itertools.count(0, wave):
+            jobs = [(seed, sampling, c) for c in range(first_chunk, first_chunk + wave)]
+            chunks = pool.imap(_generate_chunk_job, jobs) if pool else map(_generate_chunk_job, jobs)
+            kept_before = kept
+            for chunk in chunks:
+                for sample in chunk:
+                    if max_per_prompt:
+                        key = prompt_key(sample)
+                        if per_prompt.get(key, 0) >= max_per_prompt:
+                            continue
+                        per_prompt[key] = per_prompt.get(key, 0) + 1
+                    sample["id"] = str(start_id + kept)
+                    kept += 1
+                    yield sample
+                    if kept == num_samples:
+                        return
+            if kept == kept_before:
+                raise ValueError(f"The {sampling} sampler found only {kept} of {num_samples} samples within "
+                                 f"--max-per-prompt {max_per_prompt}; raise it.")
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def write_samples(samples, path, num_shards=1):
+    """
+    Streams samples into `path` (JSON Lines + index), or round-robin into num_shards
+    files named by shard_path(); round-robin keeps each shard's grid coverage balanced.
+    Returns the written paths.
+    """
+    if num_shards == 1:
+        write_dataset(samples, path)
+        return [path]
+
+    paths = [shard_path(path, i, num_shards) for i in range(num_shards)]
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(DatasetWriter(shard_file)) for shard_file in paths]
+        for i, sample in enumerate(samples):
+            writers[i % num_shards].write(sample)
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate LaMPilot-Bench scenarios.")
+    parser.add_argument("--num-samples", "-n", type=int, default=NUM_SAMPLES)
+    parser.add_argument("--seed", type=int, default=DATASET_SEED,
+                        help="Dataset seed; with --sampling and --max-per-prompt it fixes every scenario and env seed.")
+    parser.add_argument("--sampling", choices=SAMPLING_MODES, default="stratified",
+                        help="stratified: whole weather x time x density x intent grid per round (default); "
+                             "lhs: balanced marginals per chunk; random: independent draws.")
+    parser.add_argument("--max-per-prompt", type=int, default=None,
+                        help="Keep at most this many scenarios per distinct prompt and road (each with its own "
+                             "traffic seed); 0 keeps duplicates. Default: the fewest that fit --num-samples "
+                             f"({distinct_prompts()} distinct prompts: 1 up to that many samples, then 2, ...).")
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating chunks in parallel.")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="A .json path also writes the JSON array (in memory) next to the indexed .jsonl; "
+                             "a .jsonl path streams to the indexed format only.")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split a .jsonl output into this many indexed files (<name>.shard{i}of{N}.jsonl).")
+    args = parser.parse_args(argv)
+    if args.shards > 1 and args.output.endswith(".json"):
+        parser.error("--shards needs a .jsonl --output.")
+    if args.max_per_prompt is None:
+        args.max_per_prompt = min_per_prompt(args.num_samples)
+    elif args.max_per_prompt and args.num_samples > args.max_per_prompt * distinct_prompts():
+        parser.error(f"--num-samples {args.num_samples} needs --max-per-prompt {min_per_prompt(args.num_samples)} "
+                     f"or more (or 0): there are only {distinct_prompts()} distinct prompts.")
+    return args
 
-    data = []
-    start_id = 100
 
-    for i in range(NUM_SAMPLES):
-        sample = generate_sample(start_id + i)
-        data.append(sample)
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Generating {args.num_samples} benchmark samples ({args.sampling}, seed {args.seed}, "
+          f"{args.workers} worker(s))...")
 
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    samples = iter_samples(args.num_samples, args.sampling, args.seed, args.workers, args.max_per_prompt)
 
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    if args.output.endswith(".json"):
+        data = list(samples)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2)
+        indexed_output = os.path.splitext(args.output)[0] + ".jsonl"  # Same scenarios, for open_dataset
+        write_dataset(data, indexed_output)
+        print(f"✅ Successfully created {args.output} and {indexed_output}")
+        print("Sample Output:")
+        print(json.dumps(data[:2], indent=2))
+        return
 
-    print(f"✅ Successfully created {OUTPUT_FILE}")
-    print("Sample Output:")
-    print(json.dumps(data[:2], indent=2))
+    paths = write_samples(samples, args.output, args.shards)
+    print(f"✅ Successfully created {', '.join(paths)}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
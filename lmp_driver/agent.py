@@ -1,65 +1,162 @@
-import os
 import re
+import time
 
-import dotenv
-from openai import OpenAI
-
+from lmp_driver.backends import GROQ_BASE_URL, make_backend
+from lmp_driver.logger import get_logger
 from lmp_driver.prompts import SYSTEM_PROMPT
 
-dotenv.load_dotenv()
+
+def build_context_str(instruction, env_info):
+    """Renders the user message sent alongside SYSTEM_PROMPT."""
+    return f"""
+        User Instruction: "{instruction}"
+        Current Environment:
+        - Weather: {env_info.get('weather', 'Clear')}
+        - Time: {env_info.get('time_of_day', 'Day')}
+        - Traffic Density: {env_info.get('density', 'Normal')}
+        """
+
+
+def clean_code(raw_text):
+    """
+    Extracts pure Python code from the LLM's response.
+    Handles cases where the LLM wraps code in markdown ```python ... ```
+    """
+    # Regex to find code inside ```python ... ``` or just ``` ... ```
+    code_match = re.search(r'```(?:python)?\n(.*?)```', raw_text, re.DOTALL)
+
+    if code_match:
+        return code_match.group(1).strip()
+
+    # We strip non-code conversational lines if they start with #
+    lines = [line for line in raw_text.split('\n') if
+             not line.strip().lower().startswith(('here', 'sure', 'i have'))]
+    return "\n".join(lines).strip()
 
 
 class LLMAgent:
     """
-    Real implementation using OpenAI API to generate driving policies.
+    Generates driving policies with an LLM backend (see lmp_driver.backends).
     """
 
-    def __init__(self, model_name="openai/gpt-oss-20b"):
-        api_key = os.getenv("GROQ_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is missing.")
+    def __init__(self, model_name="openai/gpt-oss-20b", policy_cache=None, api_key=None, base_url=GROQ_BASE_URL,
+                 max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0, backend=None,
+                 replay_source=None):
+        """
+        Create one agent per benchmark run and reuse it: the underlying HTTP client keeps
+        connections alive, so repeated calls skip the TCP/TLS handshake.
+        - policy_cache: optional PolicyCache. Identical prompts are then served from disk.
+        - max_connections / max_keepalive_connections / keepalive_expiry: httpx pool limits.
+        - backend: an LLMBackend; defaults to the Groq endpoint at base_url (the other
+          connection arguments only apply to that default).
+        - replay_source: for re-running an earlier run's episodes, "chat" or "batch", how
+          that run got its policies (generate_policy or generate_policies). generate_policy
+          then serves replies cached by either, that one first, before asking the backend,
+          so the episode re-runs the policy the run got rather than a fresh one.
+        """
+        if backend is None:
+            backend = make_backend("groq", model_name, base_url, api_key, max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+
+        self.backend = backend
+        self.model_name = backend.model_name or model_name
+        self.policy_cache = policy_cache
+        self.replay_source = replay_source
+        self.last_cache_hit = None  # True/False after generate_policy when a cache is attached
+        self.last_call_latency = None  # Seconds spent in the last chat completion (None if served from cache)
+        self.call_latencies = []
+
+    def close(self):
+        self.backend.close()
 
-        self.client = OpenAI(api_key=api_key, base_url="https://api.groq.com/openai/v1")
-        self.model_name = model_name
+    def _cache_key(self, context_str, batch=False):
+        if self.policy_cache is None:
+            return None
+        return self.policy_cache.make_key(self.model_name, SYSTEM_PROMPT, context_str,
+                                          self.backend.reply_source(batch))
+
+    def _lookup_keys(self, context_str):
+        """The cache keys generate_policy serves from, in order (see replay_source)."""
+        own = self._cache_key(context_str)
+        if self.replay_source is None:
+            return [own]
+        batch = self._cache_key(context_str, batch=True)
+        return list(dict.fromkeys([batch, own] if self.replay_source == "batch" else [own, batch]))
 
     def generate_policy(self, instruction, env_info):
         """
         env_info: dict containing weather, time, density
         """
-        context_str = f"""
-        User Instruction: "{instruction}"
-        Current Environment:
-        - Weather: {env_info.get('weather', 'Clear')}
-        - Time: {env_info.get('time_of_day', 'Day')}
-        - Traffic Density: {env_info.get('density', 'Normal')}
-        """
+        context_str = build_context_str(instruction, env_info)
 
-        print(f"Context Sent to LLM:\n{context_str}")
+        self.last_call_latency = None
 
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": context_str}
-            ],
-            temperature=0.0,
-            seed=42
-        )
+        cache_key = self._cache_key(context_str)
+        if cache_key is not None:
+            cached_code = next(filter(None, map(self.policy_cache.get, self._lookup_keys(context_str))), None)
+            self.last_cache_hit = cached_code is not None
+            if cached_code is not None:
+                get_logger().info("    Policy served from cache.")
+                return cached_code
 
-        return self._clean_code(response.choices[0].message.content)
+        get_logger().debug(f"Context Sent to LLM:\n{context_str}")
 
-    def _clean_code(self, raw_text):
+        start = time.perf_counter()
+        raw_text = self.backend.complete(SYSTEM_PROMPT, context_str)
+        self.last_call_latency = time.perf_counter() - start
+        self.call_latencies.append(self.last_call_latency)
+
+        policy_code = self._clean_code(raw_text)
+        if cache_key is not None:
+            self.policy_cache.put(cache_key, policy_code)
+
+        return policy_code
+
+    def generate_policies(self, jobs):
         """
-        Extracts pure Python code from the LLM's response.
-        Handles cases where the LLM wraps code in markdown ```python ... ```
+        Batch form of generate_policy. jobs: list of (instruction, env_info).
+        Cached prompts are answered from the cache; the remaining distinct contexts go
+        to the backend in a single complete_batch() call.
+        Returns one (policy_code, cache_hit, latency) per job, in order. The batch call is
+        one LLM call: its wall time is the latency of the first job it answered, and the
+        other jobs it answered get None (as do the ones served from the cache), so
+        latency statistics count calls, not scenarios.
         """
-        # Regex to find code inside ```python ... ``` or just ``` ... ```
-        code_match = re.search(r'```(?:python)?\n(.*?)```', raw_text, re.DOTALL)
+        contexts = [build_context_str(instruction, env_info) for instruction, env_info in jobs]
+
+        codes = {}
+        for context_str in contexts:
+            cache_key = self._cache_key(context_str, batch=True)
+            if cache_key is not None and context_str not in codes:
+                cached_code = self.policy_cache.get(cache_key)
+                if cached_code is not None:
+                    codes[context_str] = cached_code
+        cached = set(codes)
 
-        if code_match:
-            return code_match.group(1).strip()
+        pending = list(dict.fromkeys(c for c in contexts if c not in codes))  # Distinct, in order
+        latency = None
+        if pending:
+            get_logger().debug(f"Batch of {len(pending)} contexts sent to LLM.")
+            start = time.perf_counter()
+            replies = self.backend.complete_batch(SYSTEM_PROMPT, pending)
+            latency = time.perf_counter() - start
+            self.call_latencies.append(latency)
+            for context_str, raw_text in zip(pending, replies):
+                codes[context_str] = self._clean_code(raw_text)
+                cache_key = self._cache_key(context_str, batch=True)
+                if cache_key is not None:
+                    self.policy_cache.put(cache_key, codes[context_str])
 
-        # We strip non-code conversational lines if they start with #
-        lines = [line for line in raw_text.split('\n') if
-                 not line.strip().lower().startswith(('here', 'sure', 'i have'))]
-        return "\n".join(lines).strip()
+        cache_hit = None if self.policy_cache is None else False
+        policies = []
+        for c in contexts:
+            if c in cached:
+                policies.append((codes[c], True, None))
+            else:
+                policies.append((codes[c], cache_hit, latency))
+                latency = None
+        return policies
+
+    def _clean_code(self, raw_text):
+        return clean_code(raw_text)
@@ -0,0 +1,253 @@
+import functools
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+LOCAL_BASE_URL = "http://localhost:8000/v1"  # vLLM's default; llama.cpp's server listens on :8080/v1
+MOCK_MODEL_NAME = "mock-policy"
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Reads .env into os.environ, once per process, for the backends that need keys or URLs."""
+    import dotenv
+
+    dotenv.load_dotenv()
+
+
+class LLMBackend:
+    """
+    Where LLMAgent sends its prompts. A backend turns (system prompt, user context)
+    into the model's raw reply; cleaning, caching and logging stay in LLMAgent.
+    - complete(): one prompt.
+    - complete_batch(): many distinct contexts. The default answers them one by one;
+      backends override it with whatever the server does best.
+    - reply_source(): where replies come from, for PolicyCache keys.
+    Backends travel to worker processes with their agent, so they must pickle.
+    """
+
+    model_name = None
+
+    def reply_source(self, batch=False):
+        """
+        Identifies the server and request shape that answer complete() (or, with batch,
+        complete_batch()): replies from different ones are not interchangeable in a cache.
+        """
+        return type(self).__name__
+
+    def complete(self, system_prompt, context_str):
+        raise NotImplementedError
+
+    def complete_batch(self, system_prompt, contexts):
+        return [self.complete(system_prompt, context_str) for context_str in contexts]
+
+    def close(self):
+        pass
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any OpenAI-compatible chat endpoint: Groq (the default), or a local vLLM /
+    llama.cpp server.
+
+    complete_batch() sends concurrent chat requests over the keep-alive pool, or, with
+    batch_prompts=True, ONE completions request whose `prompt` is the list of
+    rendered contexts. vLLM and llama.cpp's server accept prompt lists and decode them
+    as one batch; hosted chat APIs such as Groq do not. That path skips the server's
+    chat template (see render_prompt), so it suits base or instruction-following
+    models served without one.
+    """
+
+    def __init__(self, model_name, base_url=GROQ_BASE_URL, api_key=None, batch_prompts=False, max_tokens=1024,
+                 max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0, api_key_env=None):
+        """api_key_env: where a missing api_key should have come from, for the error on first use."""
+        self.model_name = model_name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.batch_prompts = batch_prompts
+        self.max_tokens = max_tokens
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The OpenAI client, built on first use: openai and httpx are only imported by
+        processes that actually send a request (a run served from the policy cache never does),
+        and only they need a key.
+        """
+        if self._client is None:
+            if not self.api_key:
+                raise ValueError(f"{self.api_key_env or 'API key'} environment variable is missing.")
+            import httpx
+            from openai import DefaultHttpxClient, OpenAI
+
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            )
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=DefaultHttpxClient(limits=limits)
+            )
+        return self._client
+
+    def __getstate__(self):
+        # The HTTP client cannot cross process boundaries; each worker builds its own pool.
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def reply_source(self, batch=False):
+        if batch and self.batch_prompts:
+            return f"completions@{self.base_url}"  # Rendered prompts, no chat template: different replies
+        return chat_reply_source(self.base_url)
+
+    def complete(self, system_prompt, context_str):
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": context_str}
+            ],
+            temperature=0.0,
+            seed=42
+        )
+        return response.choices[0].message.content
+
+    def complete_batch(self, system_prompt, contexts):
+        if not contexts:
+            return []
+        if self.batch_prompts:
+            response = self.client.completions.create(
+                model=self.model_name,
+                prompt=[render_prompt(system_prompt, context_str) for context_str in contexts],
+                temperature=0.0,
+                seed=42,
+                max_tokens=self.max_tokens
+            )
+            choices = sorted(response.choices, key=lambda choice: choice.index)
+            return [_close_fence(choice.text) for choice in choices]
+
+        with ThreadPoolExecutor(max_workers=min(len(contexts), self.max_connections)) as pool:
+            return list(pool.map(lambda context_str: self.complete(system_prompt, context_str), contexts))
+
+
+def chat_reply_source(base_url):
+    """reply_source() of chat completions at base_url: shared with PolicyPrefetcher, which sends the same requests."""
+    return f"chat@{base_url}"
+
+
+def render_prompt(system_prompt, context_str):
+    """Plain-text stand-in for a chat template, for completions-endpoint batches."""
+    return f"{system_prompt.strip()}\n\n{context_str.strip()}\n\nPython policy:\n```python\n"
+
+
+def _close_fence(text):
+    """render_prompt() opens the code fence; give the reply both ends so clean_code() finds it."""
+    if "```" not in text:
+        text += "\n```"
+    return "```python\n" + text
+
+
+class MockBackend(LLMBackend):
+    """
+    Deterministic offline backend: no server, no key, no latency. Replies with a
+    fenced policy(api) whose gaps and target speed follow the context (cautious
+    wording, bad weather or night widen the gaps; hurry wording raises the speed),
+    so runs are reproducible and outcomes still vary across scenarios. The same
+    context always gets the same reply.
+    """
+
+    model_name = MOCK_MODEL_NAME
+
+    CAUTIOUS_WORDS = ("careful", "safe", "slow", "caution", "patient", "defensive", "slippery", "distance")
+    HURRY_WORDS = ("late", "fast", "overtake", "speed up", "aggressive", "step on it", "maximize", "make up time")
+
+    POLICY_TEMPLATE = '''```python
+def policy(api):
+    dist = api.get_distance_to_lead()
+    closing_speed = api.get_relative_speed_to_lead()
+
+    if dist < {min_gap} or closing_speed > {max_closing}:
+        api.slow_down()
+        return
+
+    if dist < {overtake_gap}:
+        if api.is_lane_free("left"):
+            api.change_lane_left()
+            return
+        if api.is_lane_free("right"):
+            api.change_lane_right()
+            return
+
+    if api.get_ego_speed() < {target_speed}:
+        api.speed_up()
+    else:
+        api.keep_speed()
+```'''
+
+    def complete(self, system_prompt, context_str):
+        instruction = re.search(r'User Instruction: "(.*)"', context_str)
+        instruction = instruction.group(1).lower() if instruction else ""
+        weather = re.search(r"Weather: (\w+)", context_str)
+        weather = weather.group(1) if weather else "Clear"
+
+        caution = sum(word in instruction for word in self.CAUTIOUS_WORDS)
+        caution += {"Rain": 1, "Foggy": 1, "Snow": 2, "Ice": 2}.get(weather, 0)
+        caution += "Time: Night" in context_str
+        hurry = sum(word in instruction for word in self.HURRY_WORDS)
+
+        # Small context-dependent jitter, so distinct prompts rarely share a policy
+        jitter = int(hashlib.sha256(context_str.encode("utf-8")).hexdigest()[:4], 16) % 5 * 0.01
+        min_gap = round(min(0.1 + 0.05 * caution + jitter, 0.45), 2)
+        return self.POLICY_TEMPLATE.format(
+            min_gap=min_gap,
+            max_closing=round(max(0.15 - 0.03 * caution, 0.02), 2),
+            overtake_gap=round(min_gap + 0.15, 2),
+            target_speed=round(min(max(0.7 + 0.1 * hurry - 0.1 * caution, 0.4), 1.0), 2),
+        )
+
+
+BACKENDS = ("groq", "local", "mock")
+
+
+def make_backend(name, model_name=None, base_url=None, api_key=None, **client_options):
+    """
+    Builds a backend by name:
+    - groq: the hosted endpoint; needs GROQ_KEY (or api_key) once a request is sent.
+    - local: an OpenAI-compatible server at base_url (LOCAL_LLM_BASE_URL, default
+      LOCAL_BASE_URL), batching with prompt lists. LOCAL_LLM_KEY if it wants one.
+    - mock: MockBackend.
+    The networked backends read .env first (see load_env()).
+    client_options go to OpenAICompatibleBackend (connection pool limits, max_tokens...).
+    """
+    if name == "mock":
+        return MockBackend()
+
+    load_env()
+    if name == "groq":
+        # Checked on the first request, not here: a run served from the policy cache needs no key
+        return OpenAICompatibleBackend(model_name, base_url or GROQ_BASE_URL, api_key or os.getenv("GROQ_KEY"),
+                                       api_key_env="GROQ_KEY", **client_options)
+
+    if name == "local":
+        base_url = base_url or os.getenv("LOCAL_LLM_BASE_URL", LOCAL_BASE_URL)
+        # The client insists on a key; local servers ignore it unless started with one
+        api_key = api_key or os.getenv("LOCAL_LLM_KEY", "local")
+        client_options.setdefault("batch_prompts", True)
+        return OpenAICompatibleBackend(model_name, base_url, api_key, **client_options)
+
+    raise ValueError(f"Unknown LLM backend {name!r}; expected one of {', '.join(BACKENDS)}.")
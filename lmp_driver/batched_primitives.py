@@ -0,0 +1,103 @@
+import numpy as np
+
+from lmp_driver.primitives import CURRENT, LANE_OFFSETS, LEFT, RIGHT, LLMDriverPrimitives
+
+
+def stack_observations(observations):
+    """
+    Stacks per-env Kinematics observations into one (K, N, 5) array. Envs that see
+    fewer vehicles (e.g. Night scenarios) are padded with all-zero rows, which have
+    presence 0 and are ignored like any other empty slot.
+    """
+    n_rows = max(obs.shape[0] for obs in observations)
+    batch = np.zeros((len(observations), n_rows, observations[0].shape[1]), dtype=observations[0].dtype)
+    for k, obs in enumerate(observations):
+        batch[k, :obs.shape[0]] = obs
+    return batch
+
+
+class BatchedLLMDriverPrimitives:
+    """
+    Perception for K environments stepped in lockstep.
+
+    update() takes a (K, N, 5) observation array and computes the sensor readings of
+    every env in one vectorized pass. The batch-wide readings are available as
+    arrays (get_ego_speeds(), get_distances_to_lead(), ...); views[k] is the
+    LLMDriverPrimitives the policy of env k runs against, loaded with exactly the
+    values LLMDriverPrimitives.update() would have computed on its own.
+    """
+
+    def __init__(self, envs):
+        self.envs = list(envs)
+        self.views = [LLMDriverPrimitives(env) for env in self.envs]
+        self.obs = None
+
+        k = len(self.envs)
+        self.lead_gap = np.ones((k, 3))
+        self.lead_rel_speed = np.zeros((k, 3))
+        self.lane_free = np.zeros((k, 3), dtype=bool)
+
+    def update(self, obs):
+        """obs: (K, N, 5) array, row 0 of each env being the ego car (see stack_observations)."""
+        self.obs = obs
+        ego = obs[:, 0]
+        neighbors = obs[:, 1:]
+        present = neighbors[:, :, 0] == 1
+        xs = neighbors[:, :, 1]
+        ys = neighbors[:, :, 2]
+
+        # (K, 3, N-1) lane assignment of every car: same windows as LLMDriverPrimitives
+        target_ys = ego[:, 2, None] + np.array(LANE_OFFSETS, dtype=obs.dtype)
+        in_lane = present[:, None, :] & (np.abs(ys[:, None, :] - target_ys[:, :, None]) < 0.1)
+        in_front = in_lane & (xs[:, None, :] > 0)
+
+        gaps = np.where(in_front, xs[:, None, :], np.inf).min(axis=2)
+        has_lead = in_front.any(axis=2)
+        first_lead = in_front.argmax(axis=2)
+        lead_vx = np.take_along_axis(neighbors[:, :, 3], first_lead, axis=1)
+        rel_speed = ego[:, 3, None] - lead_vx
+
+        blocked = (in_lane & (xs[:, None, :] > -0.3) & (xs[:, None, :] < 0.3)).any(axis=2)
+        on_road = (target_ys >= -0.05) & (target_ys <= 0.8)
+        lane_free = on_road & ~blocked
+
+        self.lead_gap = np.minimum(gaps, 1.0)
+        self.lead_rel_speed = np.where(has_lead, rel_speed, 0.0)
+        self.lane_free = lane_free
+
+        # Per-env views keep the scalar types of the single-env path (numpy scalars vs.
+        # Python floats), so policies do the same arithmetic in both modes.
+        for k, view in enumerate(self.views):
+            view.load_snapshot(
+                obs[k],
+                [gap if gap < 1.0 else 1.0 for gap in gaps[k]],
+                [rel_speed[k, i] if has_lead[k, i] else 0.0 for i in range(3)],
+                [bool(free) for free in lane_free[k]]
+            )
+
+    # --- PERCEPTION (one value per env) ---
+    def get_ego_speeds(self):
+        return self.obs[:, 0, 3]
+
+    def get_distances_to_lead(self):
+        return self.lead_gap[:, CURRENT]
+
+    def get_relative_speeds_to_lead(self):
+        return self.lead_rel_speed[:, CURRENT]
+
+    def are_lanes_free(self, direction):
+        return self.lane_free[:, RIGHT if direction == "right" else LEFT]
+
+    # --- ACTIONS ---
+    @property
+    def actions(self):
+        """The action each view's policy chose this step."""
+        return np.array([view.action for view in self.views])
+
+    @property
+    def safety_events(self):
+        totals = {}
+        for view in self.views:
+            for name, n in view.safety_events.items():
+                totals[name] = totals.get(name, 0) + n
+        return totals
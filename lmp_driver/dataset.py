@@ -0,0 +1,291 @@
+import json
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+INDEX_SUFFIX = ".index.npz"
+
+# Index column -> path of the field in a scenario record
+CATEGORICAL_FIELDS = {
+    "scenario": ("scenario",),
+    "weather": ("environment", "weather"),
+    "time_of_day": ("environment", "time_of_day"),
+    "intent": ("intent_category",),
+    "risk": ("expected_risk",),
+}
+NUMERIC_FIELDS = {
+    "density": ("environment", "density"),
+}
+
+
+def _field(scenario, path):
+    value = scenario
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _temp_beside(path):
+    """
+    Opens a new, uniquely named file in path's directory, to be renamed over path:
+    concurrent writers of the same path (e.g. shard conversions) never share one. Returns (file, its path).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.",
+                                    suffix=".tmp")
+    os.fchmod(fd, 0o644)  # Not mkstemp's 0600: the renamed file is an ordinary dataset file
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def shard_path(path, shard_index, num_shards):
+    """dataset/x.jsonl -> dataset/x.shard{i}of{N}.jsonl, matching run_benchmark's per-shard outputs."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_index}of{num_shards}{ext}"
+
+
+def write_dataset(scenarios, path):
+    """
+    Writes scenarios as JSON Lines (one compact record per line) plus the index next
+    to it, streaming: only the index columns are kept in memory. Returns the count.
+    """
+    with DatasetWriter(path) as writer:
+        for scenario in scenarios:
+            writer.write(scenario)
+    return len(writer)
+
+
+class DatasetWriter:
+    """
+    Incremental form of write_dataset(), for producers that cannot hand over a single
+    iterable (e.g. one writer per output shard). The file is written under a temporary
+    name and, with its index, only appears once the writer is closed without error.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file, self._tmp_path = _temp_beside(path)
+        self._builder = _IndexBuilder()
+
+    def __len__(self):
+        return len(self._builder)
+
+    def write(self, scenario):
+        line = (json.dumps(scenario) + "\n").encode("utf-8")
+        self._builder.add(scenario, self._file.tell(), len(line))
+        self._file.write(line)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        self._builder.save(index_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+def build_index(path):
+    """(Re)builds the index of an existing JSON Lines dataset with one pass over the file."""
+    builder = _IndexBuilder()
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                builder.add(json.loads(line), offset, len(line))
+            offset += len(line)
+    builder.save(index_path(path))
+    return len(builder)
+
+
+class _IndexBuilder:
+    def __init__(self):
+        self.ids = []
+        self.offsets = []
+        self.lengths = []
+        self.categorical = {name: [] for name in CATEGORICAL_FIELDS}
+        self.numeric = {name: [] for name in NUMERIC_FIELDS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, scenario, offset, length):
+        self.ids.append(str(scenario["id"]))
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        for name, field in CATEGORICAL_FIELDS.items():
+            value = _field(scenario, field)
+            self.categorical[name].append("" if value is None else str(value))
+        for name, field in NUMERIC_FIELDS.items():
+            value = _field(scenario, field)
+            self.numeric[name].append(np.nan if value is None else float(value))
+
+    def save(self, path):
+        columns = {
+            "ids": np.array(self.ids, dtype=str),
+            "offsets": np.array(self.offsets, dtype=np.int64),
+            "lengths": np.array(self.lengths, dtype=np.int32),
+        }
+        for name, values in self.categorical.items():
+            vocab, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+            columns[f"{name}_vocab"] = vocab
+            columns[f"{name}_codes"] = codes.astype(np.int32)
+        for name, values in self.numeric.items():
+            columns[name] = np.array(values, dtype=np.float32)
+
+        f, tmp_path = _temp_beside(path)
+        try:
+            with f:
+                np.savez(f, **columns)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def open_dataset(path):
+    """
+    Opens a scenario dataset: a JSON Lines file with its index, or a legacy JSON
+    array (e.g. dataset/LaMPilot-Bench.json). A JSON array is converted once to
+    <name>.jsonl next to it, and again whenever the JSON file is newer.
+    """
+    if path.endswith(".json"):
+        jsonl_path = path[:-len(".json")] + ".jsonl"
+        if not os.path.exists(jsonl_path) or os.path.getmtime(jsonl_path) < os.path.getmtime(path):
+            with open(path, "r") as f:
+                write_dataset(json.load(f), jsonl_path)
+        path = jsonl_path
+
+    if not os.path.exists(index_path(path)) or os.path.getmtime(index_path(path)) < os.path.getmtime(path):
+        build_index(path)
+    return ScenarioDataset(path)
+
+
+class ScenarioDataset:
+    """
+    Read-only view over an indexed JSON Lines scenario file.
+
+    The index (ids, byte offsets and the filterable fields) is small and loaded up
+    front; records are parsed only when accessed, straight from a memory map of the
+    file. select(), exclude() and shard() return new views sharing the same index
+    and memory map, so filtering never parses a record.
+    - len(dataset), iteration (streaming, in the view's order) and dataset.get(id).
+    - Pickles to its path and rows: the memory map is reopened on first access.
+    """
+
+    def __init__(self, path, rows=None, _index=None):
+        self.path = path
+        self._index = _index if _index is not None else self._load_index(path)
+        self.rows = np.arange(len(self._index["ids"])) if rows is None else rows
+        self._data = None
+        self._row_by_id = None
+
+    @staticmethod
+    def _load_index(path):
+        with np.load(index_path(path)) as index:
+            return {name: index[name] for name in index.files}
+
+    def _view(self, rows):
+        view = ScenarioDataset(self.path, rows, self._index)
+        view._data = self._data
+        return view
+
+    def _mapped(self):
+        if self._data is None:
+            with open(self.path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data
+
+    def _record(self, row):
+        offset = int(self._index["offsets"][row])
+        return json.loads(self._mapped()[offset:offset + int(self._index["lengths"][row])])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self._record(row)
+
+    def __getstate__(self):
+        return {"path": self.path, "rows": self.rows}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["rows"])
+
+    def ids(self):
+        return self._index["ids"][self.rows].tolist()
+
+    def column(self, name):
+        """An index column for this view's rows: "ids", a categorical field (decoded) or "density"."""
+        if name in CATEGORICAL_FIELDS:
+            return self._index[f"{name}_vocab"][self._index[f"{name}_codes"][self.rows]]
+        return self._index[name][self.rows]
+
+    def get(self, scenario_id, default=None):
+        """Random access by scenario id (within this view); `default` if absent."""
+        if self._row_by_id is None:
+            self._row_by_id = {scenario_id: row for scenario_id, row in zip(self.ids(), self.rows)}
+        row = self._row_by_id.get(str(scenario_id))
+        return default if row is None else self._record(row)
+
+    def __getitem__(self, scenario_id):
+        scenario = self.get(scenario_id)
+        if scenario is None:
+            raise KeyError(scenario_id)
+        return scenario
+
+    def select(self, weather=None, time_of_day=None, intent=None, risk=None, scenario=None, density=None):
+        """
+        Keeps the scenarios matching every given filter. Each filter is a value or a list
+        of values (any of them matches). Text filters are case-insensitive prefixes, so
+        risk="high" matches "High (Crash Likely)"; density matches exactly.
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        filters = {"weather": weather, "time_of_day": time_of_day, "intent": intent, "risk": risk,
+                   "scenario": scenario}
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            wanted = [str(w).lower() for w in ([wanted] if isinstance(wanted, str) else wanted)]
+            vocab = self._index[f"{name}_vocab"]
+            matching = [code for code, value in enumerate(vocab) if value.lower().startswith(tuple(wanted))]
+            mask &= np.isin(self._index[f"{name}_codes"][self.rows], matching)
+
+        if density is not None:
+            wanted = np.atleast_1d(np.asarray(density, dtype=np.float32))
+            mask &= np.isin(self._index["density"][self.rows], wanted)
+
+        return self._view(self.rows[mask])
+
+    def exclude(self, scenario_ids):
+        """Drops the given ids (e.g. scenarios an earlier run already completed)."""
+        if not scenario_ids:
+            return self
+        keep = ~np.isin(self._index["ids"][self.rows], list(scenario_ids))
+        return self._view(self.rows[keep])
+
+    def reorder(self, positions):
+        """The same scenarios in another order: positions[k] is the position (in this view) of the k-th one."""
+        return self._view(self.rows[np.asarray(positions, dtype=np.int64)])
+
+    def shard(self, shard_index, num_shards):
+        """Shard `shard_index` of `num_shards` (0-based): every num_shards-th scenario."""
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"Shard index must be in [0, {num_shards}), got {shard_index}.")
+        return self._view(self.rows[shard_index::num_shards])
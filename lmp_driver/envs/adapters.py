@@ -1,10 +1,13 @@
-import gymnasium as gym
-from lmp_driver.vehicle import PhysicsVehicle
+from lmp_driver.weather import weather_friction
 
+# highway-env resolves the class from this path itself, so spelling it out keeps
+# lmp_driver.vehicle (and highway-env behind it) out of the import of this module
+OTHER_VEHICLES_TYPE = "lmp_driver.vehicle.FrictionIDMVehicle"
 
-def make_lmp_driver_env(env_id, density=1.0, time_of_day="Day"):
+
+def make_lmp_driver_config(density=1.0, time_of_day="Day"):
     """
-    Creates the environment.
+    Builds the highway-env config for a scenario.
     - density: Multiplier for traffic count.
     - time_of_day: If 'Night', reduces sensor range (visible vehicles).
     """
@@ -25,13 +28,58 @@ def make_lmp_driver_env(env_id, density=1.0, time_of_day="Day"):
         "action": {
             "type": "DiscreteMetaAction",
         },
+        "other_vehicles_type": OTHER_VEHICLES_TYPE,  # Traffic reacts to weather friction too
         "duration": 40,
         "vehicles_count": int(20 * density),
         "controlled_vehicles": 1,
         "initial_vehicle_count": 10
     }
 
-    env = gym.make(env_id, render_mode="human", config=config)
-    env.unwrapped.vehicle_class = PhysicsVehicle
+    return config
+
+
+def make_lmp_driver_env(env_id, density=1.0, time_of_day="Day", render_mode=None):
+    """
+    Creates the environment.
+    - density: Multiplier for traffic count.
+    - time_of_day: If 'Night', reduces sensor range (visible vehicles).
+    - render_mode: None (headless, never renders), "rgb_array" (for video recording) or "human".
+    """
+    # Deferred: gymnasium and highway-env (which registers its envs on import) take
+    # most of a cold start, and only the processes that actually simulate need them
+    import gymnasium as gym
+    import highway_env  # noqa: F401
+
+    config = make_lmp_driver_config(density, time_of_day)
+
+    env = gym.make(env_id, render_mode=render_mode, config=config)
+
+    return env
+
+
+def apply_weather_friction(env, weather):
+    """
+    Sets the weather's friction on every vehicle of the road. Call it after reset(),
+    once the vehicles are spawned; returns the friction coefficient.
+
+    highway-env builds the ego car from its action type (a plain MDPVehicle), so the
+    ego is converted to FrictionMDPVehicle here with highway-env's own create_from.
+    Traffic is already built as FrictionIDMVehicle (config "other_vehicles_type").
+    """
+    from lmp_driver.vehicle import FrictionMDPVehicle, FrictionMixin
+
+    unwrapped = env.unwrapped
+    friction = weather_friction(weather)
+
+    ego = unwrapped.vehicle
+    if not isinstance(ego, FrictionMixin):
+        frictional_ego = FrictionMDPVehicle.create_from(ego)
+        road_vehicles = unwrapped.road.vehicles
+        road_vehicles[road_vehicles.index(ego)] = frictional_ego
+        unwrapped.controlled_vehicles[unwrapped.controlled_vehicles.index(ego)] = frictional_ego
+
+    for vehicle in unwrapped.road.vehicles:
+        if isinstance(vehicle, FrictionMixin):
+            vehicle.set_friction(friction)
 
-    return env
\ No newline at end of file
+    return friction
\ No newline at end of file
@@ -0,0 +1,57 @@
+from lmp_driver.envs.adapters import make_lmp_driver_config, make_lmp_driver_env
+
+
+class EnvPool:
+    """
+    Keeps constructed environments around between scenarios instead of calling
+    gym.make for each one.
+
+    Envs are keyed by what cannot be changed after construction without rebuilding
+    spaces or the viewer: (env_id, vehicles_count, observed vehicles_count, render_mode).
+    A reused env is reconfigured through env.unwrapped.configure; the caller is
+    expected to reset() it (with the scenario seed) before stepping.
+
+    Pickling yields an empty pool, so each worker process builds its own envs.
+    """
+
+    def __init__(self):
+        self._idle = {}  # key -> list of envs ready for reuse
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def make_key(env_id, config, render_mode):
+        return env_id, config["vehicles_count"], config["observation"]["vehicles_count"], render_mode
+
+    def acquire(self, env_id, density=1.0, time_of_day="Day", render_mode=None):
+        """Returns an env for this scenario; hand it back with release() instead of closing it."""
+        config = make_lmp_driver_config(density, time_of_day)
+        key = self.make_key(env_id, config, render_mode)
+
+        idle = self._idle.get(key)
+        if idle:
+            env = idle.pop()
+            env.unwrapped.configure(config)
+            self.reused += 1
+        else:
+            env = make_lmp_driver_env(env_id, density=density, time_of_day=time_of_day, render_mode=render_mode)
+            self.created += 1
+
+        env.unwrapped._pool_key = key
+        return env
+
+    def release(self, env):
+        key = getattr(env.unwrapped, "_pool_key", None)
+        if key is None:
+            env.close()
+            return
+        self._idle.setdefault(key, []).append(env)
+
+    def close(self):
+        for envs in self._idle.values():
+            for env in envs:
+                env.close()
+        self._idle = {}
+
+    def __getstate__(self):
+        return {"_idle": {}, "created": 0, "reused": 0}
@@ -0,0 +1,239 @@
+import ast
+import builtins
+import contextlib
+import hashlib
+import signal
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_STEP_BUDGET_S = 0.1  # Wall-clock budget for one policy(api) call
+
+# Modules a generated policy may import
+ALLOWED_MODULES = {"math"}
+
+# Builtins that reach the file system, the interpreter or the caller's namespaces; every
+# other public builtin (exceptions, map, filter, pow, divmod, hasattr, ...) is available
+FORBIDDEN_NAMES = {
+    "eval", "exec", "compile", "open", "input", "breakpoint", "globals", "locals", "vars",
+    "setattr", "delattr", "__import__", "__builtins__", "exit", "quit", "help",
+    "copyright", "credits", "license", "memoryview"
+}
+
+
+class PolicyValidationError(ValueError):
+    """The generated code failed static checks (syntax, forbidden constructs, missing policy)."""
+
+
+class PolicyTimeoutError(BaseException):
+    """
+    A single policy(api) call exceeded its wall-clock budget.
+    A BaseException, like KeyboardInterrupt, so `except Exception` in the policy cannot swallow it.
+    """
+
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if name not in ALLOWED_MODULES:
+        raise ImportError(f"Import of '{name}' is not allowed in a policy.")
+    return __import__(name, globals, locals, fromlist, level)
+
+
+def _safe_getattr(obj, name, *default):
+    if name.startswith("__"):
+        raise AttributeError(f"Access to '{name}' is not allowed in a policy.")
+    return getattr(obj, name, *default)
+
+
+def _safe_hasattr(obj, name):
+    return not name.startswith("__") and hasattr(obj, name)
+
+
+SAFE_BUILTINS = {
+    name: value for name, value in vars(builtins).items()
+    if not name.startswith("_") and name not in FORBIDDEN_NAMES
+}
+# getattr/hasattr with a string name would bypass the AST's dunder check
+SAFE_BUILTINS["getattr"] = _safe_getattr
+SAFE_BUILTINS["hasattr"] = _safe_hasattr
+SAFE_BUILTINS["__build_class__"] = builtins.__build_class__  # `class` statements
+SAFE_BUILTINS["__import__"] = _restricted_import
+
+# Compiled code objects keyed by sha256 of the source, shared by every scenario in this process
+_CODE_CACHE = {}
+
+
+def policy_hash(policy_code):
+    return hashlib.sha256(policy_code.encode("utf-8")).hexdigest()
+
+
+def validate_policy_ast(tree):
+    """Rejects imports outside ALLOWED_MODULES, dunder access and escape hatches like eval/open."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        else:
+            names = []
+        for name in names:
+            if name.split(".")[0] not in ALLOWED_MODULES:
+                raise PolicyValidationError(f"Import of '{name}' is not allowed (line {node.lineno}).")
+
+        if isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+            raise PolicyValidationError(f"Access to '{node.attr}' is not allowed (line {node.lineno}).")
+        if isinstance(node, ast.Name) and node.id in FORBIDDEN_NAMES:
+            raise PolicyValidationError(f"Use of '{node.id}' is not allowed (line {node.lineno}).")
+
+    if not any(isinstance(node, ast.FunctionDef) and node.name == "policy" for node in tree.body):
+        raise PolicyValidationError("LLM response did not contain 'def policy(api):'")
+
+
+def compile_policy(policy_code):
+    """Parses, validates and compiles the policy source once; later calls hit the cache."""
+    key = policy_hash(policy_code)
+    code_obj = _CODE_CACHE.get(key)
+    if code_obj is None:
+        try:
+            tree = ast.parse(policy_code, filename="<policy>")
+        except SyntaxError as e:
+            raise PolicyValidationError(f"Syntax error: {e}") from e
+        validate_policy_ast(tree)
+        code_obj = compile(tree, filename="<policy>", mode="exec")
+        _CODE_CACHE[key] = code_obj
+    return code_obj
+
+
+def load_policy(policy_code):
+    """Returns the policy(api) function, executed in a namespace with restricted builtins."""
+    namespace = {"__builtins__": SAFE_BUILTINS, "__name__": "policy"}
+    exec(compile_policy(policy_code), namespace)
+    policy_function = namespace.get("policy")
+    if not callable(policy_function):
+        raise PolicyValidationError("LLM response did not contain 'def policy(api):'")
+    return policy_function
+
+
+class _AlarmWindow:
+    """State of an alarm_window(): the policy call in progress, and whether the shared alarm has fired."""
+
+    def __init__(self, step_budget):
+        self.step_budget = step_budget
+        self.call_start = None
+        self.expired = False
+        self.rearmed = False  # The call in progress got its own alarm when the window expired
+
+
+_window = None
+_alarm_users = 0  # PolicyExecutors relying on the SIGALRM handler; the last to close restores the previous one
+_previous_handler = None
+
+
+def _raise_timeout(signum, frame):
+    window = _window
+    if window is None or window.expired:
+        raise PolicyTimeoutError("Policy exceeded its per-step time budget.")
+    # The shared alarm of an alarm_window(): only the call in progress can have overrun
+    window.expired = True
+    if window.call_start is None:
+        return
+    elapsed = time.perf_counter() - window.call_start
+    if elapsed >= window.step_budget:
+        raise PolicyTimeoutError("Policy exceeded its per-step time budget.")
+    window.rearmed = True
+    signal.setitimer(signal.ITIMER_REAL, window.step_budget - elapsed)
+
+
+@contextlib.contextmanager
+def alarm_window(calls, step_budget=DEFAULT_STEP_BUDGET_S):
+    """
+    Arms a single alarm for `calls` consecutive PolicyExecutor calls (step_budget each),
+    instead of arming and disarming one per call: run_scenario_batch runs a group of
+    same-policy views back to back inside one. A call that runs away is interrupted once
+    the window is used up (or at the end of its own budget, if that is later); every
+    call's overrun is still checked when it returns. Once the window has fired, the
+    remaining calls arm their own alarms. A no-op where PolicyExecutor uses no alarm.
+    """
+    global _window
+    if (calls < 2 or not step_budget or _window is not None or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    _window = _AlarmWindow(step_budget)
+    signal.setitimer(signal.ITIMER_REAL, step_budget * calls)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        _window = None
+
+
+class PolicyExecutor:
+    """
+    Runs a validated policy once per step under a wall-clock budget and records
+    how long each call took.
+
+    On the main thread of a POSIX process the budget is enforced with SIGALRM, so
+    an accidental heavy loop is interrupted (see alarm_window() for several calls in a
+    row). Elsewhere (non-main threads, Windows) the call runs to completion and the
+    overrun is reported afterwards.
+    """
+
+    def __init__(self, policy_code, step_budget=DEFAULT_STEP_BUDGET_S):
+        self.policy_function = load_policy(policy_code)
+        self.policy_hash = policy_hash(policy_code)
+        self.step_budget = step_budget
+        self.step_times = []
+
+        self._use_alarm = (
+            step_budget is not None and step_budget > 0
+            and hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+        )
+        if self._use_alarm:
+            # Several executors are open at once in a batch: install the handler once,
+            # and restore the previous one only when the last of them closes
+            global _alarm_users, _previous_handler
+            if _alarm_users == 0:
+                _previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+            _alarm_users += 1
+
+    def __call__(self, api):
+        start = time.perf_counter()
+        window = _window if self._use_alarm else None
+        own_alarm = self._use_alarm and (window is None or window.expired)
+        if own_alarm:
+            signal.setitimer(signal.ITIMER_REAL, self.step_budget)
+        elif window is not None:
+            window.call_start = start
+        try:
+            self.policy_function(api)
+        finally:
+            if own_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            elif window is not None:
+                window.call_start = None
+                if window.rearmed:
+                    window.rearmed = False
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            elapsed = time.perf_counter() - start
+            self.step_times.append(elapsed)
+
+        if self.step_budget and elapsed > self.step_budget:
+            raise PolicyTimeoutError("Policy exceeded its per-step time budget.")
+
+    def close(self):
+        if self._use_alarm:
+            global _alarm_users
+            self._use_alarm = False
+            _alarm_users -= 1
+            if _alarm_users == 0:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, _previous_handler)
+
+    def stats(self):
+        """Per-step execution time summary in milliseconds."""
+        if not self.step_times:
+            return {"mean": 0.0, "max": 0.0}
+        times_ms = np.asarray(self.step_times) * 1000.0
+        return {"mean": round(float(times_ms.mean()), 4), "max": round(float(times_ms.max()), 4)}
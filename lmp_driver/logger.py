@@ -0,0 +1,150 @@
+import atexit
+import os
+import queue
+import sys
+import threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+
+class AsyncWriter:
+    """
+    Writes text to a file or stream from a background thread.
+
+    write() only puts the text on a bounded queue and never blocks: when the queue is
+    full the line is dropped and counted. The writer thread drains whatever has queued
+    up (at most batch_size lines) and flushes once per batch instead of once per line.
+    If the target cannot be opened or written, the thread reports the error once and
+    keeps draining into sys.__stderr__, so flush() never waits on a dead thread.
+    flush() reports lines dropped since its last call. The thread is (re)started lazily
+    in whichever process writes first, so an instance inherited by a forked worker
+    keeps working.
+    """
+
+    def __init__(self, path=None, stream=None, max_queue=10000, batch_size=256):
+        self.path = path
+        self.stream = stream
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._dropped_reported = 0
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def write(self, text):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Blocks until everything queued so far has been written."""
+        if self._pid == os.getpid():
+            self._queue.join()
+        dropped = self.dropped - self._dropped_reported
+        if dropped:
+            self._dropped_reported = self.dropped
+            _report(f"⚠️ Logger: dropped {dropped} lines (queue full).\n")
+
+    def _open(self):
+        if self.stream is not None:
+            return self.stream
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, "a")
+
+    def _run(self):
+        try:
+            out = self._open()
+        except Exception as e:
+            _report(f"⚠️ Logger: cannot open {self.path} ({e}); writing to stderr instead.\n")
+            out = sys.__stderr__
+
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            text = "".join(batch)
+            try:
+                out.write(text)
+                out.flush()
+            except Exception as e:
+                if out is sys.__stderr__:
+                    self.dropped += len(batch)
+                else:
+                    _report(f"⚠️ Logger: write failed ({e}); writing to stderr instead.\n")
+                    out = sys.__stderr__
+                    _report(text)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+def _report(text):
+    """Last-resort output for the logger's own problems: the interpreter's original stderr."""
+    try:
+        sys.__stderr__.write(text)
+        sys.__stderr__.flush()
+    except Exception:
+        pass
+
+
+class Logger:
+    """Level-filtered console logger on top of an AsyncWriter."""
+
+    def __init__(self, level=INFO, writer=None):
+        self.level = level
+        self.writer = writer or AsyncWriter(stream=sys.stdout)
+
+    def log(self, level, message):
+        if level >= self.level:
+            self.writer.write(f"{message}\n")
+
+    def debug(self, message):
+        self.log(DEBUG, message)
+
+    def info(self, message):
+        self.log(INFO, message)
+
+    def warning(self, message):
+        self.log(WARNING, message)
+
+    def error(self, message):
+        self.log(ERROR, message)
+
+    def flush(self):
+        self.writer.flush()
+
+
+_logger = Logger()
+atexit.register(_logger.flush)
+
+
+def get_logger():
+    return _logger
+
+
+def set_level(level):
+    """level: one of LEVELS' names ("debug", "info", ...) or a numeric level."""
+    _logger.level = LEVELS[level.lower()] if isinstance(level, str) else level
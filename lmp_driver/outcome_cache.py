@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from importlib import metadata
+
+import numpy as np
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Sources whose behaviour decides an episode; editing any of them invalidates every entry.
+# run_benchmark.py holds the episode loops and builds the results
+CODE_VERSION_FILES = (
+    os.path.join(os.path.dirname(PACKAGE_DIR), "run_benchmark.py"),
+    os.path.join(PACKAGE_DIR, "executor.py"),
+    os.path.join(PACKAGE_DIR, "primitives.py"),
+    os.path.join(PACKAGE_DIR, "batched_primitives.py"),
+    os.path.join(PACKAGE_DIR, "vehicle.py"),
+    os.path.join(PACKAGE_DIR, "weather.py"),
+    os.path.join(PACKAGE_DIR, "termination.py"),
+    os.path.join(PACKAGE_DIR, "telemetry.py"),
+    os.path.join(PACKAGE_DIR, "envs", "adapters.py"),
+)
+SIMULATOR_PACKAGES = ("highway-env", "gymnasium")
+
+# Result fields decided by the episode itself; everything else (id, instruction,
+# LLM and timing figures) belongs to the run and is filled in on a hit
+OUTCOME_FIELDS = ("crashed", "success", "steps", "avg_speed", "distance", "trace_hash", "policy_timeout",
+                  "termination", "safety_events", "telemetry", "decisions")
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Hash of CODE_VERSION_FILES and the simulator package versions, computed once per process."""
+    digest = hashlib.sha256()
+    for path in CODE_VERSION_FILES:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    for package in SIMULATOR_PACKAGES:
+        try:
+            digest.update(f"{package}=={metadata.version(package)}".encode("utf-8"))
+        except metadata.PackageNotFoundError:
+            digest.update(f"{package} (unknown)".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class OutcomeCache:
+    """
+    Persistent, size-bounded LRU cache of simulated episodes.
+
+    With a fixed seed an episode is fully determined by the policy code, the env
+    (id and config), the weather's friction and the early-termination settings, so
+    a scenario matching an earlier one on all of these gets the earlier outcome
+    instead of being simulated again. Keys also include code_version(), so entries
+    written before an edit to the simulation code are simply never looked up again
+    (and age out through the LRU bound).
+
+    Each entry holds the OUTCOME_FIELDS of the result and the episode's per-step
+    metrics (name -> array: the EpisodeTelemetry columns and dt), so a hit can still
+    write the episode's telemetry file. Backed by SQLite like PolicyCache, so worker
+    processes can share one file.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, metrics BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outcomes_last_used ON outcomes (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the object picklable for worker processes.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(policy_hash, env_id, env_config, friction, seed, termination=None, decision_mode=None):
+        """
+        termination: the TerminationPolicy of the run, or None.
+        decision_mode: the run's (quantum, max_hold_steps) event-driven decisions, or None.
+        """
+        payload = json.dumps([policy_hash, env_id, env_config, friction, seed,
+                              vars(termination) if termination is not None else None, code_version()]
+                             + ([list(decision_mode)] if decision_mode is not None else []),
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (outcome fields, per-step metrics) or None. A hit refreshes the entry's LRU position."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT result, metrics FROM outcomes WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE outcomes SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        self.hits += 1
+        with np.load(io.BytesIO(row[1])) as metrics:
+            return json.loads(row[0]), {name: metrics[name] for name in metrics.files}
+
+    def put(self, key, result, metrics):
+        """Stores an episode's outcome and evicts the least recently used entries beyond max_entries."""
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: np.asarray(values) for name, values in metrics.items()})
+        outcome = {field: result[field] for field in OUTCOME_FIELDS if field in result}
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO outcomes (key, result, metrics, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(outcome), buffer.getvalue(), time.time())
+            )
+            # Walks the last_used index instead of sorting the table: entries can be many
+            conn.execute(
+                "DELETE FROM outcomes WHERE last_used < "
+                "(SELECT last_used FROM outcomes ORDER BY last_used DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries - 1,)
+            )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0]
@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import os
+import queue
+import threading
+import time
+
+from lmp_driver.agent import build_context_str, clean_code
+from lmp_driver.backends import GROQ_BASE_URL, chat_reply_source, load_env
+from lmp_driver.prompts import SYSTEM_PROMPT
+
+
+class PolicyPrefetcher:
+    """
+    Background stage that generates policies for upcoming scenarios while the
+    simulation loop is busy stepping earlier ones.
+
+    Requests run concurrently on an AsyncOpenAI client (at most `max_in_flight`
+    at a time) inside a dedicated event-loop thread. Finished policies are put on
+    a queue in the same order the jobs were submitted, so the consumer can simply
+    call get() once per scenario.
+
+    Each queued item is a dict: {"id", "code", "cache_hit", "latency", "error"}.
+    Every job yields exactly one item, even when it fails (code None, the failure
+    in "error"); None on the queue only ever means the end of the stream.
+    """
+
+    def __init__(self, model_name="openai/gpt-oss-20b", api_key=None, base_url=GROQ_BASE_URL,
+                 policy_cache=None, max_in_flight=4, max_retries=5, backoff_base=1.0):
+        load_env()
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GROQ_KEY")  # Only needed for the policies not in the cache
+        self.base_url = base_url
+        self.policy_cache = policy_cache
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self, jobs):
+        """
+        jobs: list of (scenario_id, instruction, env_info) tuples.
+        """
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(list(jobs)),), daemon=True)
+        self._thread.start()
+        return self
+
+    def get(self, timeout=None):
+        """Blocks until the next policy (in submission order) is ready; None once the stream has ended."""
+        item = self._queue.get(timeout=timeout)
+        if item is None:
+            self._queue.put(None)  # Stays ended: later calls return None instead of blocking
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    async def _run(self, jobs):
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        try:
+            # One keep-alive pool sized to the in-flight limit, shared by every request
+            limits = httpx.Limits(max_connections=self.max_in_flight,
+                                  max_keepalive_connections=self.max_in_flight)
+            # The client insists on a key; without one, _fetch_policy fails cache misses before any request
+            client = AsyncOpenAI(api_key=self.api_key or "", base_url=self.base_url, max_retries=0,
+                                 http_client=DefaultAsyncHttpxClient(limits=limits))
+        except Exception as e:
+            for scenario_id, _, _ in jobs:
+                self._queue.put(_failed(scenario_id, e))
+            self._queue.put(None)
+            return
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks = [asyncio.create_task(self._fetch(client, semaphore, *job)) for job in jobs]
+        try:
+            for task in tasks:
+                self._queue.put(await task)
+        finally:
+            await client.close()
+            self._queue.put(None)  # End of stream
+
+    async def _fetch(self, client, semaphore, scenario_id, instruction, env_info):
+        """One job's queue item; any failure (server, cache, unusable reply) becomes an error item."""
+        try:
+            return await self._fetch_policy(client, semaphore, scenario_id, instruction, env_info)
+        except Exception as e:
+            return _failed(scenario_id, e)
+
+    async def _fetch_policy(self, client, semaphore, scenario_id, instruction, env_info):
+        from openai import InternalServerError, RateLimitError
+
+        context_str = build_context_str(instruction, env_info)
+
+        cache_key = None
+        if self.policy_cache is not None:
+            cache_key = self.policy_cache.make_key(self.model_name, SYSTEM_PROMPT, context_str,
+                                                   chat_reply_source(self.base_url))
+            # SQLite calls block; keep them off the event loop so other requests keep flowing
+            cached_code = await asyncio.to_thread(self.policy_cache.get, cache_key)
+            if cached_code is not None:
+                return {"id": scenario_id, "code": cached_code, "cache_hit": True, "latency": None, "error": None}
+        if not self.api_key:
+            return _failed(scenario_id, "GROQ_KEY environment variable is missing.")
+
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    start = time.perf_counter()
+                    response = await client.chat.completions.create(
+                        model=self.model_name,
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": context_str}
+                        ],
+                        temperature=0.0,
+                        seed=42
+                    )
+                    latency = time.perf_counter() - start
+                    break
+                except (RateLimitError, InternalServerError) as e:
+                    if attempt == self.max_retries:
+                        return _failed(scenario_id, e)
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+
+        content = response.choices[0].message.content
+        if content is None:
+            return _failed(scenario_id, "The model returned an empty reply.")
+        policy_code = clean_code(content)
+        if cache_key is not None:
+            await asyncio.to_thread(self.policy_cache.put, cache_key, policy_code)
+
+        return {"id": scenario_id, "code": policy_code,
+                "cache_hit": False if self.policy_cache is not None else None, "latency": latency, "error": None}
+
+    def _retry_delay(self, error, attempt):
+        """Honours the server's Retry-After header when present, else exponential backoff."""
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff_base * (2 ** attempt)
+
+
+def _failed(scenario_id, error):
+    return {"id": scenario_id, "code": None, "cache_hit": False, "latency": None, "error": str(error)}
+
+
+class BatchPolicyGenerator:
+    """
+    Drop-in alternative to PolicyPrefetcher for backends with a batch API: a
+    background thread sends the scenarios' contexts `batch_size` at a time through
+    agent.generate_policies(), so a whole sweep needs only a handful of requests,
+    and the simulation can start on the first batch while later ones are generated.
+
+    Queued items have PolicyPrefetcher's format: {"id", "code", "cache_hit", "latency", "error"}.
+    """
+
+    def __init__(self, agent, batch_size=64):
+        self.agent = agent
+        self.batch_size = batch_size
+        self.batches = 0  # Batches sent so far
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self, jobs):
+        """
+        jobs: iterable of (scenario_id, instruction, env_info) tuples, consumed lazily.
+        """
+        self._thread = threading.Thread(target=self._run, args=(iter(jobs),), daemon=True)
+        self._thread.start()
+        return self
+
+    def get(self, timeout=None):
+        """Blocks until the next policy (in submission order) is ready; None once the stream has ended."""
+        item = self._queue.get(timeout=timeout)
+        if item is None:
+            self._queue.put(None)  # Stays ended: later calls return None instead of blocking
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    def _run(self, jobs):
+        try:
+            while True:
+                batch = list(itertools.islice(jobs, self.batch_size))
+                if not batch:
+                    return
+                self.batches += 1
+                try:
+                    policies = self.agent.generate_policies([(instruction, env_info)
+                                                             for _, instruction, env_info in batch])
+                except Exception as e:
+                    for scenario_id, _, _ in batch:
+                        self._queue.put({"id": scenario_id, "code": None, "cache_hit": False, "latency": None,
+                                         "error": str(e)})
+                    continue
+
+                for (scenario_id, _, _), (code, cache_hit, latency) in zip(batch, policies):
+                    self._queue.put({"id": scenario_id, "code": code, "cache_hit": cache_hit, "latency": latency,
+                                     "error": None})
+        finally:
+            self._queue.put(None)  # End of stream
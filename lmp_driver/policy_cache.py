@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class PolicyCache:
+    """
+    Persistent, size-bounded LRU cache for generated policies.
+
+    Entries are keyed by a hash of everything that determines the LLM output
+    (model name, system prompt and the rendered user context), so identical
+    prompts are only sent to the endpoint once across runs.
+    Backed by SQLite so several benchmark worker processes can share one file.
+    """
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS policies ("
+                "key TEXT PRIMARY KEY, code TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the object picklable for worker processes.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model_name, system_prompt, context_str, source=None):
+        """source: the backend's reply_source() (server and request shape), so endpoints never share replies."""
+        payload = json.dumps([model_name, source, system_prompt, context_str])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached policy code, or None. A hit refreshes the entry's LRU position."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT code FROM policies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE policies SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, code):
+        """Stores a policy and evicts the least recently used entries beyond max_entries."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO policies (key, code, last_used) VALUES (?, ?, ?)",
+                (key, code, time.time())
+            )
+            conn.execute(
+                "DELETE FROM policies WHERE key NOT IN "
+                "(SELECT key FROM policies ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM policies").fetchone()[0]
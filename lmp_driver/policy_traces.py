@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+
+# Columns of a trace's "features" array: the sensor readings a policy sees each step
+# (LLMDriverPrimitives.sensor_snapshot(), in its order)
+FEATURES = ("ego_speed", "lead_gap", "lead_rel_speed", "left_free", "right_free")
+SAFETY_EVENTS = ("left_lane_blocked", "right_lane_blocked", "too_close")
+
+
+def sensor_features(primitives):
+    """The FEATURES of the primitives' current snapshot, as a tuple of floats."""
+    return tuple(float(value) for value in primitives.sensor_snapshot())
+
+
+class PolicyTraceRecorder:
+    """
+    Records one episode's (sensor features -> action) pairs and saves them as
+    <directory>/<policy_hash>/<scenario_id>.npz with columns:
+    - features: float32 (steps, len(FEATURES)); action: int8 (steps,); step: int16 (steps,)
+    - seed, friction, scenario_id: scalars describing the episode.
+    One file per episode keeps parallel workers from writing the same file;
+    load_policy_traces() concatenates every episode of a policy hash.
+    """
+
+    def __init__(self, directory, policy_hash, scenario_id, seed=None, friction=1.0):
+        self.path = os.path.join(directory, policy_hash, f"{scenario_id}.npz")
+        self.scenario_id = scenario_id
+        self.seed = seed
+        self.friction = friction
+        self.features = []
+        self.actions = []
+
+    def record(self, primitives):
+        """Call after the policy ran for this step."""
+        self.features.append(sensor_features(primitives))
+        self.actions.append(primitives.action)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        steps = len(self.actions)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            features=np.asarray(self.features, dtype=np.float32).reshape(steps, len(FEATURES)),
+            action=np.asarray(self.actions, dtype=np.int8),
+            step=np.arange(steps, dtype=np.int16),
+            seed=np.int64(-1 if self.seed is None else self.seed),
+            friction=np.float32(self.friction),
+            scenario_id=np.str_(self.scenario_id),
+        )
+        os.replace(tmp_path, self.path)
+        return self.path
+
+
+def load_policy_traces(directory, policy_hash):
+    """
+    All recorded episodes of one policy as columns: features, action, step, plus
+    per-row scenario_id, seed and friction. Returns None if nothing was recorded.
+    """
+    policy_dir = os.path.join(directory, policy_hash)
+    if not os.path.isdir(policy_dir):
+        return None
+
+    columns = {"features": [], "action": [], "step": [], "scenario_id": [], "seed": [], "friction": []}
+    for name in sorted(os.listdir(policy_dir)):
+        if not name.endswith(".npz") or ".tmp" in name:
+            continue
+        with np.load(os.path.join(policy_dir, name)) as trace:
+            steps = len(trace["action"])
+            columns["features"].append(trace["features"])
+            columns["action"].append(trace["action"])
+            columns["step"].append(trace["step"])
+            columns["scenario_id"].append(np.full(steps, str(trace["scenario_id"])))
+            columns["seed"].append(np.full(steps, trace["seed"], dtype=np.int64))
+            columns["friction"].append(np.full(steps, trace["friction"], dtype=np.float32))
+
+    if not columns["action"]:
+        return None
+    return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+class ActionMemo:
+    """
+    Per-process action cache for generated policies, keyed by (policy hash, friction)
+    and the step's sensor features quantized to `quantum`.
+
+    Only valid for policies that are pure functions of the sensor readings (no state
+    kept between calls, no direct use of api.obs). Quantization also means a hit may
+    return the action chosen for a nearby, not identical, state, so memoized episodes
+    can diverge from unmemoized ones: this is an opt-in speed/fidelity trade-off.
+    """
+
+    def __init__(self, quantum=0.01, max_entries=100000):
+        """max_entries: per (policy hash, friction) table; later misses are not cached."""
+        self.quantum = quantum
+        self.max_entries = max_entries
+        self._tables = {}  # (policy_hash, friction) -> {key: (action, safety event deltas)}
+
+    def key(self, primitives):
+        q = self.quantum
+        return tuple(int(round(value / q)) for value in sensor_features(primitives))
+
+    def wrap(self, policy_function, policy_hash, friction=1.0):
+        """Returns a MemoizedPolicy calling policy_function only on a cache miss."""
+        return MemoizedPolicy(policy_function, self, self._tables.setdefault((policy_hash, friction), {}))
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    def __getstate__(self):
+        # Workers start with an empty memo of their own
+        return {"quantum": self.quantum, "max_entries": self.max_entries, "_tables": {}}
+
+
+class MemoizedPolicy:
+    """Callable in place of a PolicyExecutor; counts its own hits and misses."""
+
+    def __init__(self, policy_function, memo, table):
+        self.policy_function = policy_function
+        self.memo = memo
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, api):
+        key = self.memo.key(api)
+        entry = self.table.get(key)
+        if entry is not None:
+            self.hits += 1
+            api.action, deltas = entry
+            for name, n in zip(SAFETY_EVENTS, deltas):
+                if n:
+                    api.safety_events[name] += n
+            return
+
+        self.misses += 1
+        before = [api.safety_events[name] for name in SAFETY_EVENTS]
+        self.policy_function(api)
+        if len(self.table) < self.memo.max_entries:
+            deltas = tuple(api.safety_events[name] - n for name, n in zip(SAFETY_EVENTS, before))
+            self.table[key] = (api.action, deltas)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
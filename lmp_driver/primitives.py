@@ -1,8 +1,21 @@
+import numpy as np
+
+# Lateral offsets (normalized y) of the left, current and right lane relative to the ego car
+LANE_OFFSETS = (-0.25, 0.0, 0.25)
+LEFT, CURRENT, RIGHT = 0, 1, 2
+
+
 class LLMDriverPrimitives:
     def __init__(self, env):
         self.env = env
         self.obs = None
 
+        # Per-step perception snapshot, rebuilt by update()
+        self._neighbors = None
+        self._lead_gap = [1.0, 1.0, 1.0]
+        self._lead_rel_speed = [0.0, 0.0, 0.0]
+        self._lane_free = [False, True, False]
+
         self.ACTIONS = {
             "LANE_LEFT": 0, "IDLE": 1, "LANE_RIGHT": 2, "FASTER": 3, "SLOWER": 4
         }
@@ -10,8 +23,79 @@ class LLMDriverPrimitives:
         self.action = 1
         self._action_priority = 0  # Used to prevent overwriting important moves
 
+        # Safety interventions are counted, not printed: they can fire on every step
+        self.safety_events = {"left_lane_blocked": 0, "right_lane_blocked": 0, "too_close": 0}
+
+        # Event-driven decisions for decide(); off (the policy runs every step) until set_decision_mode()
+        self.decision_quantum = None
+        self.max_hold_steps = 0
+        self.policy_calls = 0
+        self.held_steps = 0
+        self._decision_key = None
+        self._decided_action = None
+        self._hold_count = 0
+
+    def set_decision_mode(self, quantum=0.02, max_hold_steps=5):
+        """
+        Opt-in event-driven decisions for decide(): the policy runs again only when the
+        sensor state it sees (ego speed, lead gap and closing speed, left/right lane
+        availability, quantized to `quantum`) changes, after a lane change, or once the
+        last decision has been held for max_hold_steps steps. A held action goes back
+        through its action primitive every step, so speed_up()'s safety margin is still
+        checked against the current readings.
+        Only valid for policies that are pure functions of the sensor readings (no state
+        kept between calls, no direct use of api.obs), like ActionMemo.
+        """
+        self.decision_quantum = quantum
+        self.max_hold_steps = max_hold_steps
+
+    def decide(self, policy):
+        """Call once per step, after update(): runs policy(self), or holds the last decision (see set_decision_mode())."""
+        q = self.decision_quantum
+        if q is None:
+            self.policy_calls += 1
+            policy(self)
+            return
+
+        key = (round(float(self.obs[0, 3]) / q), round(float(self._lead_gap[CURRENT]) / q),
+               round(float(self._lead_rel_speed[CURRENT]) / q), self._lane_free[LEFT], self._lane_free[RIGHT])
+        hold = self._HOLDABLE.get(self._decided_action)
+        if hold is not None and key == self._decision_key and self._hold_count < self.max_hold_steps:
+            self._hold_count += 1
+            self.held_steps += 1
+            hold(self)
+            return
+
+        self._decision_key = key
+        self._hold_count = 0
+        self.policy_calls += 1
+        policy(self)
+        self._decided_action = self.action
+
+    def decision_stats(self):
+        """Policy calls, held steps (calls saved) and the share of steps that ran the policy."""
+        steps = self.policy_calls + self.held_steps
+        return {"policy_calls": self.policy_calls, "held_steps": self.held_steps,
+                "decision_rate": round(self.policy_calls / steps, 4) if steps else 1.0}
+
     def update(self, obs):
-        """Called every step. Resets priority."""
+        """Called every step. Resets priority and rebuilds the perception snapshot."""
+        self._begin_step(obs)
+        self._build_snapshot()
+
+    def load_snapshot(self, obs, lead_gap, lead_rel_speed, lane_free):
+        """
+        Like update(), but takes sensor readings already computed elsewhere
+        (BatchedLLMDriverPrimitives computes them for a whole batch of envs at once).
+        Each argument is a [left, current, right] list.
+        """
+        self._begin_step(obs)
+        self._neighbors = None  # Built on demand by _get_neighbors()
+        self._lead_gap = lead_gap
+        self._lead_rel_speed = lead_rel_speed
+        self._lane_free = lane_free
+
+    def _begin_step(self, obs):
         self.obs = obs
         self.action = self.ACTIONS["IDLE"]
         self._action_priority = 0
@@ -21,10 +105,56 @@ class LLMDriverPrimitives:
         # 2 = Lane Change (High Priority)
         # 3 = Emergency Safety Override (Max Priority)
 
+    def _build_snapshot(self):
+        """
+        Computes every sensor reading for this step in one vectorized pass, so the
+        sensors below are plain lookups no matter how often a policy calls them.
+        Results match the original per-car loops exactly (same dtypes, same tie-breaking).
+        """
+        obs = self.obs
+        neighbors = obs[1:]
+        self._neighbors = neighbors[neighbors[:, 0] == 1]
+
+        ego_y = obs[0, 2]
+        ego_vx = obs[0, 3]
+        xs = self._neighbors[:, 1]
+        ys = self._neighbors[:, 2]
+
+        # Lane assignment: row k marks the cars within 0.1 of lane k's centre (left, current, right)
+        target_ys = ego_y + np.array(LANE_OFFSETS, dtype=obs.dtype)
+        in_lane = np.abs(ys[None, :] - target_ys[:, None]) < 0.1
+        in_front = in_lane & (xs > 0)
+
+        # Lead car per lane: distance capped at 1.0 (nothing visible ahead)
+        gaps = np.where(in_front, xs, np.inf).min(axis=1) if xs.size else np.full(3, np.inf)
+        self._lead_gap = [gap if gap < 1.0 else 1.0 for gap in gaps]
+
+        # Relative speed uses the first car ahead in observation order (closest by distance)
+        has_lead = in_front.any(axis=1)
+        first_lead = in_front.argmax(axis=1) if xs.size else np.zeros(3, dtype=int)
+        self._lead_rel_speed = [
+            ego_vx - self._neighbors[first_lead[k], 3] if has_lead[k] else 0.0 for k in range(3)
+        ]
+
+        # Lane availability: on the road and nobody in the -0.3..0.3 collision zone
+        blocked = (in_lane & (xs > -0.3) & (xs < 0.3)).any(axis=1)
+        on_road = (target_ys >= -0.05) & (target_ys <= 0.8)
+        self._lane_free = [bool(on_road[k] and not blocked[k]) for k in range(3)]
+
+    def sensor_snapshot(self):
+        """
+        This step's readings as the policy sees them, for recorders (telemetry, traces):
+        (ego speed, lead gap, relative speed to the lead, left lane free, right lane free).
+        """
+        return (self.obs[0, 3], self._lead_gap[CURRENT], self._lead_rel_speed[CURRENT],
+                self._lane_free[LEFT], self._lane_free[RIGHT])
+
     def _get_neighbors(self):
         if self.obs is None: return []
-        neighbors = self.obs[1:]
-        return neighbors[neighbors[:, 0] == 1]
+        if self._neighbors is None:
+            neighbors = self.obs[1:]
+            self._neighbors = neighbors[neighbors[:, 0] == 1]
+        return self._neighbors
 
     # --- PERCEPTION ---
     def get_ego_speed(self):
@@ -32,16 +162,7 @@ class LLMDriverPrimitives:
         return self.obs[0, 3]
 
     def get_distance_to_lead(self):
-        neighbors = self._get_neighbors()
-        min_dist = 1.0
-        ego_y = self.obs[0, 2]
-
-        for car in neighbors:
-            if abs(car[2] - ego_y) < 0.1:  # Same lane
-                if car[1] > 0:  # In front
-                    if car[1] < min_dist:
-                        min_dist = car[1]
-        return min_dist
+        return self._lead_gap[CURRENT]
 
     def get_relative_speed_to_lead(self):
         """
@@ -49,39 +170,11 @@ class LLMDriverPrimitives:
         Positive = We are faster (closing in).
         Negative = They are faster (pulling away).
         """
-        neighbors = self._get_neighbors()
-        ego_y = self.obs[0, 2]
-        ego_vx = self.obs[0, 3]  # Our speed
-
-        for car in neighbors:
-            if abs(car[2] - ego_y) < 0.1:  # Same lane
-                if car[1] > 0:  # In front
-                    # Relative speed = Our Speed - Their Speed
-                    # car[3] is their absolute speed in observation
-                    return ego_vx - car[3]
-
-        return 0.0  # No car ahead
+        return self._lead_rel_speed[CURRENT]
 
     def is_lane_free(self, direction):
-        # ... (Keep your existing implementation) ...
-        neighbors = self._get_neighbors()
-        lat_offset = 0.25 if direction == "right" else -0.25
-        ego_y = self.obs[0, 2]
-        target_y = ego_y + lat_offset
-
-        # 1. Boundary Check (Don't drive off road)
-        # Assuming 4 lanes (0, 0.25, 0.5, 0.75). Adjust if needed.
-        if target_y < -0.05 or target_y > 0.8:
-            return False
-
-        for car in neighbors:
-            car_y = car[2]
-            car_x = car[1]
-            if abs(car_y - target_y) < 0.1:
-                # Collision Zone: Don't cut off someone close (-0.3 to +0.3)
-                if -0.3 < car_x < 0.3:
-                    return False
-        return True
+        # Assuming 4 lanes (0, 0.25, 0.5, 0.75): lanes off the road are never free.
+        return self._lane_free[RIGHT if direction == "right" else LEFT]
 
     # --- ACTIONS ---
 
@@ -91,7 +184,7 @@ class LLMDriverPrimitives:
             self.action = self.ACTIONS["LANE_LEFT"]
             self._action_priority = 2
         else:
-            print("⚠️ Safety: Left Lane Blocked.")
+            self.safety_events["left_lane_blocked"] += 1
 
     def change_lane_right(self):
         if self._action_priority >= 2: return
@@ -99,7 +192,7 @@ class LLMDriverPrimitives:
             self.action = self.ACTIONS["LANE_RIGHT"]
             self._action_priority = 2
         else:
-            print("⚠️ Safety: Right Lane Blocked.")
+            self.safety_events["right_lane_blocked"] += 1
 
     def speed_up(self):
         if self._action_priority >= 2: return
@@ -121,7 +214,7 @@ class LLMDriverPrimitives:
         current_friction = 1.0
         try:
             current_friction = self.env.unwrapped.vehicle.friction
-        except:
+        except AttributeError:
             pass
 
         # If slippery, DOUBLE the required safety distance
@@ -129,7 +222,7 @@ class LLMDriverPrimitives:
             safe_dist *= 1.5
 
         if dist < safe_dist:
-            print(f"⚠️ Safety: Too close ({dist:.2f} < {safe_dist:.2f}). Braking.")
+            self.safety_events["too_close"] += 1
             self.slow_down()
             return
 
@@ -144,3 +237,6 @@ class LLMDriverPrimitives:
     def keep_speed(self):
         if self._action_priority > 0: return
         self.action = self.ACTIONS["IDLE"]
+
+    # Held action -> the primitive replaying it (lane changes are never held: one is one lane)
+    _HOLDABLE = {1: keep_speed, 3: speed_up, 4: slow_down}
@@ -0,0 +1,85 @@
+import cProfile
+import os
+import pstats
+import time
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """
+    Named wall-clock timers and counters for the benchmark's phases.
+
+    Disabled by default: timer() then hands back one shared no-op context manager
+    and add()/count() return immediately, so instrumented code pays next to nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.totals = {}
+        self.counts = {}
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add(self, name, seconds, count=1):
+        if not self.enabled:
+            return
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def count(self, name, n=1):
+        self.add(name, 0.0, n)
+
+    def summary(self):
+        """{name: {"total_s", "count", "mean_ms"}} for everything recorded so far."""
+        return {
+            name: {
+                "total_s": round(total, 6),
+                "count": self.counts[name],
+                "mean_ms": round(total / self.counts[name] * 1000.0, 4) if self.counts[name] else 0.0
+            }
+            for name, total in self.totals.items()
+        }
+
+
+def run_with_cprofile(path, fn, *args, **kwargs):
+    """Runs fn under cProfile, dumps the stats to `path` and prints the top entries."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(fn, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
+        print(f"    📈 cProfile stats written to {path}")
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
@@ -0,0 +1,328 @@
+import datetime
+import json
+import os
+import random
+
+import numpy as np
+
+from lmp_driver.profiling import Profiler
+from lmp_driver.termination import POLICY_FAILURE_REASONS, UNDECIDED_REASONS
+
+LATENCY_SAMPLE_SIZE = 10000  # LLM latencies kept for the percentiles; exact up to this many calls
+
+
+class ResultsStore:
+    """
+    Append-only JSONL file with one record per finished scenario.
+
+    Every append is flushed and fsync'd, so a crash can lose at most the scenario
+    that was running. A torn last line (crash mid-write) is skipped on load
+    instead of invalidating the whole file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns every stored result, in the order they were appended."""
+        if not self.exists():
+            return []
+
+        results = []
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"⚠️ Warning: Skipping a truncated record in {self.path}.")
+        return results
+
+    def completed_ids(self):
+        return {r['id'] for r in self.load()}
+
+    def append(self, result):
+        if self._file is None:
+            self._file = open(self.path, "a")
+            # After a crash mid-write the file ends in a torn line: start on a fresh one,
+            # or the next record would be glued to it and skipped with it on load
+            if self._file.tell() > 0 and not self._ends_with_newline():
+                self._file.write("\n")
+        self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def rewrite(self, results):
+        """Replaces the file's records with `results` (atomically, as write_json_atomic does)."""
+        self.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` values from a stream (reservoir sampling),
+    so percentiles over any number of values take bounded memory. Holds every value
+    until more than `size` have been added. Seeded: the same stream gives the same sample.
+    """
+
+    def __init__(self, size=LATENCY_SAMPLE_SIZE, seed=0):
+        self.size = size
+        self.count = 0
+        self.values = []
+        self._rng = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+            return
+        slot = self._rng.randrange(self.count)
+        if slot < self.size:
+            self.values[slot] = value
+
+    def __len__(self):
+        return self.count
+
+
+class RunningSummary:
+    """
+    Benchmark aggregates updated one result at a time, in bounded memory, so a
+    progress report or the final summary never has to re-scan every finished
+    scenario. LLM latency percentiles come from a Reservoir sample.
+
+    Episodes stopped early without a crash (UNDECIDED_REASONS) are counted under
+    "early_stopped", and episodes ended by a policy timeout or runtime error
+    (POLICY_FAILURE_REASONS) under "policy_failures". Both are left out of the
+    success, collision, high-risk, speed and distance figures: a shortened run is
+    not a full one, and a hanging or broken policy must not pass for a crash-free drive.
+    """
+
+    def __init__(self, results=()):
+        self.total = 0
+        self.early_stopped = 0
+        self.policy_failures = 0
+        self.crashes = 0
+        self.high_risk_total = 0
+        self.high_risk_survived = 0
+        self.speed_sum = 0.0
+        self.total_dist = 0.0
+        self.policy_mean_sum = 0.0
+        self.policy_mean_count = 0
+        self.policy_max = 0.0
+        self.policy_timeouts = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latencies = Reservoir()
+        self.safety_events = {}
+        self.simulated_steps = 0
+        self.terminations = {}
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.has_memo = False
+        self.decision_calls = 0
+        self.decision_held = 0
+        self.has_decisions = False
+        self.outcome_hits = 0
+        self.outcome_misses = 0
+        self.telemetry_episodes = 0
+        self.min_ttc = None
+        self.headway_violations = 0
+        self.lane_changes = 0
+        self.max_abs_jerk = 0.0
+        self.profile = Profiler(enabled=True)
+        self.has_profile = False
+
+        for result in results:
+            self.add(result)
+
+    def add(self, r):
+        self.total += 1
+        if r.get('termination') in UNDECIDED_REASONS and not r['crashed']:
+            self.early_stopped += 1
+        elif r.get('termination') in POLICY_FAILURE_REASONS and not r['crashed']:
+            self.policy_failures += 1
+        else:
+            self._add_outcome(r)
+
+        if r.get('policy_time_ms'):
+            self.policy_mean_sum += r['policy_time_ms']['mean']
+            self.policy_mean_count += 1
+            self.policy_max = max(self.policy_max, r['policy_time_ms']['max'])
+        if r.get('policy_timeout'):
+            self.policy_timeouts += 1
+
+        if r.get('policy_cache_hit') is True:
+            self.cache_hits += 1
+        elif r.get('policy_cache_hit') is False:
+            self.cache_misses += 1
+
+        if r.get('llm_latency_s') is not None:
+            self.latencies.add(r['llm_latency_s'])
+
+        if r.get('outcome_cache_hit') is True:
+            self.outcome_hits += 1
+        else:
+            self.simulated_steps += r.get('steps', 0)
+            if r.get('outcome_cache_hit') is False:
+                self.outcome_misses += 1
+        if r.get('termination'):
+            self.terminations[r['termination']] = self.terminations.get(r['termination'], 0) + 1
+
+        if r.get('action_memo'):
+            self.has_memo = True
+            self.memo_hits += r['action_memo']['hits']
+            self.memo_misses += r['action_memo']['misses']
+
+        if r.get('decisions'):
+            self.has_decisions = True
+            self.decision_calls += r['decisions']['policy_calls']
+            self.decision_held += r['decisions']['held_steps']
+
+        telemetry = r.get('telemetry')
+        if telemetry:
+            self.telemetry_episodes += 1
+            if telemetry['min_ttc_s'] is not None:
+                self.min_ttc = min(self.min_ttc, telemetry['min_ttc_s']) if self.min_ttc is not None \
+                    else telemetry['min_ttc_s']
+            self.headway_violations += telemetry['headway_violations']
+            self.lane_changes += telemetry['lane_changes']
+            self.max_abs_jerk = max(self.max_abs_jerk, telemetry['max_abs_jerk'])
+
+        for name, n in r.get('safety_events', {}).items():
+            self.safety_events[name] = self.safety_events.get(name, 0) + n
+
+        if r.get('profile'):
+            self.has_profile = True
+            for name, entry in r['profile'].items():
+                self.profile.add(name, entry['total_s'], entry['count'])
+
+    def _add_outcome(self, r):
+        if r['crashed']:
+            self.crashes += 1
+
+        if "High" in r.get('expected_risk', ''):
+            self.high_risk_total += 1
+            if not r['crashed']:
+                self.high_risk_survived += 1
+
+        self.speed_sum += r['avg_speed']
+        self.total_dist += r.get('distance', 0)
+
+    @property
+    def decided(self):
+        """Episodes whose outcome counts: all but the early-stopped ones and the policy failures."""
+        return self.total - self.early_stopped - self.policy_failures
+
+    def _rate(self, count):
+        """count as a share of the decided episodes ("N/A" if none was, e.g. every policy failed)."""
+        if self.decided > 0:
+            return f"{(count / self.decided) * 100:.1f}%"
+        return "N/A" if self.total else "0%"
+
+    def collision_rate(self):
+        return self._rate(self.crashes)
+
+    def summary(self, run_profiler=None):
+        """
+        The report's aggregate section (everything except "details").
+        run_profiler: optional main-process Profiler merged into the "profile" section.
+        """
+        total = self.total
+        decided = self.decided
+        successes = decided - self.crashes
+        avg_speed = self.speed_sum / decided if decided > 0 else 0.0
+
+        llm_latency = {"calls": len(self.latencies)}
+        if self.latencies.values:
+            p50, p95, p99 = np.percentile(self.latencies.values, [50, 95, 99])
+            llm_latency.update({"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)})
+
+        summary = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "total_scenarios": total,
+            "early_stopped": self.early_stopped,
+            "policy_failures": self.policy_failures,
+            "success_rate": self._rate(successes),
+            "high_risk_scenarios": self.high_risk_total,
+            "high_risk_survival_rate": f"{(self.high_risk_survived / self.high_risk_total) * 100:.1f}%"
+            if self.high_risk_total > 0 else "N/A",
+            "collision_rate": self.collision_rate(),
+            "policy_exec_ms": {
+                "mean_per_step": round(self.policy_mean_sum / self.policy_mean_count, 4)
+                if self.policy_mean_count else 0.0,
+                "max_step": self.policy_max,
+                "timeouts": self.policy_timeouts
+            },
+            "average_speed_mps": round(float(avg_speed), 2),
+            "distance_covered_m": round(float(self.total_dist), 2),
+            "policy_cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+            "llm_latency_s": llm_latency,
+            "safety_events": dict(self.safety_events),
+            "simulated_steps": self.simulated_steps,
+            "terminations": dict(self.terminations)
+        }
+
+        if self.telemetry_episodes:
+            summary["telemetry"] = {"episodes": self.telemetry_episodes, "min_ttc_s": self.min_ttc,
+                                    "headway_violations": self.headway_violations,
+                                    "lane_changes": self.lane_changes, "max_abs_jerk": self.max_abs_jerk}
+
+        if self.outcome_hits or self.outcome_misses:
+            summary["outcome_cache"] = {"hits": self.outcome_hits, "misses": self.outcome_misses}
+
+        if self.has_decisions:
+            steps = self.decision_calls + self.decision_held
+            summary["decisions"] = {"policy_calls": self.decision_calls, "saved_calls": self.decision_held,
+                                    "decision_rate": round(self.decision_calls / steps, 4) if steps else 1.0}
+
+        if self.has_memo:
+            summary["action_memo"] = {"hits": self.memo_hits, "misses": self.memo_misses}
+
+        if self.has_profile or (run_profiler is not None and run_profiler.enabled):
+            profile = Profiler(enabled=True)
+            for source in (self.profile, run_profiler):
+                if source is None:
+                    continue
+                for name, total_s in source.totals.items():
+                    profile.add(name, total_s, source.counts[name])
+            summary["profile"] = profile.summary()
+
+        return summary
+
+
+def write_json_atomic(filename, data):
+    """Writes to a temporary file and renames it over `filename`, so readers never see half a report."""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{filename}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filename)
@@ -0,0 +1,209 @@
+import functools
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized across processes
+    fcntl = None
+
+from lmp_driver.envs.adapters import make_lmp_driver_config
+from lmp_driver.results_store import write_json_atomic
+
+DEFAULT_EPISODE_STEPS = 40  # The config's "duration" at policy_frequency 1: an episode that runs to its end
+MIN_FIT_SAMPLES = 8  # Timed episodes needed before the fitted coefficients replace the prior
+MAX_CHUNK_S = 30.0  # Predicted seconds of work handed to a worker at once, at most
+
+# Seconds per episode = setup + steps * (per_step + per_vehicle_step * vehicles): a rough prior
+# (about 0.2 s per step at density 1.0), replaced by a least-squares fit once enough episodes are timed
+PRIOR_COEFFICIENTS = (1.0, 0.05, 0.0075)
+
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive lock on <path>.lock, so concurrent runs take turns updating path."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+@functools.lru_cache(maxsize=None)
+def vehicles_count(density):
+    """Traffic spawned at `density` (as configured by make_lmp_driver_config)."""
+    return make_lmp_driver_config(density)["vehicles_count"]
+
+
+def scenario_features(dataset):
+    """
+    scenario id -> (env id, density, time of day, weather) for every scenario of a
+    ScenarioDataset view, read from its index: no record is parsed.
+    """
+    density = dataset.column("density")
+    density = np.where(np.isnan(density), 1.0, density)
+    return {
+        scenario_id: (env_id, float(d), time_of_day or "Day", weather or "Clear")
+        for scenario_id, env_id, d, time_of_day, weather in zip(
+            dataset.ids(), dataset.column("scenario"), density, dataset.column("time_of_day"),
+            dataset.column("weather"))
+    }
+
+
+class CostModel:
+    """
+    Predicts how long a scenario takes to simulate, from earlier runs.
+
+    history maps scenario id -> {"features", "steps", "sim_time_s"} for every finished
+    scenario (sim_time_s is missing when the episode was not timed on its own, e.g. in
+    a lockstep batch or served from the outcome cache). Predictions:
+    - a scenario timed before, with the same features, costs what it took last time;
+    - otherwise its steps are the last recorded ones for that id, else the mean over
+      scenarios with the same features, then the same env and density, then all of
+      them (DEFAULT_EPISODE_STEPS without history); crashes end episodes early, so
+      risky weather and dense traffic learn shorter episodes;
+    - steps become seconds with setup + steps * (per_step + per_vehicle_step *
+      vehicles), fitted by least squares on the timed episodes: denser traffic costs
+      more per step.
+    """
+
+    def __init__(self, history=None):
+        self.history = dict(history or {})
+        self.observed = {}  # What this process added, merged into the file by save()
+        self.coefficients = PRIOR_COEFFICIENTS
+        self.fitted = False
+        self._mean_steps = {}
+        self.fit()
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r") as f:
+                return cls(json.load(f).get("scenarios", {}))
+        except (json.JSONDecodeError, AttributeError):
+            print(f"⚠️ Warning: Ignoring the unreadable cost model {path}.")
+            return cls()
+
+    def save(self, path):
+        """
+        Merges what this process observed since its last save into the file. The re-read
+        and the write happen under a file lock, so concurrent runs (e.g. shards) keep
+        each other's entries. Cheap to call periodically: nothing to merge, nothing written.
+        """
+        if not self.observed:
+            return
+        with _file_lock(path):
+            history = CostModel.load(path).history
+            history.update(self.observed)
+            # The coefficients are refitted on every load; they are saved for inspection only
+            merged = CostModel(history)
+            write_json_atomic(path, {"coefficients": list(merged.coefficients), "scenarios": history})
+        self.observed = {}
+
+    def observe(self, result, features, timed=True):
+        """
+        Records a finished scenario's result (its features from scenario_features()).
+        timed=False keeps only its step count: its wall time (e.g. with video recording)
+        is not that of the headless runs the model predicts.
+        """
+        scenario_id = str(result["id"])
+        entry = {"features": list(features), "steps": result["steps"]}
+        if timed and result.get("sim_time_s") is not None:
+            entry["sim_time_s"] = result["sim_time_s"]
+        elif self.history.get(scenario_id, {}).get("steps") == result["steps"] and \
+                "sim_time_s" in self.history[scenario_id]:
+            entry["sim_time_s"] = self.history[scenario_id]["sim_time_s"]  # An earlier headless timing still holds
+        self.history[scenario_id] = self.observed[scenario_id] = entry
+
+    def fit(self):
+        """Refits the step means and, with enough timed episodes, the seconds-per-step coefficients."""
+        sums = {}
+        for entry in self.history.values():
+            env_id, density, time_of_day, weather = entry["features"]
+            for key in ((env_id, density, time_of_day, weather), (env_id, density), ()):
+                total, count = sums.get(key, (0, 0))
+                sums[key] = (total + entry["steps"], count + 1)
+        self._mean_steps = {key: total / count for key, (total, count) in sums.items()}
+
+        timed = [entry for entry in self.history.values() if entry.get("sim_time_s") is not None]
+        if len(timed) < MIN_FIT_SAMPLES:
+            return
+        steps = np.array([entry["steps"] for entry in timed], dtype=np.float64)
+        vehicles = np.array([vehicles_count(entry["features"][1]) for entry in timed], dtype=np.float64)
+        design = np.column_stack([np.ones_like(steps), steps, steps * vehicles])
+        seconds = np.array([entry["sim_time_s"] for entry in timed], dtype=np.float64)
+        coefficients, _, rank, _ = np.linalg.lstsq(design, seconds, rcond=None)
+        if rank == design.shape[1]:
+            # A negative term would make some scenarios "free"; clip it rather than trust it
+            self.coefficients = tuple(float(c) for c in np.maximum(coefficients, 0.0))
+            self.fitted = True
+
+    def expected_steps(self, scenario_id, features):
+        entry = self.history.get(scenario_id)
+        if entry is not None and tuple(entry["features"]) == tuple(features):
+            return entry["steps"]
+        env_id, density, _, _ = features
+        for key in (tuple(features), (env_id, density), ()):
+            if key in self._mean_steps:
+                return self._mean_steps[key]
+        return DEFAULT_EPISODE_STEPS
+
+    def predict(self, scenario_id, features):
+        """Expected simulation time of the scenario, in seconds."""
+        entry = self.history.get(scenario_id)
+        if (entry is not None and entry.get("sim_time_s") is not None
+                and tuple(entry["features"]) == tuple(features)):
+            return entry["sim_time_s"]
+        setup, per_step, per_vehicle_step = self.coefficients
+        return setup + self.expected_steps(scenario_id, features) * (
+            per_step + per_vehicle_step * vehicles_count(features[1]))
+
+
+def longest_first(dataset, model, features=None):
+    """
+    Orders a ScenarioDataset view by predicted cost, longest first (ties keep the
+    dataset order). Returns (reordered view, predicted seconds in the new order).
+    Starting the heavy scenarios first leaves only short ones for the end of a
+    sweep, instead of a few long episodes running alone while other workers idle.
+    """
+    features = scenario_features(dataset) if features is None else features
+    costs = np.array([model.predict(scenario_id, features[scenario_id]) for scenario_id in dataset.ids()])
+    order = np.argsort(-costs, kind="stable")
+    return dataset.reorder(order), costs[order]
+
+
+def guided_chunks(items, costs, workers, factor=2, max_chunk_s=MAX_CHUNK_S):
+    """
+    Splits items (in schedule order) into consecutive chunks for a pool of `workers`:
+    guided self-scheduling on predicted cost. Each chunk takes about
+    remaining cost / (factor * workers), capped at max_chunk_s, and at least one item.
+    Heavy scenarios therefore go out one at a time, runs of cheap ones (early crashes,
+    light traffic) share a round trip, and chunks shrink towards the end of the sweep
+    so every worker finishes at about the same time. The cap bounds how much work
+    reaches the results store at once. Yields lists.
+    """
+    remaining = float(np.sum(costs))
+    chunk, chunk_cost, target = [], 0.0, 0.0
+    for item, cost in zip(items, costs):
+        if not chunk:
+            target = min(remaining / (factor * max(workers, 1)), max_chunk_s)
+        chunk.append(item)
+        chunk_cost += cost
+        remaining -= cost
+        if chunk_cost >= target:
+            yield chunk
+            chunk, chunk_cost = [], 0.0
+    if chunk:
+        yield chunk
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+
+# highway-env's Vehicle.MAX_SPEED and Vehicle.LENGTH, kept here so importing this module does not
+# load the simulator; for_env() reads the live values
+VEHICLE_MAX_SPEED_MPS = 40.0
+VEHICLE_LENGTH_M = 5.0
+
+# Kinematics observation scales (highway-env's default features_range, which our config keeps)
+OBS_X_SCALE_M = 5.0 * VEHICLE_MAX_SPEED_MPS
+OBS_VX_SCALE_MPS = 2.0 * VEHICLE_MAX_SPEED_MPS
+
+HEADWAY_THRESHOLD_S = 1.0  # Time gap to the lead car below which a step counts as a headway violation
+
+# Column -> dtype. One row per observed state: row i is the state the policy saw at
+# step i and the action it chose; the last row is the final state (action -1).
+COLUMNS = {
+    "speed": np.float32,  # Ego speed, m/s
+    "x": np.float64,  # Ego position, m
+    "y": np.float64,
+    "lane": np.int8,
+    "lead_gap": np.float32,  # Centre-to-centre distance to the car ahead in the ego lane, m (nan: none visible)
+    "lead_rel_speed": np.float32,  # Ego speed minus the lead car's, m/s (positive: closing in)
+    "action": np.int8,
+    "crashed": np.bool_,
+}
+
+
+class EpisodeTelemetry:
+    """
+    Per-step ego telemetry in preallocated NumPy columns (see COLUMNS).
+
+    record() only writes one row of scalars, so the episode loop pays no more than a few
+    attribute reads per step; metrics() derives every episode figure from the columns
+    in vectorized passes once the episode is over. Capacity doubles if an episode
+    outgrows it.
+    """
+
+    def __init__(self, capacity=302, dt=1.0, x_scale=OBS_X_SCALE_M, vx_scale=OBS_VX_SCALE_MPS,
+                 vehicle_length=VEHICLE_LENGTH_M):
+        """
+        dt: seconds between two policy steps (1 / the env's policy_frequency).
+        x_scale / vx_scale: the observation's x and vx normalization; vehicle_length: the lead car's length (m).
+        """
+        self.dt = dt
+        self.x_scale = x_scale
+        self.vx_scale = vx_scale
+        self.vehicle_length = vehicle_length
+        self.rows = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, dt):
+        """A finished episode's telemetry from its arrays() (e.g. stored in the OutcomeCache)."""
+        telemetry = cls(capacity=0, dt=dt)
+        telemetry.columns = {name: np.asarray(arrays[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        telemetry.rows = len(telemetry.columns["speed"])
+        return telemetry
+
+    @classmethod
+    def for_env(cls, env, capacity=302):
+        from highway_env.vehicle.kinematics import Vehicle  # Loaded with the env already
+
+        return cls(capacity, dt=1.0 / env.unwrapped.config["policy_frequency"], x_scale=5.0 * Vehicle.MAX_SPEED,
+                   vx_scale=2.0 * Vehicle.MAX_SPEED, vehicle_length=Vehicle.LENGTH)
+
+    def record(self, primitives, action=-1):
+        """Call once the policy has chosen `action` for the state in `primitives` (action -1: final state)."""
+        i = self.rows
+        columns = self.columns
+        if i == len(columns["speed"]):
+            for name, values in columns.items():
+                columns[name] = np.concatenate([values, np.empty_like(values)])
+
+        vehicle = primitives.env.unwrapped.vehicle
+        columns["speed"][i] = vehicle.speed
+        columns["x"][i], columns["y"][i] = vehicle.position
+        columns["lane"][i] = vehicle.lane_index[2]
+        _, gap, rel_speed, _, _ = primitives.sensor_snapshot()
+        columns["lead_gap"][i] = gap * self.x_scale if gap < 1.0 else np.nan
+        columns["lead_rel_speed"][i] = rel_speed * self.vx_scale
+        columns["action"][i] = action
+        columns["crashed"][i] = vehicle.crashed
+        self.rows = i + 1
+
+    def arrays(self):
+        """The recorded rows of every column (views, not copies)."""
+        return {name: values[:self.rows] for name, values in self.columns.items()}
+
+    def metrics(self):
+        """
+        Episode figures from the columns:
+        - avg_speed (m/s, over the states after each step) and distance (m, path length);
+        - min_ttc_s: smallest gap / closing speed to the lead car (None if never closing in);
+        - headway_violations: states with a time gap to the lead car under HEADWAY_THRESHOLD_S;
+        - max_abs_jerk / rms_jerk (m/s^3, longitudinal, from speed differences);
+        - lane_changes: lane index changes between consecutive states.
+        """
+        c = self.arrays()
+        speed = c["speed"].astype(np.float64)
+        has_lead = ~np.isnan(c["lead_gap"])
+        bumper_gap = np.maximum(c["lead_gap"] - self.vehicle_length, 0.0)
+
+        closing = has_lead & (c["lead_rel_speed"] > 0)
+        ttc = bumper_gap[closing] / c["lead_rel_speed"][closing]
+        moving = has_lead & (speed > 0.1)
+        headway = bumper_gap[moving] / speed[moving]
+        jerk = np.diff(speed, n=2) / self.dt ** 2
+
+        return {
+            "avg_speed": round(float(speed[1:].mean()), 2) if len(speed) > 1 else 0.0,
+            "distance": round(float(np.hypot(np.diff(c["x"]), np.diff(c["y"])).sum()), 2),
+            "min_ttc_s": round(float(ttc.min()), 3) if ttc.size else None,
+            "headway_violations": int((headway < HEADWAY_THRESHOLD_S).sum()),
+            "max_abs_jerk": round(float(np.abs(jerk).max()), 3) if jerk.size else 0.0,
+            "rms_jerk": round(float(np.sqrt(np.mean(jerk ** 2))), 3) if jerk.size else 0.0,
+            "lane_changes": int(np.count_nonzero(np.diff(c["lane"]))),
+        }
+
+    def save(self, directory, scenario_id, metrics=None):
+        """Writes <directory>/<scenario_id>.npz: every column, plus dt and the metrics (as 0-d arrays)."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{scenario_id}.npz")
+        metrics = self.metrics() if metrics is None else metrics
+        extra = {f"metric_{name}": np.float64(np.nan if value is None else value) for name, value in metrics.items()}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, dt=np.float64(self.dt), **self.arrays(), **extra)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Why an episode ended; saved in each result under "termination"
+DONE = "done"  # The env terminated (crash or off-road)
+TIME_LIMIT = "time_limit"  # The env's own duration ran out
+MAX_STEPS = "max_steps"  # The benchmark's 300-step cap
+POLICY_TIMEOUT = "policy_timeout"
+RUNTIME_ERROR = "runtime_error"
+CRASH = "crash"  # Early: stop_on_crash
+EGO_ALONE = "ego_alone"  # Early: nobody in sensor range for alone_steps steps
+STEADY_STATE = "steady_state"  # Early: nothing changed for steady_steps steps
+
+EARLY_REASONS = (CRASH, EGO_ALONE, STEADY_STATE)
+# Early stops that cut a crash-free episode short: its outcome (and distance) is not that of a full run
+UNDECIDED_REASONS = (EGO_ALONE, STEADY_STATE)
+# Ends caused by the policy itself (too slow, or raised): a failed episode, whatever the traffic did
+POLICY_FAILURE_REASONS = (POLICY_TIMEOUT, RUNTIME_ERROR)
+
+
+def episode_success(crashed, termination):
+    """A result's "success": False for a crash or a policy failure, None for an undecided early stop."""
+    if crashed or termination in POLICY_FAILURE_REASONS:
+        return False
+    if termination in UNDECIDED_REASONS:
+        return None
+    return True
+
+
+class TerminationPolicy:
+    """
+    Which early-termination shortcuts an episode may take, on top of done/truncated
+    and the step cap. All are off by default.
+    - stop_on_crash: end the episode at the first crash (the outcome is decided).
+    - alone_steps: end it once no other vehicle has been observed for this many steps.
+    - steady_steps: end it once the ego has kept its action, lane and speed (within
+      steady_tolerance, normalized units) for this many steps, while the gap to the
+      car ahead stayed at least steady_min_gap and was not closing.
+    Stateless, so one instance can be shared (and pickled to workers); per-episode
+    state lives in the EpisodeTracker returned by start().
+    """
+
+    def __init__(self, stop_on_crash=False, alone_steps=0, steady_steps=0, steady_tolerance=0.01,
+                 steady_min_gap=0.15):
+        self.stop_on_crash = stop_on_crash
+        self.alone_steps = alone_steps
+        self.steady_steps = steady_steps
+        self.steady_tolerance = steady_tolerance
+        self.steady_min_gap = steady_min_gap
+
+    @property
+    def enabled(self):
+        return bool(self.stop_on_crash or self.alone_steps or self.steady_steps)
+
+    def start(self):
+        return EpisodeTracker(self)
+
+
+class EpisodeTracker:
+    """Per-episode counters for a TerminationPolicy; call check() after every step."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.alone_for = 0
+        self.steady_for = 0
+        self._last = None  # (action, ego y, ego vx, lead gap) of the previous step
+
+    def check(self, obs, action, crashed):
+        """Returns the early-termination reason for this step, or None to keep going."""
+        policy = self.policy
+        if policy.stop_on_crash and crashed:
+            return CRASH
+
+        ego = obs[0]
+        neighbors = obs[1:]
+        present = neighbors[:, 0] == 1
+
+        if policy.alone_steps:
+            self.alone_for = 0 if present.any() else self.alone_for + 1
+            if self.alone_for >= policy.alone_steps:
+                return EGO_ALONE
+
+        if policy.steady_steps:
+            ahead = present & (np.abs(neighbors[:, 2] - ego[2]) < 0.1) & (neighbors[:, 1] > 0)
+            gap = min(float(neighbors[ahead, 1].min()), 1.0) if ahead.any() else 1.0
+            state = (action, ego[2], ego[3], gap)
+            last = self._last
+            self._last = state
+            tol = policy.steady_tolerance
+            steady = (last is not None and action == last[0] and abs(ego[2] - last[1]) < tol
+                      and abs(ego[3] - last[2]) < tol and policy.steady_min_gap <= gap
+                      and gap > last[3] - tol)
+            self.steady_for = self.steady_for + 1 if steady else 0
+            if self.steady_for >= policy.steady_steps:
+                return STEADY_STATE
+
+        return None
@@ -1,51 +1,66 @@
-import numpy as np
-from highway_env.vehicle.controller import ControlledVehicle
+from highway_env.vehicle.behavior import IDMVehicle
+from highway_env.vehicle.controller import ControlledVehicle, MDPVehicle
 
+from lmp_driver.weather import WEATHER_FRICTION, weather_friction  # noqa: F401 (re-exported)
 
-class PhysicsVehicle(ControlledVehicle):
+MAX_DRY_ACCEL = 5.0  # m/s^2 the tires can transmit on a dry road
+
+
+class FrictionMixin:
     """
-    A Vehicle that reacts to 'Friction' and 'Weather'.
-    If the friction is low, the vehicle cannot accelerate or turn as sharply.
+    Makes a highway-env vehicle react to 'Friction' and 'Weather'.
+    If the friction is low, the vehicle cannot accelerate, brake or turn as sharply.
+
+    The acceleration limit is computed once in set_friction(), not on every act():
+    act() runs for every vehicle at every simulation substep. On a dry road
+    (friction 1.0) act() is left exactly as highway-env implements it.
     """
 
-    def __init__(self, road, position, heading=0, speed=0, target_lane_index=None, target_speed=None, route=None):
-        super().__init__(road, position, heading, speed, target_lane_index, target_speed, route)
-        self.friction = 1.0  # Default: Dry Road (1.0)
+    friction = 1.0  # Default: Dry Road (1.0)
+    max_grip_accel = None  # None = no extra limit
 
     def set_weather_friction(self, weather):
         """
         Adjusts grip based on weather conditions.
         """
-        weather = weather.lower()
-        if "rain" in weather:
-            self.friction = 0.6  # 40% loss of grip
-        elif "snow" in weather or "ice" in weather:
-            self.friction = 0.3  # 70% loss of grip (Dangerous!)
-        else:
-            self.friction = 1.0
+        self.set_friction(weather_friction(weather))
+
+    def set_friction(self, friction):
+        self.friction = friction
+        self.max_grip_accel = MAX_DRY_ACCEL * friction if friction < 1.0 else None
 
     def act(self, action=None):
         """
         Override the control loop to apply physical limits.
         """
         super().act(action)
+        if self.max_grip_accel is not None and self.action is not None:
+            self._apply_grip_limit()
+
+    def _apply_grip_limit(self):
+        limit = self.max_grip_accel
+
+        # Clip acceleration to what the tires can actually handle (plain comparisons:
+        # np.clip on a Python scalar costs several microseconds per call)
+        action = self.action
+        accel = action.get('acceleration', 0)
+        if accel > limit:
+            action['acceleration'] = limit
+        elif accel < -limit:
+            action['acceleration'] = -limit
+
+        # Reduce steering responsiveness
+        if 'steering' in action:
+            action['steering'] *= self.friction
+
+
+class PhysicsVehicle(FrictionMixin, ControlledVehicle):
+    """A ControlledVehicle that reacts to 'Friction' and 'Weather'."""
+
+
+class FrictionMDPVehicle(FrictionMixin, MDPVehicle):
+    """The ego car: DiscreteMetaAction's MDPVehicle with weather friction."""
+
 
-        # If friction is low, we cannot accelerate/brake effectively
-        if self.action is not None:
-            # Scale the effectiveness of the throttle/brake by friction
-            # In highway-env, action['acceleration'] is usually clamped to ranges.
-            # We forcibly reduce that range.
-
-            current_accel = self.action.get('acceleration', 0)
-            max_grip_accel = 5.0 * self.friction  # Assuming 5 m/s^2 is max dry accel
-
-            # Clip acceleration to what the tires can actually handle
-            self.action['acceleration'] = np.clip(
-                current_accel,
-                -max_grip_accel,  # Braking limit
-                max_grip_accel  # Acceleration limit
-            )
-
-            # Reduce steering responsiveness
-            if 'steering' in self.action:
-                self.action['steering'] *= self.friction
+class FrictionIDMVehicle(FrictionMixin, IDMVehicle):
+    """Traffic: highway-env's IDM/MOBIL vehicle with weather friction."""
@@ -0,0 +1,18 @@
+import functools
+
+# Weather keyword -> friction coefficient, first match wins. Anything else is a dry road (1.0).
+WEATHER_FRICTION = (
+    ("rain", 0.6),  # 40% loss of grip
+    ("snow", 0.3),  # 70% loss of grip (Dangerous!)
+    ("ice", 0.3),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def weather_friction(weather):
+    """Friction coefficient for a scenario's weather string (e.g. "Rain", "Heavy Snow")."""
+    weather = weather.lower()
+    for keyword, friction in WEATHER_FRICTION:
+        if keyword in weather:
+            return friction
+    return 1.0
@@ -1,20 +1,64 @@
+import argparse
 import datetime
+import hashlib
+import itertools
 import json
 import os
+import secrets
 import sys
 import time
+from multiprocessing import Pool
 
 import numpy as np
-from gymnasium.wrappers import RecordVideo
+
+_START = time.perf_counter()  # Before the project imports, for run-one's time-to-first-step
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lmp_driver.envs.adapters import make_lmp_driver_env
+from lmp_driver import logger as bench_logger
+from lmp_driver.envs.adapters import apply_weather_friction, make_lmp_driver_config, make_lmp_driver_env
+from lmp_driver.weather import weather_friction
+from lmp_driver.envs.pool import EnvPool
 from lmp_driver.primitives import LLMDriverPrimitives
+from lmp_driver.batched_primitives import BatchedLLMDriverPrimitives, stack_observations
 from lmp_driver.agent import LLMAgent
+from lmp_driver.backends import BACKENDS, make_backend
+from lmp_driver.dataset import open_dataset
+from lmp_driver.executor import (DEFAULT_STEP_BUDGET_S, PolicyExecutor, PolicyTimeoutError, alarm_window,
+                                 policy_hash)
+from lmp_driver.pipeline import BatchPolicyGenerator, PolicyPrefetcher
+from lmp_driver.outcome_cache import OutcomeCache
+from lmp_driver.policy_cache import PolicyCache
+from lmp_driver.policy_traces import ActionMemo, MemoizedPolicy, PolicyTraceRecorder
+from lmp_driver.profiling import Profiler, run_with_cprofile
+from lmp_driver.telemetry import EpisodeTelemetry
+from lmp_driver.results_store import ResultsStore, RunningSummary, write_json_atomic
+from lmp_driver.scheduler import CostModel, guided_chunks, longest_first, scenario_features
+from lmp_driver.termination import (DONE, MAX_STEPS, POLICY_FAILURE_REASONS, POLICY_TIMEOUT, RUNTIME_ERROR,
+                                    TIME_LIMIT, TerminationPolicy, episode_success)
 
-SAVE_INTERVAL = 5  # Save results every 5 scenarios
+SAVE_INTERVAL = 5  # Print a progress summary every 5 scenarios
+DATASET_FILE = os.path.join("dataset", "LaMPilot-Bench.json")
 REPORT_FILE = "results/benchmark_report.json"
+RESULTS_FILE = "results/benchmark_results.jsonl"  # Append-only, one record per finished scenario
+POLICY_CACHE_FILE = "results/policy_cache.sqlite"
+POLICY_CACHE_MAX_ENTRIES = 1024
+OUTCOME_CACHE_FILE = "results/outcome_cache.sqlite"
+OUTCOME_CACHE_MAX_ENTRIES = 100000
+TRACES_DIR = "results/policy_traces"
+TELEMETRY_DIR = "results/telemetry"
+COST_MODEL_FILE = "results/scenario_costs.json"
+COST_MODEL_SAVE_INTERVAL = 50  # Merge new timings into COST_MODEL_FILE every 50 scenarios (and at the end)
+LLM_MAX_CONNECTIONS = 10
+MODEL_NAME = "openai/gpt-oss-20b"
+DEFAULT_ENVIRONMENT = {
+    "weather": "Clear",
+    "time_of_day": "Day",
+    "density": 1.0
+}
+
+
+_decision_logs = {}  # filename -> AsyncWriter
 
 
 def log_decision_cycle(command, context, lmp_code, filename="talk2drive_log.json"):
@@ -24,230 +68,1206 @@ def log_decision_cycle(command, context, lmp_code, filename="talk2drive_log.json
         "context": context,  # Weather, Time, Density
         "lmp": lmp_code  # The generated Python policy
     }
-    with open(filename, "a") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    writer = _decision_logs.get(filename)
+    if writer is None:
+        writer = _decision_logs[filename] = bench_logger.AsyncWriter(path=filename)
+    writer.write(json.dumps(log_entry) + "\n")
+
+
+def flush_logs():
+    """Waits for the background log writers of this process to catch up."""
+    bench_logger.get_logger().flush()
+    for writer in _decision_logs.values():
+        writer.flush()
+
+
+def save_evaluation_results(results, filename=REPORT_FILE, run_profiler=None, running=None):
+    """
+    Saves the final metrics to a JSON file (atomically: a crash never leaves half a report).
+    - run_profiler: optional main-process Profiler, merged into the report's "profile" section.
+    - running: RunningSummary already holding `results`; rebuilt from `results` if omitted.
+    """
+    if running is None:
+        running = RunningSummary(results)
 
+    summary = running.summary(run_profiler)
+    summary["details"] = results
 
-def save_evaluation_results(results, filename=REPORT_FILE):
-    """Saves the final metrics to a JSON file."""
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    write_json_atomic(filename, summary)
+    print(f"    💾 Report saved to {filename}")
+
+    return summary
+
+
+def close_scenario_env(env, env_pool=None):
+    """Ends a scenario: saves a pending video, then returns the env to the pool (or closes it)."""
+    if env_pool is None:
+        env.close()
+        return
 
-    total = len(results)
-    crashes = sum(1 for r in results if r['crashed'])
-    successes = total - crashes
+    if hasattr(env, "stop_recording"):  # RecordVideo, imported only when recording
+        if env.recording:
+            env.stop_recording()
+        env = env.env
+    env_pool.release(env)
 
-    high_risk_runs = [r for r in results if "High" in r.get('expected_risk', '')]
-    high_risk_total = len(high_risk_runs)
-    high_risk_survived = sum(1 for r in high_risk_runs if not r['crashed'])
 
-    if total > 0:
-        raw_avg = np.mean([r['avg_speed'] for r in results])
-        avg_speed = float(raw_avg)
+def _get_policy(instruction, env_params, agent=None, prefetched=None, profiler=None):
+    """
+    Returns (policy_code, policy_cache_hit, llm_latency_s) for a scenario, taken from a
+    prefetched item or generated by `agent` (built on the fly if omitted).
+    Returns None if no policy could be obtained.
+    """
+    log = bench_logger.get_logger()
+    profiler = profiler or Profiler()
+    if prefetched is not None:
+        if prefetched['error']:
+            log.error(f"    ❌ Policy Generation Failed: {prefetched['error']}")
+            return None
+        policy_code = prefetched['code']
+        policy_cache_hit = prefetched['cache_hit']
+        llm_latency = prefetched['latency']
     else:
-        avg_speed = 0.0
+        if agent is None:
+            try:
+                agent = LLMAgent(model_name=MODEL_NAME)
+            except ValueError as e:
+                log.error(f"    ❌ Setup Error: {e}")
+                return None
 
-    total_dist = float(sum(r.get('distance', 0) for r in results))
+        log.info("    Generating Policy...")
+        try:
+            with profiler.timer("generate_policy"):
+                policy_code = agent.generate_policy(instruction, env_params)
+        except ValueError as e:  # E.g. a cache miss without an API key
+            log.error(f"    ❌ Setup Error: {e}")
+            return None
+        policy_cache_hit = agent.last_cache_hit
+        llm_latency = agent.last_call_latency
+    llm_latency = round(llm_latency, 3) if llm_latency is not None else None
+    log_decision_cycle(instruction, env_params, policy_code)
+    return policy_code, policy_cache_hit, llm_latency
 
-    summary = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "total_scenarios": total,
-        "success_rate": f"{(successes / total) * 100:.1f}%" if total > 0 else "0%",
-        "high_risk_scenarios": high_risk_total,
-        "high_risk_survival_rate": f"{(high_risk_survived / high_risk_total) * 100:.1f}%" if high_risk_total > 0 else "N/A",
-        "collision_rate": f"{(crashes / total) * 100:.1f}%" if total > 0 else "0%",
-        "average_speed_mps": round(avg_speed, 2),
-        "distance_covered_m": round(total_dist, 2),
-        "details": results
+
+def _make_scenario_env(scenario_data, env_params, video_folder, record_video, env_pool=None, profiler=None):
+    """Builds (or takes from the pool) the scenario's env, wrapped in RecordVideo when recording."""
+    profiler = profiler or Profiler()
+    make_env = env_pool.acquire if env_pool is not None else make_lmp_driver_env
+    with profiler.timer("env_setup"):
+        env = make_env(
+            scenario_data['scenario'],
+            density=env_params['density'],
+            time_of_day=env_params['time_of_day'],
+            render_mode="rgb_array" if record_video else None
+        )
+
+    if record_video:
+        from gymnasium.wrappers import RecordVideo  # Pulls in moviepy; headless runs never import it
+
+        env = RecordVideo(
+            env,
+            video_folder=video_folder,
+            name_prefix=f"scenario_{scenario_data['id']}",
+            disable_logger=True
+        )
+    return env
+
+
+def _apply_weather(env, weather):
+    """Sets every vehicle's friction for `weather`; call after reset(), once the cars are spawned."""
+    friction = apply_weather_friction(env, weather)
+    if friction < 1.0:
+        bench_logger.get_logger().info(f"    🌧️ Physics Applied: {weather} (friction {friction})")
+
+
+def _policy_hooks(policy_function, scenario_id, seed, weather, action_memo=None, trace_dir=None):
+    """
+    Returns (policy_call, recorder): what the episode loop calls each step (the executor,
+    or an ActionMemo wrapper around it) and an optional PolicyTraceRecorder.
+    """
+    friction = weather_friction(weather)
+    policy_call = policy_function
+    if action_memo is not None:
+        policy_call = action_memo.wrap(policy_function, policy_function.policy_hash, friction)
+    recorder = None
+    if trace_dir is not None:
+        recorder = PolicyTraceRecorder(trace_dir, policy_function.policy_hash, scenario_id, seed, friction)
+    return policy_call, recorder
+
+
+def _finish_policy_hooks(result, policy_call, recorder):
+    if isinstance(policy_call, MemoizedPolicy):
+        result["action_memo"] = policy_call.stats()
+    if recorder is not None:
+        recorder.save()
+
+
+def _outcome_key(outcome_cache, scenario_data, env_params, policy_code, termination=None, action_memo=None,
+                 decision_mode=None):
+    """
+    The scenario's OutcomeCache key, or None when its outcome is not cacheable: no
+    cache, no fixed seed, or memoized actions (which depend on what ran before).
+    """
+    if outcome_cache is None or action_memo is not None or scenario_data.get('seed') is None:
+        return None
+    return outcome_cache.make_key(
+        policy_hash(policy_code), scenario_data['scenario'],
+        make_lmp_driver_config(env_params['density'], env_params['time_of_day']),
+        weather_friction(env_params['weather']), scenario_data['seed'], termination, decision_mode
+    )
+
+
+def _cached_outcome_result(scenario_data, env_params, policy, outcome, telemetry_dir=None):
+    """
+    A scenario's result rebuilt from an OutcomeCache entry instead of a simulation.
+    With telemetry_dir, the stored per-step arrays are written there as a simulated episode's would be.
+    """
+    _, policy_cache_hit, llm_latency = policy
+    fields, arrays = outcome
+    if telemetry_dir is not None:
+        telemetry = EpisodeTelemetry.from_arrays(arrays, float(arrays["dt"]))
+        metrics = {"avg_speed": fields["avg_speed"], "distance": fields["distance"], **fields["telemetry"]}
+        telemetry.save(telemetry_dir, scenario_data['id'], metrics)
+    result = {
+        "id": scenario_data['id'],
+        "instruction": scenario_data['instruction'],
+        "weather": env_params['weather'],
+        "expected_risk": scenario_data.get('expected_risk', 'Unknown'),
+        "seed": scenario_data['seed'],
+        **fields,
+        # Re-scored: an entry stored before policy failures counted as failures says otherwise
+        "success": episode_success(fields['crashed'], fields.get('termination')),
+        "policy_cache_hit": policy_cache_hit,
+        "llm_latency_s": llm_latency,
+        "outcome_cache_hit": True
     }
+    _log_outcome(scenario_data, result['crashed'], " (cached outcome)", result.get('termination'))
+    return result
 
-    with open(filename, "w") as f:
-        json.dump(summary, f, indent=4)
-        print(f"    💾 Checkpoint saved to {filename}")
 
-    return summary
+def _store_outcome(outcome_cache, key, result, telemetry):
+    result["outcome_cache_hit"] = False
+    # A timeout depends on the machine's speed, not on the episode: never replay one
+    if not result['policy_timeout']:
+        outcome_cache.put(key, result, {**telemetry.arrays(), "dt": np.float64(telemetry.dt)})
 
 
-def run_single_scenario(scenario_data, video_folder):
-    scenario_id = scenario_data['id']
-    instruction = scenario_data['instruction']
+def _compilation_failed_result(scenario_id, env_params, seed, policy, profiler=None):
+    _, policy_cache_hit, llm_latency = policy
+    result = {"id": scenario_id, "crashed": True, "error": "Compilation Failed", "avg_speed": 0, "distance": 0,
+              "steps": 0, "weather": env_params['weather'], "seed": seed, "policy_cache_hit": policy_cache_hit,
+              "llm_latency_s": llm_latency}
+    if profiler is not None:
+        result["profile"] = profiler.summary()
+    return result
+
+
+def _finish_telemetry(telemetry, primitives, obs, scenario_id, telemetry_dir=None):
+    """Records the episode's final state (call before the env is closed); returns the episode metrics."""
+    primitives.update(obs)
+    telemetry.record(primitives)
+    metrics = telemetry.metrics()
+    if telemetry_dir is not None:
+        telemetry.save(telemetry_dir, scenario_id, metrics)
+    return metrics
 
+
+def _episode_result(scenario_data, env_params, seed, policy, policy_function, primitives,
+                    crashed, step_count, metrics, trace, policy_timeout, termination_reason):
+    """Builds a finished episode's result from its telemetry metrics and logs its outcome."""
+    _, policy_cache_hit, llm_latency = policy
     expected_risk = scenario_data.get('expected_risk', 'Unknown')
+    metrics = dict(metrics)
+    avg_speed = metrics.pop("avg_speed")
+    distance = metrics.pop("distance")
+
+    result = {
+        "id": scenario_data['id'],
+        "instruction": scenario_data['instruction'],
+        "weather": env_params['weather'],
+        "expected_risk": expected_risk,
+        "seed": seed,
+        "crashed": crashed,
+        # A policy failure is no success; an episode stopped early without a crash has no verdict
+        "success": episode_success(crashed, termination_reason),
+        "steps": step_count,
+        "avg_speed": avg_speed,
+        "distance": distance,
+        "trace_hash": trace.hexdigest()[:16],
+        "policy_cache_hit": policy_cache_hit,
+        "llm_latency_s": llm_latency,
+        "policy_time_ms": policy_function.stats(),
+        "policy_timeout": policy_timeout,
+        "termination": termination_reason,
+        "safety_events": dict(primitives.safety_events),
+        "telemetry": metrics
+    }
+    if primitives.decision_quantum is not None:
+        result["decisions"] = primitives.decision_stats()
 
-    env_params = scenario_data.get('environment', {
-        "weather": "Clear",
-        "time_of_day": "Day",
-        "density": 1.0
-    })
+    _log_outcome(scenario_data, crashed, termination=termination_reason)
+    return result
 
-    print(f"\n>>> RUNNING SCENARIO {scenario_id} [{expected_risk} Risk]")
-    print(f"    Instruction: {instruction}")
-    print(f"    Context: {env_params}")
 
-    env = make_lmp_driver_env(
-        scenario_data['scenario'],
-        density=env_params['density'],
-        time_of_day=env_params['time_of_day']
+def _log_outcome(scenario_data, crashed, note="", termination=None):
+    expected_risk = scenario_data.get('expected_risk', 'Unknown')
+    status_icon = "❌" if episode_success(crashed, termination) is False else "✅"
+    if termination in POLICY_FAILURE_REASONS and not crashed:
+        note = f" | Policy failed: {termination}{note}"
+    risk_icon = "⚠️" if "High" in expected_risk else "safe"
+    bench_logger.get_logger().info(
+        f"    {status_icon} Result [{scenario_data['id']}]: Crashed={crashed} | Risk Level: {risk_icon} {expected_risk}"
+        f"{note}"
     )
 
-    env.unwrapped.render_mode = "rgb_array"
 
-    env = RecordVideo(
-        env,
-        video_folder=video_folder,
-        name_prefix=f"scenario_{scenario_id}",
-        disable_logger=True
-    )
+def run_single_scenario(scenario_data, video_folder, agent=None, prefetched=None,
+                        step_budget=DEFAULT_STEP_BUDGET_S, record_video=True, env_pool=None,
+                        profile=False, cprofile_id=None, termination=None, action_memo=None, trace_dir=None,
+                        outcome_cache=None, telemetry_dir=None, decision_mode=None):
+    """
+    - agent: shared LLMAgent (one per process). Built on the fly if omitted.
+    - prefetched: optional item from PolicyPrefetcher. When given, the policy was already
+      generated ahead of time and no LLM call is made here.
+    - step_budget: wall-clock seconds allowed for one policy(api) call.
+    - record_video: False runs headless (no rendering, no video encoding).
+    - env_pool: optional EnvPool to reuse already-constructed envs across scenarios.
+    - profile: time each phase (LLM, policy compile/steps, env setup/reset/step, teardown
+      and video writing) and attach the totals to the result under "profile".
+    - cprofile_id: run this scenario id under cProfile and dump results/profile_<id>.pstats.
+    - termination: optional TerminationPolicy allowing the episode to stop early (first
+      crash, ego alone, steady state). Why the episode ended is saved under "termination".
+    - action_memo: optional ActionMemo reusing this process's earlier actions of the same
+      policy for (quantized) identical sensor readings; hit counts go under "action_memo".
+    - trace_dir: save the episode's (sensor features -> action) trace under this directory.
+    - outcome_cache: optional OutcomeCache. A seeded scenario whose policy, env, friction
+      and termination settings match a stored episode returns that outcome without
+      simulating (unless recording video or a trace); simulated outcomes are stored.
+    - telemetry_dir: save the episode's per-step telemetry as <telemetry_dir>/<id>.npz.
+    - decision_mode: optional (quantum, max_hold_steps). The policy then only runs again
+      when the quantized sensor state changes or after max_hold_steps held steps (see
+      LLMDriverPrimitives.set_decision_mode()); calls made and saved go under "decisions".
+    sim_time_s is the episode's wall time from env setup to teardown (what the
+    scheduler's CostModel learns from).
+    avg_speed, distance and the "telemetry" metrics (time-to-collision, headway, jerk,
+    lane changes) come from the ego vehicle's true state, recorded every step.
+    The env is reset with scenario_data['seed'] when present, otherwise with a fresh
+    random seed. Either way the seed is saved in the result so the episode can be re-run.
+    The result's trace_hash fingerprints every observation and action of the episode,
+    so two runs of the same scenario can be checked for bit-identical behaviour.
+    """
+    scenario_id = scenario_data['id']
+    if cprofile_id is not None and scenario_id == cprofile_id:
+        return run_with_cprofile(
+            os.path.join("results", f"profile_{scenario_id}.pstats"), run_single_scenario,
+            scenario_data, video_folder, agent, prefetched, step_budget, record_video, env_pool, profile,
+            None, termination, action_memo, trace_dir, outcome_cache, telemetry_dir, decision_mode
+        )
 
-    primitives = LLMDriverPrimitives(env)
-    try:
-        agent = LLMAgent(model_name="openai/gpt-oss-20b")
-    except ValueError as e:
-        print(f"    ❌ Setup Error: {e}")
+    instruction = scenario_data['instruction']
+    profiler = Profiler(enabled=profile)
+    log = bench_logger.get_logger()
+
+    expected_risk = scenario_data.get('expected_risk', 'Unknown')
+
+    env_params = scenario_data.get('environment', DEFAULT_ENVIRONMENT)
+
+    seed = scenario_data.get('seed')
+    if seed is None:
+        seed = secrets.randbelow(2 ** 31)
+
+    log.info(f"\n>>> RUNNING SCENARIO {scenario_id} [{expected_risk} Risk]")
+    log.info(f"    Instruction: {instruction}")
+    log.info(f"    Context: {env_params}")
+
+    policy = _get_policy(instruction, env_params, agent, prefetched, profiler)
+    if policy is None:
         return None
+    policy_code = policy[0]
 
-    print("    Generating Policy...")
-    policy_code = agent.generate_policy(instruction, env_params)
-    log_decision_cycle(instruction, env_params, policy_code)
+    outcome_key = _outcome_key(outcome_cache, scenario_data, env_params, policy_code, termination, action_memo,
+                               decision_mode)
+    if outcome_key is not None and not (record_video or trace_dir):
+        outcome = outcome_cache.get(outcome_key)
+        if outcome is not None:
+            return _cached_outcome_result(scenario_data, env_params, policy, outcome, telemetry_dir)
+
+    sim_start = time.perf_counter()
+    env = _make_scenario_env(scenario_data, env_params, video_folder, record_video, env_pool, profiler)
+    primitives = LLMDriverPrimitives(env)
+    if decision_mode is not None:
+        primitives.set_decision_mode(*decision_mode)
 
-    exec_scope = {}
     try:
-        exec(policy_code, {}, exec_scope)
-        if 'policy' not in exec_scope:
-            raise ValueError("LLM response did not contain 'def policy(api):'")
-        policy_function = exec_scope['policy']
+        with profiler.timer("policy_compile"):
+            policy_function = PolicyExecutor(policy_code, step_budget=step_budget)
     except Exception as e:
-        print(f"    ❌ Code Compilation Failed: {e}")
-        env.close()
-        return {"id": scenario_id, "crashed": True, "error": "Compilation Failed", "avg_speed": 0, "distance": 0,
-                "steps": 0, "weather": env_params['weather']}
+        log.error(f"    ❌ Code Compilation Failed: {e}")
+        close_scenario_env(env, env_pool)
+        return _compilation_failed_result(scenario_id, env_params, seed, policy, profiler if profile else None)
 
-    print(f"    🎥 Recording to {video_folder}/scenario_{scenario_id}-episode-0.mp4")
-    obs, info = env.reset()
+    if record_video:
+        log.info(f"    🎥 Recording to {video_folder}/scenario_{scenario_id}-episode-0.mp4")
+    with profiler.timer("env_reset"):
+        obs, info = env.reset(seed=seed)
+    trace = hashlib.sha256(obs.tobytes())
 
     # APPLY PHYSICS NOW (After the car is spawned)
-    try:
-        ego_vehicle = env.unwrapped.vehicle
-        if hasattr(ego_vehicle, 'set_weather_friction'):
-            ego_vehicle.set_weather_friction(env_params['weather'])
-            print(f"    🌧️ Physics Applied: {env_params['weather']}")
-    except AttributeError:
-        pass
+    _apply_weather(env, env_params['weather'])
 
     done = False
     truncated = False
     step_count = 0
-    speeds = []
+    telemetry = EpisodeTelemetry.for_env(env)
     crashed = False
+    policy_timeout = False
+    termination_reason = None
+    tracker = termination.start() if termination is not None else None
+    policy_call, recorder = _policy_hooks(policy_function, scenario_id, seed, env_params['weather'],
+                                          action_memo, trace_dir)
 
     while not (done or truncated):
         primitives.update(obs)
 
         try:
-            policy_function(primitives)
+            primitives.decide(policy_call)
+        except PolicyTimeoutError as e:
+            policy_timeout = True
+            termination_reason = POLICY_TIMEOUT
+            log.warning(f"    ⏱️ {e}")
+            break
         except Exception as e:
-            print(f"    ⚠️ Runtime Error: {e}")
+            termination_reason = RUNTIME_ERROR
+            log.warning(f"    ⚠️ Runtime Error: {e}")
             break
+        if recorder is not None:
+            recorder.record(primitives)
+        telemetry.record(primitives, primitives.action)
 
-        obs, reward, done, truncated, info = env.step(primitives.action)
-
-        # Track Metrics
-        speed = primitives.get_ego_speed() * 30  # Approx m/s
-        speeds.append(speed)
+        with profiler.timer("env_step"):  # Includes frame capture when recording
+            obs, reward, done, truncated, info = env.step(primitives.action)
+        trace.update(bytes([primitives.action]))
+        trace.update(obs.tobytes())
 
         if info.get('crashed', False):
             crashed = True
-            print("    💥 CRASH DETECTED!")
+            log.info("    💥 CRASH DETECTED!")
 
         step_count += 1
         # Stop after 20 seconds (15 FPS * 20 = 300 steps)
         if step_count > 300:
+            termination_reason = MAX_STEPS
             break
 
-    env.close()
+        if tracker is not None:
+            termination_reason = tracker.check(obs, primitives.action, crashed)
+            if termination_reason is not None:
+                log.info(f"    ⏹️ Stopped early: {termination_reason} after {step_count} steps")
+                break
 
-    avg_speed = np.mean(speeds) if speeds else 0
-    distance = avg_speed * (step_count / 15.0)  # approx
+    if termination_reason is None:
+        termination_reason = DONE if done else TIME_LIMIT
 
-    result = {
-        "id": scenario_id,
-        "instruction": instruction,
-        "weather": env_params['weather'],
-        "expected_risk": expected_risk,
-        "crashed": crashed,
-        "success": not crashed,
-        "steps": step_count,
-        "avg_speed": round(float(avg_speed), 2),
-        "distance": round(float(distance), 2)
-    }
+    policy_function.close()
+    profiler.add("policy_step", sum(policy_function.step_times), len(policy_function.step_times))
+    metrics = _finish_telemetry(telemetry, primitives, obs, scenario_id, telemetry_dir)
+    with profiler.timer("video_write" if record_video else "env_teardown"):
+        close_scenario_env(env, env_pool)
 
-    status_icon = "❌" if crashed else "✅"
-    risk_icon = "⚠️" if "High" in expected_risk else "safe"
-    print(f"    {status_icon} Result: Crashed={crashed} | Risk Level: {risk_icon} {expected_risk}")
+    result = _episode_result(scenario_data, env_params, seed, policy, policy_function, primitives,
+                             crashed, step_count, metrics, trace, policy_timeout, termination_reason)
+    result["sim_time_s"] = round(time.perf_counter() - sim_start, 3)  # Env setup to teardown, for the CostModel
+    _finish_policy_hooks(result, policy_call, recorder)
+    if outcome_key is not None:
+        _store_outcome(outcome_cache, outcome_key, result, telemetry)
+    if profile:
+        result["profile"] = profiler.summary()
+    return result
+
+
+def run_scenario_batch(batch, video_folder, agent=None, prefetched=None,
+                       step_budget=DEFAULT_STEP_BUDGET_S, record_video=True, env_pool=None,
+                       profile=False, cprofile_id=None, termination=None, action_memo=None, trace_dir=None,
+                       outcome_cache=None, telemetry_dir=None, decision_mode=None):
+    """
+    Runs the scenarios of `batch` side by side, one env each, stepping all envs still
+    running once per iteration. A single BatchedLLMDriverPrimitives pass computes the
+    sensor readings of every env; then the scenarios sharing a policy are evaluated
+    together, back to back under one alarm_window (each against its own view), and
+    finally every env is stepped with its action.
+    Episodes are the same as run_single_scenario's (same seeds, same trace_hash).
+    - prefetched: optional list of PolicyPrefetcher items, one per scenario of `batch`.
+    - cprofile_id: if a scenario of the batch has this id, the whole batch runs under
+      cProfile and dumps results/profile_<id>.pstats.
+    Other arguments as in run_single_scenario. Returns one result per scenario, in order
+    (None where no policy could be obtained).
+    """
+    if cprofile_id is not None and any(s['id'] == cprofile_id for s in batch):
+        return run_with_cprofile(
+            os.path.join("results", f"profile_{cprofile_id}.pstats"), run_scenario_batch,
+            batch, video_folder, agent, prefetched, step_budget, record_video, env_pool, profile,
+            None, termination, action_memo, trace_dir, outcome_cache, telemetry_dir, decision_mode
+        )
+
+    log = bench_logger.get_logger()
+    if prefetched is None:
+        prefetched = [None] * len(batch)
+
+    results = [None] * len(batch)
+    episodes = []
+    for index, (scenario_data, item) in enumerate(zip(batch, prefetched)):
+        scenario_id = scenario_data['id']
+        profiler = Profiler(enabled=profile)
+        env_params = scenario_data.get('environment', DEFAULT_ENVIRONMENT)
+        seed = scenario_data.get('seed')
+        if seed is None:
+            seed = secrets.randbelow(2 ** 31)
+
+        log.info(f"\n>>> RUNNING SCENARIO {scenario_id} [{scenario_data.get('expected_risk', 'Unknown')} Risk]")
+        log.info(f"    Instruction: {scenario_data['instruction']}")
+        log.info(f"    Context: {env_params}")
+
+        policy = _get_policy(scenario_data['instruction'], env_params, agent, item, profiler)
+        if policy is None:
+            continue
+
+        outcome_key = _outcome_key(outcome_cache, scenario_data, env_params, policy[0], termination, action_memo,
+                                   decision_mode)
+        if outcome_key is not None and not (record_video or trace_dir):
+            outcome = outcome_cache.get(outcome_key)
+            if outcome is not None:
+                results[index] = _cached_outcome_result(scenario_data, env_params, policy, outcome, telemetry_dir)
+                continue
+
+        env = _make_scenario_env(scenario_data, env_params, video_folder, record_video, env_pool, profiler)
+        try:
+            with profiler.timer("policy_compile"):
+                policy_function = PolicyExecutor(policy[0], step_budget=step_budget)
+        except Exception as e:
+            log.error(f"    ❌ Code Compilation Failed: {e}")
+            close_scenario_env(env, env_pool)
+            results[index] = _compilation_failed_result(scenario_id, env_params, seed, policy,
+                                                        profiler if profile else None)
+            continue
+
+        with profiler.timer("env_reset"):
+            obs, info = env.reset(seed=seed)
+        _apply_weather(env, env_params['weather'])
+        policy_call, recorder = _policy_hooks(policy_function, scenario_id, seed, env_params['weather'],
+                                              action_memo, trace_dir)
+
+        episodes.append({
+            "index": index, "scenario": scenario_data, "env_params": env_params, "seed": seed,
+            "policy": policy, "policy_function": policy_function, "policy_call": policy_call,
+            "recorder": recorder, "env": env, "profiler": profiler, "outcome_key": outcome_key,
+            "obs": obs, "trace": hashlib.sha256(obs.tobytes()), "telemetry": EpisodeTelemetry.for_env(env), "steps": 0,
+            "crashed": False, "policy_timeout": False, "termination": None,
+            "tracker": termination.start() if termination is not None else None
+        })
+
+    if not episodes:
+        return results
+
+    batched = BatchedLLMDriverPrimitives([ep["env"] for ep in episodes])
+    if decision_mode is not None:
+        for view in batched.views:
+            view.set_decision_mode(*decision_mode)
+    # Episodes by policy, in batch order: e.g. every density of one instruction shares one
+    policy_groups = {}
+    for k, ep in enumerate(episodes):
+        policy_groups.setdefault(ep["policy_function"].policy_hash, []).append(k)
+
+    running = list(range(len(episodes)))
+    while running:
+        # Finished envs keep their last observation; their views are simply not used any more
+        batched.update(stack_observations([ep["obs"] for ep in episodes]))
+
+        for group in policy_groups.values():
+            group = [k for k in group if episodes[k]["termination"] is None]
+            with alarm_window(len(group), step_budget):
+                for k in group:
+                    ep = episodes[k]
+                    try:
+                        batched.views[k].decide(ep["policy_call"])
+                    except PolicyTimeoutError as e:
+                        ep["policy_timeout"] = True
+                        ep["termination"] = POLICY_TIMEOUT
+                        log.warning(f"    ⏱️ [{ep['scenario']['id']}] {e}")
+                    except Exception as e:
+                        ep["termination"] = RUNTIME_ERROR
+                        log.warning(f"    ⚠️ [{ep['scenario']['id']}] Runtime Error: {e}")
+
+        still_running = []
+        for k in running:
+            ep = episodes[k]
+            primitives = batched.views[k]
+            scenario_id = ep["scenario"]['id']
+            finished = ep["termination"] is not None
+
+            if not finished:
+                if ep["recorder"] is not None:
+                    ep["recorder"].record(primitives)
+                ep["telemetry"].record(primitives, primitives.action)
+                with ep["profiler"].timer("env_step"):
+                    obs, reward, done, truncated, info = ep["env"].step(primitives.action)
+                ep["obs"] = obs
+                ep["trace"].update(bytes([primitives.action]))
+                ep["trace"].update(obs.tobytes())
+
+                if info.get('crashed', False):
+                    ep["crashed"] = True
+                    log.info(f"    💥 [{scenario_id}] CRASH DETECTED!")
+
+                ep["steps"] += 1
+                # Same 300-step (20 s) cap and termination order as run_single_scenario
+                if ep["steps"] > 300:
+                    ep["termination"] = MAX_STEPS
+                elif ep["tracker"] is not None:
+                    ep["termination"] = ep["tracker"].check(obs, primitives.action, ep["crashed"])
+                    if ep["termination"] is not None:
+                        log.info(f"    ⏹️ [{scenario_id}] Stopped early: {ep['termination']} "
+                                 f"after {ep['steps']} steps")
+                if ep["termination"] is None and (done or truncated):
+                    ep["termination"] = DONE if done else TIME_LIMIT
+                finished = ep["termination"] is not None
 
+            if not finished:
+                still_running.append(k)
+                continue
+
+            policy_function = ep["policy_function"]
+            policy_function.close()
+            ep["profiler"].add("policy_step", sum(policy_function.step_times), len(policy_function.step_times))
+            metrics = _finish_telemetry(ep["telemetry"], primitives, ep["obs"], scenario_id, telemetry_dir)
+            with ep["profiler"].timer("video_write" if record_video else "env_teardown"):
+                close_scenario_env(ep["env"], env_pool)
+
+            result = _episode_result(ep["scenario"], ep["env_params"], ep["seed"], ep["policy"], policy_function,
+                                     primitives, ep["crashed"], ep["steps"], metrics, ep["trace"],
+                                     ep["policy_timeout"], ep["termination"])
+            _finish_policy_hooks(result, ep["policy_call"], ep["recorder"])
+            if ep["outcome_key"] is not None:
+                _store_outcome(outcome_cache, ep["outcome_key"], result, ep["telemetry"])
+            if profile:
+                result["profile"] = ep["profiler"].summary()
+            results[ep["index"]] = result
+        running = still_running
+
+    return results
+
+
+_worker_agent = None
+_worker_options = {}
+
+
+def _init_worker(agent, run_options):
+    """Pool initializer: keeps one unpickled LLMAgent (and its connection pool) per worker."""
+    global _worker_agent, _worker_options
+    _worker_agent = agent
+    _worker_options = run_options
+
+
+def _run_scenario_worker(job):
+    """Pool entry point. Each worker process simulates one scenario at a time."""
+    scenario, video_folder, prefetched = job
+    result = run_single_scenario(scenario, video_folder, _worker_agent, prefetched, **_worker_options)
+    # The pool may terminate this process without running atexit handlers
+    flush_logs()
     return result
 
 
-def main():
-    dataset_path = os.path.join("dataset", "LaMPilot-Bench.json")
+def _run_batch_worker(job):
+    """Pool entry point for batched runs: one batch of scenarios at a time."""
+    batch, video_folder, prefetched = job
+    results = run_scenario_batch(batch, video_folder, _worker_agent, prefetched, **_worker_options)
+    flush_logs()
+    return results
+
+
+def _run_chunk_worker(job):
+    """Pool entry point for scheduled runs: a chunk of scenarios, one after the other."""
+    chunk, video_folder, prefetched = job
+    results = [run_single_scenario(scenario, video_folder, _worker_agent, item, **_worker_options)
+               for scenario, item in zip(chunk, prefetched or [None] * len(chunk))]
+    flush_logs()
+    return results
+
+
+def _next_prefetched(prefetcher, scenario):
+    """
+    The prefetcher's item for `scenario`. A stream that ended early becomes an error item:
+    passing None on would make _get_policy() build an ad-hoc agent for the scenario.
+    """
+    item = prefetcher.get()
+    if item is None:
+        return {"id": scenario['id'], "code": None, "cache_hit": False, "latency": None,
+                "error": "The policy prefetcher stopped before this scenario."}
+    return item
+
+
+def _iter_chunk_jobs(scenarios, video_folder, prefetcher, costs, workers):
+    for chunk in guided_chunks(scenarios, costs, workers):
+        prefetched = [_next_prefetched(prefetcher, s) for s in chunk] if prefetcher is not None else None
+        yield chunk, video_folder, prefetched
+
+
+def _iter_jobs(scenarios, video_folder, prefetcher):
+    for scenario in scenarios:
+        # Blocks only if the prefetcher has not caught up with the simulation yet
+        prefetched = _next_prefetched(prefetcher, scenario) if prefetcher is not None else None
+        yield scenario, video_folder, prefetched
+
+
+def _iter_batch_jobs(scenarios, video_folder, prefetcher, batch_size):
+    scenarios = iter(scenarios)
+    while True:
+        batch = list(itertools.islice(scenarios, batch_size))
+        if not batch:
+            return
+        prefetched = [_next_prefetched(prefetcher, s) for s in batch] if prefetcher is not None else None
+        yield batch, video_folder, prefetched
+
+
+def iter_scenario_results(scenarios, video_folder, workers=1, agent=None, prefetcher=None, batch_size=1,
+                          costs=None, **run_options):
+    """
+    Yields one result per scenario, in the order of `scenarios` (unless costs are given).
+    - workers == 1: runs in this process. Without a prefetcher, keeps the original
+      1s pause between scenarios (between batches when batching) to go easy on the
+      LLM rate limit.
+    - workers > 1: fans scenarios out to a process pool. imap keeps the dataset order,
+      so the caller sees exactly the same stream as a serial run.
+    - agent: LLMAgent shared by every scenario (each worker gets its own copy).
+    - prefetcher: a started PolicyPrefetcher (or BatchPolicyGenerator) over the same scenarios,
+      in the same order.
+    - batch_size > 1: runs consecutive scenarios batch_size at a time with
+      run_scenario_batch; with workers > 1 each worker runs whole batches.
+    - costs: predicted seconds per scenario (see lmp_driver.scheduler.longest_first).
+      With workers > 1, scenarios then go out in guided_chunks() and results come back
+      as soon as any worker finishes, not in submission order.
+    - run_options: extra keyword arguments for run_single_scenario
+      (step_budget, record_video, env_pool, profile, cprofile_id, termination, action_memo,
+      trace_dir, outcome_cache, telemetry_dir, decision_mode).
+    """
+    if batch_size > 1:
+        run, worker = run_scenario_batch, _run_batch_worker
+        jobs = _iter_batch_jobs(scenarios, video_folder, prefetcher, batch_size)
+    elif costs is not None and workers > 1:
+        run, worker = run_single_scenario, _run_chunk_worker
+        jobs = _iter_chunk_jobs(scenarios, video_folder, prefetcher, costs, workers)
+    else:
+        run, worker = run_single_scenario, _run_scenario_worker
+        jobs = _iter_jobs(scenarios, video_folder, prefetcher)
+
+    if workers <= 1:
+        for work, video_folder, prefetched in jobs:
+            res = run(work, video_folder, agent, prefetched, **run_options)
+            yield from (res if batch_size > 1 else [res])
+            if prefetcher is None:
+                time.sleep(1)
+        return
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(agent, run_options)) as pool:
+        imap = pool.imap_unordered if costs is not None else pool.imap
+        for res in imap(worker, jobs, chunksize=1):
+            yield from (res if isinstance(res, list) else [res])
+
+
+def record_failed_scenarios(scenarios, results, video_folder, args, agent=None, policy_cache=None, env_pool=None):
+    """
+    Re-simulates the crashed scenarios of this run with their saved seed, this time
+    recording video. The policy comes from the policy cache, so no new LLM calls are
+    needed when the cache is enabled.
+    """
+    crashed = {r['id']: r for r in results if r.get('crashed') and r.get('seed') is not None}
+    to_record = [dict(scenarios[i], seed=crashed[i]['seed']) for i in scenarios.ids() if i in crashed]
+    if not to_record:
+        return
+
+    flush_logs()
+    print(f"\n🎥 Recording {len(to_record)} crashed scenarios...")
+    if agent is None:
+        try:
+            agent = make_agent(args, policy_cache, replay=True)
+        except ValueError as e:
+            print(f"❌ Setup Error: {e}")
+            return
+
+    recorded = iter_scenario_results(to_record, video_folder, args.workers, agent, batch_size=args.batch_size,
+                                     step_budget=args.policy_step_budget, record_video=True, env_pool=env_pool,
+                                     termination=termination_from_args(args),
+                                     decision_mode=decision_mode_from_args(args))
+    for res in recorded:
+        if res and res['crashed'] != crashed[res['id']]['crashed']:
+            print(f"    ⚠️ Scenario {res['id']} did not reproduce its headless outcome.")
+
+
+def in_dataset_order(results, scenarios):
+    """results sorted by their scenario's position in the dataset (unknown ids last, in their order)."""
+    position = {str(scenario_id): i for i, scenario_id in enumerate(scenarios.ids())}
+    return sorted(results, key=lambda r: position.get(str(r['id']), len(position)))
+
+
+def load_previous_results(results_file=RESULTS_FILE, report_file=REPORT_FILE):
+    """
+    Returns the per-scenario results of earlier runs: from the JSONL results store or,
+    for runs made before the store existed, from the details of an existing report.
+    """
+    store = ResultsStore(results_file)
+    if store.exists():
+        return store.load()
+
+    if not os.path.exists(report_file):
+        return []
+    try:
+        with open(report_file, 'r') as f:
+            data = json.load(f)
+    except json.JSONDecodeError:
+        print("⚠️ Warning: Existing report file was corrupted. Starting fresh.")
+        return []
+    return data.get('details', [])
+
+
+def replay_scenario(scenario_id, scenarios, video_folder, args):
+    """
+    Re-runs one scenario with its seed and the cached policy, then compares the outcome
+    (crash flag, step count and trace hash) with the saved result. Pass the same
+    early-termination (and --event-driven-policy) flags as the original run, or the
+    step counts will differ.
+    """
+    scenario = scenarios.get(scenario_id)
+    if scenario is None:
+        print(f"❌ Scenario {scenario_id} not found in dataset.")
+        return None
+
+    previous = next((r for r in load_previous_results(*_output_files(args)) if r['id'] == scenario_id), None)
+    if scenario.get('seed') is None and previous and previous.get('seed') is not None:
+        scenario = dict(scenario, seed=previous['seed'])
+
+    policy_cache = None if args.no_policy_cache else PolicyCache(POLICY_CACHE_FILE, POLICY_CACHE_MAX_ENTRIES)
+    try:
+        agent = make_agent(args, policy_cache, replay=True)
+    except ValueError as e:
+        print(f"❌ Setup Error: {e}")
+        return None
+
+    res = run_single_scenario(scenario, video_folder, agent, step_budget=args.policy_step_budget,
+                              record_video=not args.headless, termination=termination_from_args(args),
+                              decision_mode=decision_mode_from_args(args))
+    agent.close()
+    flush_logs()
+    if res is None or previous is None:
+        return res
+
+    print("\n🔁 Replay vs. saved result:")
+    identical = True
+    for key in ("crashed", "steps", "trace_hash"):
+        match = res.get(key) == previous.get(key)
+        identical = identical and match
+        print(f"    {'✅' if match else '❌'} {key}: {previous.get(key)} -> {res.get(key)}")
+    print(f"    {'Bit-identical episode.' if identical else 'Episode diverged from the saved run.'}")
+    return res
+
+
+# Phases run_single_scenario goes through before its first env.step()
+PRE_STEP_PHASES = ("generate_policy", "env_setup", "policy_compile", "env_reset")
+
+
+def run_one(scenario_id, args):
+    """
+    `run_benchmark.py run-one <id>`: the shortest path from the command line to a
+    simulating env, for debugging one scenario. Headless, no env pool, no outcome
+    cache, no results store; only the dataset index is opened, and openai is only
+    imported if the policy is not in the policy cache. Prints the result and how long
+    the process took to reach its first env.step().
+    """
+    scenario = open_dataset(args.dataset).get(scenario_id)
+    if scenario is None:
+        print(f"❌ Scenario {scenario_id} not found in dataset.")
+        return None
+
+    policy_cache = None if args.no_policy_cache else PolicyCache(POLICY_CACHE_FILE, POLICY_CACHE_MAX_ENTRIES)
+    try:
+        agent = make_agent(args, policy_cache, replay=True)
+    except ValueError as e:
+        print(f"❌ Setup Error: {e}")
+        return None
+
+    startup_s = time.perf_counter() - _START
+    res = run_single_scenario(scenario, None, agent, step_budget=args.policy_step_budget, record_video=False,
+                              profile=True, termination=termination_from_args(args),
+                              decision_mode=decision_mode_from_args(args))
+    agent.close()
+    flush_logs()
+    if res is None:
+        return None
+
+    profile = res.pop("profile")
+    pre_step_s = sum(profile[phase]["total_s"] for phase in PRE_STEP_PHASES if phase in profile)
+    print(json.dumps(res, indent=2))
+    print(f"⏱️ First env.step after {startup_s + pre_step_s:.3f}s "
+          f"(startup {startup_s:.3f}s + " + " + ".join(f"{phase} {profile[phase]['total_s']:.3f}s"
+                                                        for phase in PRE_STEP_PHASES if phase in profile) + ")")
+    return res
+
+
+def make_agent(args, policy_cache=None, replay=False):
+    """
+    An LLMAgent on the --llm-backend / --llm-model / --llm-base-url endpoint.
+    replay: the agent re-runs episodes of a run made with these args (recording, replay,
+    run-one), so it serves that run's cached policies, batch-generated ones included.
+    """
+    backend = make_backend(args.llm_backend, args.llm_model, args.llm_base_url,
+                           max_connections=args.llm_max_connections,
+                           max_keepalive_connections=args.llm_max_connections)
+    replay_source = ("batch" if args.policy_batch > 0 else "chat") if replay else None
+    return LLMAgent(model_name=args.llm_model, policy_cache=policy_cache, backend=backend,
+                    replay_source=replay_source)
+
+
+def make_prefetcher(args, policy_cache=None):
+    """The policy source that runs ahead of the simulation: --policy-batch or --prefetch (None if neither)."""
+    if args.policy_batch > 0:
+        return BatchPolicyGenerator(make_agent(args, policy_cache), batch_size=args.policy_batch)
+    if args.prefetch <= 0:
+        return None
+    if args.llm_backend == "mock":
+        raise ValueError("--prefetch needs an HTTP backend; use --policy-batch with the mock backend.")
+    # Resolves the endpoint and key exactly as the inline agent would
+    backend = make_backend(args.llm_backend, args.llm_model, args.llm_base_url)
+    backend.close()
+    return PolicyPrefetcher(model_name=backend.model_name, api_key=backend.api_key, base_url=backend.base_url,
+                            policy_cache=policy_cache, max_in_flight=args.prefetch)
+
+
+def parse_shard(value):
+    """"i/N" -> (i, N), for --shard."""
+    try:
+        shard_index, num_shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N (e.g. 0/4), got {value!r}")
+    if not 0 <= shard_index < num_shards:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {num_shards}), got {shard_index}")
+    return shard_index, num_shards
+
+
+def _output_files(args):
+    """(results store, report) paths; each shard of a sharded run gets its own pair."""
+    if args.shard is None:
+        return RESULTS_FILE, REPORT_FILE
+    suffix = f".shard{args.shard[0]}of{args.shard[1]}"
+    return tuple(f"{root}{suffix}{ext}" for root, ext in map(os.path.splitext, (RESULTS_FILE, REPORT_FILE)))
+
+
+def select_scenarios(dataset, args):
+    """The dataset view this run covers: --weather/--time-of-day/--density/--intent/--risk, then --shard."""
+    selected = dataset.select(weather=args.weather, time_of_day=args.time_of_day, density=args.density,
+                              intent=args.intent, risk=args.risk)
+    if args.shard is not None:
+        selected = selected.shard(*args.shard)
+    return selected
+
+
+def termination_from_args(args):
+    """The TerminationPolicy selected on the command line, or None if no shortcut is enabled."""
+    termination = TerminationPolicy(stop_on_crash=args.stop_on_crash, alone_steps=args.stop_when_alone,
+                                    steady_steps=args.stop_at_steady_state)
+    return termination if termination.enabled else None
+
+
+def decision_mode_from_args(args):
+    """(quantum, max_hold_steps) for --event-driven-policy, or None: the policy runs every step."""
+    if args.event_driven_policy is None:
+        return None
+    return args.event_driven_policy, args.max_hold_steps
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the LaMPilot-Bench benchmark.",
+        epilog="To debug a single scenario quickly (headless, first env.step as early as possible): "
+               "run_benchmark.py run-one SCENARIO_ID [options]"
+    )
+    parser.add_argument("--dataset", default=DATASET_FILE,
+                        help="Scenario file: JSON Lines with its index, or a JSON array (indexed on first use).")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="Run only shard i of N (0-based). Each shard keeps its own results and report.")
+    parser.add_argument("--weather", nargs="+", help="Only scenarios with one of these weathers.")
+    parser.add_argument("--time-of-day", nargs="+", help="Only scenarios at one of these times of day.")
+    parser.add_argument("--density", nargs="+", type=float, help="Only scenarios with one of these densities.")
+    parser.add_argument("--intent", nargs="+", help="Only scenarios with one of these intent categories.")
+    parser.add_argument("--risk", nargs="+", help="Only scenarios whose expected risk starts with one of these.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (1 = run serially in this process).")
+    parser.add_argument("--no-policy-cache", action="store_true",
+                        help=f"Always query the LLM instead of reusing policies from {POLICY_CACHE_FILE}.")
+    parser.add_argument("--no-outcome-cache", action="store_true",
+                        help=f"Simulate every scenario, even those matching an episode stored in "
+                             f"{OUTCOME_CACHE_FILE} (same policy, env config, weather, seed and code version).")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="N",
+                        help="Generate policies ahead of the simulation with up to N concurrent "
+                             "LLM requests (0 = generate inline, one scenario at a time).")
+    parser.add_argument("--llm-backend", choices=BACKENDS, default="groq",
+                        help="groq: hosted endpoint (GROQ_KEY); local: OpenAI-compatible server such as vLLM or "
+                             "llama.cpp (--llm-base-url or LOCAL_LLM_BASE_URL); mock: deterministic offline policies.")
+    parser.add_argument("--llm-model", default=MODEL_NAME, help="Model name sent to the backend.")
+    parser.add_argument("--llm-base-url", help="Endpoint of the groq/local backend, if not the default.")
+    parser.add_argument("--policy-batch", type=int, default=0, metavar="N",
+                        help="Generate policies ahead of the simulation, N distinct prompts per backend batch "
+                             "call (one request on a local server). Replaces --prefetch.")
+    parser.add_argument("--llm-max-connections", type=int, default=LLM_MAX_CONNECTIONS,
+                        help="Size of the keep-alive HTTP connection pool used for LLM calls.")
+    parser.add_argument("--policy-step-budget", type=float, default=DEFAULT_STEP_BUDGET_S, metavar="SECONDS",
+                        help="Wall-clock budget for a single policy(api) call; slower policies are stopped.")
+    parser.add_argument("--headless", action="store_true",
+                        help="Never render and do not record videos.")
+    parser.add_argument("--record-failures", action="store_true",
+                        help="Run headless, then re-simulate only the crashed scenarios from their saved "
+                             "seed and record those videos.")
+    parser.add_argument("--batch-size", type=int, default=1, metavar="K",
+                        help="Step K scenarios side by side with batched perception (per process).")
+    parser.add_argument("--stop-on-crash", action="store_true",
+                        help="End an episode at its first crash instead of simulating to the end.")
+    parser.add_argument("--stop-when-alone", type=int, default=0, metavar="N",
+                        help="End an episode once no other vehicle has been observed for N steps.")
+    parser.add_argument("--stop-at-steady-state", type=int, default=0, metavar="N",
+                        help="End an episode once the ego has kept its action, lane and speed for N steps "
+                             "without closing in on the car ahead.")
+    parser.add_argument("--record-traces", nargs="?", const=TRACES_DIR, metavar="DIR",
+                        help=f"Save every episode's (sensor features -> action) trace as .npz, one directory "
+                             f"per policy hash (default {TRACES_DIR}).")
+    parser.add_argument("--save-telemetry", nargs="?", const=TELEMETRY_DIR, metavar="DIR",
+                        help=f"Save every episode's per-step telemetry (speed, position, lane, lead gap, "
+                             f"action, crash flag) as <DIR>/<scenario id>.npz (default {TELEMETRY_DIR}).")
+    parser.add_argument("--memoize-actions", nargs="?", type=float, const=0.01, metavar="QUANTUM",
+                        help="Reuse a policy's action for sensor readings equal after rounding to QUANTUM "
+                             "(default 0.01). Faster re-runs, but episodes may differ from unmemoized ones.")
+    parser.add_argument("--schedule", choices=("cost", "dataset"), default="dataset",
+                        help=f"dataset (default): dataset order; cost: run the scenarios expected to take longest "
+                             f"first (learned from earlier runs in {COST_MODEL_FILE}), handing them to workers in "
+                             f"shrinking chunks. Either way the results end up stored in dataset order.")
+    parser.add_argument("--event-driven-policy", nargs="?", type=float, const=0.02, metavar="QUANTUM",
+                        help="Re-run the policy only when its sensor readings, rounded to QUANTUM (default "
+                             "0.02), change or after --max-hold-steps steps; hold the last action otherwise. "
+                             "Safety checks still run every step. Episodes may differ from every-step runs.")
+    parser.add_argument("--max-hold-steps", type=int, default=5, metavar="K",
+                        help="With --event-driven-policy, re-run the policy after holding an action K steps.")
+    parser.add_argument("--no-env-pool", action="store_true",
+                        help="Build a fresh env for every scenario instead of reusing pooled ones.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every benchmark phase and add per-scenario and per-run totals to the report.")
+    parser.add_argument("--cprofile-scenario", metavar="SCENARIO_ID",
+                        help="Run this scenario under cProfile and dump results/profile_<id>.pstats.")
+    parser.add_argument("--log-level", default="info", choices=sorted(bench_logger.LEVELS),
+                        help="Minimum level of per-scenario messages (debug also shows the LLM context).")
+    parser.add_argument("--replay", metavar="SCENARIO_ID",
+                        help="Re-run a single scenario with its seed and cached policy, and check it "
+                             "against the saved report.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["run-one"]:
+        if len(argv) < 2:
+            print("usage: run_benchmark.py run-one SCENARIO_ID [options]")
+            return
+        args = parse_args(argv[2:])
+        bench_logger.set_level(args.log_level)
+        if not os.path.exists(args.dataset):
+            print("Dataset not found.")
+            return
+        run_one(argv[1], args)
+        return
+
+    args = parse_args(argv)
+    bench_logger.set_level(args.log_level)
+
     video_folder = os.path.join("results", "videos")
+    results_file, report_file = _output_files(args)
 
-    if not os.path.exists(dataset_path):
+    if not os.path.exists(args.dataset):
         print("Dataset not found.")
         return
 
-    os.makedirs(video_folder, exist_ok=True)
+    if not args.headless:
+        os.makedirs(video_folder, exist_ok=True)
 
-    with open(dataset_path, 'r') as f:
-        scenarios = json.load(f)
+    # Only the index is loaded; scenarios are parsed one at a time as they are run
+    scenarios = open_dataset(args.dataset)
 
-    results = []
-    completed_ids = set()
+    if args.replay:
+        replay_scenario(args.replay, scenarios, video_folder, args)
+        return
 
-    # Check if a report already exists
-    if os.path.exists(REPORT_FILE):
-        try:
-            with open(REPORT_FILE, 'r') as f:
-                data = json.load(f)
-                # Load previous results into memory
-                if 'details' in data:
-                    results = data['details']
-                    completed_ids = {r['id'] for r in results}
-                    print(f"🔄 Resuming... Found {len(results)} completed scenarios.")
-        except json.JSONDecodeError:
-            print("⚠️ Warning: Existing report file was corrupted. Starting fresh.")
+    # Load previous results into memory if an earlier run left any
+    results = load_previous_results(results_file, report_file)
+    completed_ids = {r['id'] for r in results}
+    if results:
+        print(f"🔄 Resuming... Found {len(results)} completed scenarios.")
+
+    store = ResultsStore(results_file)
+    if results and not store.exists():
+        # Results came from a pre-store report: carry them over so later resumes read the store
+        for res in results:
+            store.append(res)
 
     # Filter out scenarios that are already done
-    scenarios_to_run = [s for s in scenarios if s['id'] not in completed_ids]
+    scenarios_to_run = select_scenarios(scenarios, args).exclude(completed_ids)
 
-    if not scenarios_to_run:
+    if not len(scenarios_to_run):
         print("✅ All scenarios are already completed!")
         return
 
-    print(f"🚀 Starting benchmark for {len(scenarios_to_run)} remaining scenarios...")
+    print(f"🚀 Starting benchmark for {len(scenarios_to_run)} remaining scenarios "
+          f"({args.workers} worker{'s' if args.workers > 1 else ''})...")
+
+    cost_model = CostModel.load(COST_MODEL_FILE)
+    features = scenario_features(scenarios_to_run)
+    costs = None
+    predicted = {}
+    timed_episodes, predicted_s, simulated_s = 0, 0.0, 0.0  # How the predictions compare with this run
+    if args.schedule == "cost":
+        scenarios_to_run, costs = longest_first(scenarios_to_run, cost_model, features)
+        predicted = dict(zip(scenarios_to_run.ids(), costs))
+        print(f"📐 Longest expected first: ~{costs.sum() / 60:.1f} min of simulation predicted "
+              f"({'fitted on' if cost_model.fitted else 'prior, learning from'} {len(cost_model.history)} "
+              f"earlier scenarios).")
+
+    policy_cache = None
+    if not args.no_policy_cache:
+        policy_cache = PolicyCache(POLICY_CACHE_FILE, max_entries=POLICY_CACHE_MAX_ENTRIES)
+    outcome_cache = None
+    if not args.no_outcome_cache:
+        outcome_cache = OutcomeCache(OUTCOME_CACHE_FILE, max_entries=OUTCOME_CACHE_MAX_ENTRIES)
+
+    # One long-lived client for the whole run, instead of one per scenario
+    agent = None
+    prefetcher = None
+    try:
+        prefetcher = make_prefetcher(args, policy_cache)
+        if prefetcher is None:
+            agent = make_agent(args, policy_cache)
+    except ValueError as e:
+        print(f"❌ Setup Error: {e}")
+        return
+
+    if prefetcher is not None:
+        prefetcher.start(
+            (s['id'], s['instruction'], s.get('environment', DEFAULT_ENVIRONMENT)) for s in scenarios_to_run
+        )
+
+    run_profiler = Profiler(enabled=args.profile)
+    running = RunningSummary(results)
 
-    for i, scenario in enumerate(scenarios_to_run):
-        res = run_single_scenario(scenario, video_folder)
+    # Each worker process gets its own (empty) copy of the pool and of the action memo
+    action_memo = ActionMemo(quantum=args.memoize_actions) if args.memoize_actions else None
+    env_pool = None if args.no_env_pool else EnvPool()
+    record_video = not (args.headless or args.record_failures)
+    results_stream = iter_scenario_results(scenarios_to_run, video_folder, args.workers, agent, prefetcher,
+                                           args.batch_size, step_budget=args.policy_step_budget,
+                                           record_video=record_video,
+                                           env_pool=env_pool, profile=args.profile,
+                                           cprofile_id=args.cprofile_scenario,
+                                           termination=termination_from_args(args),
+                                           action_memo=action_memo, trace_dir=args.record_traces,
+                                           outcome_cache=outcome_cache, telemetry_dir=args.save_telemetry,
+                                           decision_mode=decision_mode_from_args(args), costs=costs)
+
+    # Results stream back here, so this process is the only one writing the results store.
+    for i, res in enumerate(results_stream):
         if res:
             results.append(res)
+            running.add(res)
+            with run_profiler.timer("checkpoint_save"):
+                store.append(res)
+            # Video runs are slower than the headless ones the model predicts: keep their step counts only
+            cost_model.observe(res, features[str(res['id'])], timed=not record_video)
+            if not record_video and res.get('sim_time_s') is not None and str(res['id']) in predicted:
+                timed_episodes += 1
+                predicted_s += predicted[str(res['id'])]
+                simulated_s += res['sim_time_s']
 
-        # SAVE EVERY 'SAVE_INTERVAL' SCENARIOS
         if (i + 1) % SAVE_INTERVAL == 0:
-            save_evaluation_results(results, REPORT_FILE)
+            print(f"    📊 Progress: {running.total} scenarios done | Collision Rate {running.collision_rate()}")
+        if (i + 1) % COST_MODEL_SAVE_INTERVAL == 0:
+            # A sweep that dies midway still leaves its timings for the next schedule
+            with run_profiler.timer("checkpoint_save"):
+                cost_model.save(COST_MODEL_FILE)
+    store.close()
+    cost_model.save(COST_MODEL_FILE)
+    if costs is not None:
+        # Cost-scheduled results arrive longest first (in completion order with workers): put the store
+        # and the report back in dataset order, as a --schedule dataset run writes them
+        results = in_dataset_order(results, scenarios)
+        store.rewrite(results)
+
+    if args.record_failures:
+        record_failed_scenarios(scenarios_to_run, results, video_folder, args, agent=agent,
+                                policy_cache=policy_cache, env_pool=env_pool)
+
+    if env_pool is not None:
+        env_pool.close()
 
-        time.sleep(1)
+    if agent is not None:
+        agent.close()
+    if isinstance(prefetcher, BatchPolicyGenerator):
+        print(f"    🧠 Policies generated in {prefetcher.batches} batch call(s) of up to {prefetcher.batch_size}.")
+        prefetcher.agent.close()
 
-    summary = save_evaluation_results(results, REPORT_FILE)
+    # Scenario output goes through the background writer; let it catch up before the report
+    flush_logs()
+    summary = save_evaluation_results(results, report_file, run_profiler, running)
 
     print("\n" + "=" * 40)
     print("      BENCHMARK FINAL REPORT      ")
     print("=" * 40)
     print(f"Total Scenarios: {summary['total_scenarios']}")
+    if summary['early_stopped']:
+        print(f"Early Stopped:   {summary['early_stopped']} (no crash; left out of the rates, speed and distance)")
     print(f"Success Rate:    {summary['success_rate']}")
     print(f"Collision Rate:  {summary['collision_rate']}")
+    if summary['policy_failures']:
+        print(f"Policy Failures: {summary['policy_failures']} (timeouts and runtime errors; left out of the rates, "
+              f"speed and distance)")
+    print(f"Policy Exec:     {summary['policy_exec_ms']['mean_per_step']} ms/step "
+          f"(max {summary['policy_exec_ms']['max_step']} ms, {summary['policy_exec_ms']['timeouts']} timeouts)")
     print(f"Avg Speed:       {summary['average_speed_mps']} m/s")
     print(f"Distance Covered:  {summary['distance_covered_m']} m")
+    if 'telemetry' in summary:
+        telemetry = summary['telemetry']
+        print(f"Telemetry:       min TTC {telemetry['min_ttc_s']}s | {telemetry['headway_violations']} headway "
+              f"violations | {telemetry['lane_changes']} lane changes | max jerk {telemetry['max_abs_jerk']} m/s³")
+    if summary['safety_events']:
+        print("Safety Events:   " + ", ".join(f"{k}={v}" for k, v in summary['safety_events'].items()))
+    if summary['terminations']:
+        print("Episode Ends:    " + ", ".join(f"{k}={v}" for k, v in summary['terminations'].items())
+              + f" ({summary['simulated_steps']} steps simulated)")
+    if timed_episodes:
+        print(f"Cost Model:      predicted {predicted_s:.0f}s, took {simulated_s:.0f}s of simulation "
+              f"({timed_episodes} timed episodes)")
+    if 'decisions' in summary:
+        decisions = summary['decisions']
+        print(f"Decisions:       {decisions['policy_calls']} policy calls, {decisions['saved_calls']} saved "
+              f"(decision rate {decisions['decision_rate']:.1%})")
+    if 'action_memo' in summary:
+        print(f"Action Memo:     {summary['action_memo']['hits']} hits / {summary['action_memo']['misses']} "
+              f"policy calls")
+    print(f"Policy Cache:    {summary['policy_cache']['hits']} hits / {summary['policy_cache']['misses']} misses")
+    if 'outcome_cache' in summary:
+        print(f"Outcome Cache:   {summary['outcome_cache']['hits']} hits / {summary['outcome_cache']['misses']} "
+              f"simulated")
+    latency = summary['llm_latency_s']
+    if latency['calls']:
+        print(f"LLM Latency:     p50 {latency['p50']}s | p95 {latency['p95']}s | p99 {latency['p99']}s "
+              f"({latency['calls']} calls)")
     print("=" * 40)
-    print(f"Detailed report saved to: {REPORT_FILE}")
+    if 'profile' in summary:
+        print("Time per phase:")
+        for name, entry in sorted(summary['profile'].items(), key=lambda kv: -kv[1]['total_s']):
+            print(f"  {name:<16} {entry['total_s']:>10.2f}s  ({entry['count']} calls)")
+        print("=" * 40)
+    print(f"Detailed report saved to: {report_file}")
 
 
 if __name__ == "__main__":
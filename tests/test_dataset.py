@@ -0,0 +1,42 @@
+"""
+DatasetWriter: concurrent writers of one path, and nothing left behind on failure.
+"""
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.dataset import DatasetWriter, open_dataset
+
+
+def scenarios(prefix, count):
+    return [{"id": f"{prefix}{i}", "instruction": "Keep your lane.", "scenario": "highway-v0"} for i in range(count)]
+
+
+def test_interleaved_writers_do_not_corrupt_each_other(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    first, second = DatasetWriter(path), DatasetWriter(path)
+    for a, b in zip(scenarios("a", 50), scenarios("b", 50)):
+        first.write(a)
+        second.write(b)
+    first.close()
+    second.close()
+
+    # The last writer to close wins, whole
+    dataset = open_dataset(path)
+    assert dataset.ids() == [f"b{i}" for i in range(50)]
+    assert [scenario["id"] for scenario in dataset] == dataset.ids()
+    assert sorted(os.listdir(tmp_path)) == ["data.jsonl", "data.jsonl.index.npz"]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_a_failed_write_leaves_nothing_behind(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    with pytest.raises(RuntimeError):
+        with DatasetWriter(path) as writer:
+            writer.write(scenarios("a", 1)[0])
+            raise RuntimeError("producer failed")
+    assert os.listdir(tmp_path) == []
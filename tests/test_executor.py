@@ -0,0 +1,103 @@
+"""
+The policy sandbox: which builtins a generated policy gets, and the per-step budget
+(alone and in a shared alarm_window).
+"""
+import os
+import signal
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.executor import (PolicyExecutor, PolicyTimeoutError, PolicyValidationError, alarm_window,
+                                 load_policy)
+
+
+class Api:
+    speed = 20.0
+
+    def __init__(self):
+        self.calls = []
+
+    def keep_speed(self):
+        self.calls.append("keep_speed")
+
+
+def test_harmless_builtins_are_available():
+    policy = load_policy(
+        "def policy(api):\n"
+        "    try:\n"
+        "        {}['missing']\n"
+        "    except KeyError:\n"
+        "        pass\n"
+        "    q, r = divmod(pow(2, 5), 3)\n"
+        "    speeds = list(filter(None, map(abs, [-1.0, 0.0, 2.0])))\n"
+        "    if hasattr(api, 'keep_speed') and getattr(api, 'speed', 0) > 0 and speeds:\n"
+        "        api.keep_speed()\n"
+    )
+    api = Api()
+    policy(api)
+    assert api.calls == ["keep_speed"]
+
+
+@pytest.mark.parametrize("source", [
+    "def policy(api):\n    open('/etc/passwd')",
+    "def policy(api):\n    eval('1')",
+    "def policy(api):\n    import os",
+    "def policy(api):\n    api.__class__",
+])
+def test_escape_hatches_are_rejected(source):
+    with pytest.raises(PolicyValidationError):
+        load_policy(source)
+
+
+def test_getattr_cannot_reach_dunders():
+    policy = load_policy("def policy(api):\n    getattr(api, '__class__')")
+    with pytest.raises(AttributeError):
+        policy(Api())
+    assert load_policy("def policy(api):\n    return hasattr(api, '__class__')")(Api()) is False
+
+
+def test_timeout_is_not_swallowed_by_except_exception():
+    executor = PolicyExecutor(
+        "def policy(api):\n"
+        "    while True:\n"
+        "        try:\n"
+        "            sum(range(1000))\n"
+        "        except Exception:\n"
+        "            pass\n",
+        step_budget=0.05,
+    )
+    try:
+        with pytest.raises(PolicyTimeoutError):
+            executor(Api())
+    finally:
+        executor.close()
+
+
+def test_a_shared_alarm_window_still_interrupts_a_runaway_policy():
+    quick = [PolicyExecutor("def policy(api):\n    api.keep_speed()", step_budget=0.05) for _ in range(3)]
+    runaway = PolicyExecutor("def policy(api):\n    while True:\n        pass", step_budget=0.05)
+    try:
+        with alarm_window(4, 0.05):
+            for executor in quick[:2]:
+                executor(Api())
+            with pytest.raises(PolicyTimeoutError):
+                runaway(Api())
+            quick[2](Api())  # The window has fired: this call gets its own alarm
+        assert all(len(executor.step_times) == 1 for executor in quick)
+    finally:
+        for executor in quick + [runaway]:
+            executor.close()
+
+
+def test_the_alarm_handler_stays_installed_until_the_last_executor_closes():
+    previous = signal.getsignal(signal.SIGALRM)
+    first = PolicyExecutor("def policy(api):\n    api.keep_speed()")
+    second = PolicyExecutor("def policy(api):\n    while True:\n        pass", step_budget=0.05)
+    first.close()
+    with pytest.raises(PolicyTimeoutError):
+        second(Api())
+    second.close()
+    assert signal.getsignal(signal.SIGALRM) is previous
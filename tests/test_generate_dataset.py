@@ -0,0 +1,34 @@
+"""
+generate_dataset: a requested sample count is either met or refused up front.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_dataset
+from generate_dataset import distinct_prompts, iter_samples, parse_args
+
+
+def test_default_max_per_prompt_fits_the_requested_count():
+    n = distinct_prompts() + 10
+    args = parse_args(["-n", str(n), "--output", "out.jsonl"])
+    assert args.max_per_prompt == 2
+    samples = list(iter_samples(n, max_per_prompt=args.max_per_prompt))
+    assert len(samples) == n
+    assert len({sample["id"] for sample in samples}) == n
+
+
+def test_a_count_beyond_max_per_prompt_is_refused():
+    with pytest.raises(SystemExit):
+        parse_args(["-n", "1000000", "--max-per-prompt", "1", "--output", "out.jsonl"])
+    with pytest.raises(ValueError, match="--max-per-prompt 2"):
+        list(iter_samples(distinct_prompts() + 1, max_per_prompt=1))
+
+
+def test_a_sampler_that_runs_dry_fails(monkeypatch):
+    monkeypatch.setattr(generate_dataset, "distinct_prompts", lambda: 10 ** 6)  # Pretend there is room
+    with pytest.raises(ValueError, match="found only"):
+        list(iter_samples(5000, max_per_prompt=1))
@@ -0,0 +1,59 @@
+"""
+AsyncWriter keeps draining when its target fails, and reports dropped lines.
+"""
+import io
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.logger import AsyncWriter
+
+
+class BrokenStream:
+    def write(self, text):
+        raise OSError("disk full")
+
+    def flush(self):
+        pass
+
+
+def run_with_timeout(function, timeout=5.0):
+    thread = threading.Thread(target=function, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_a_failing_stream_falls_back_to_stderr(monkeypatch):
+    stderr = io.StringIO()
+    monkeypatch.setattr(sys, "__stderr__", stderr)
+    writer = AsyncWriter(stream=BrokenStream())
+    writer.write("first\n")
+    assert run_with_timeout(writer.flush)
+    writer.write("second\n")
+    assert run_with_timeout(writer.flush)
+    assert "write failed" in stderr.getvalue()
+    assert "first\n" in stderr.getvalue() and "second\n" in stderr.getvalue()
+
+
+def test_an_unopenable_path_falls_back_to_stderr(monkeypatch, tmp_path):
+    stderr = io.StringIO()
+    monkeypatch.setattr(sys, "__stderr__", stderr)
+    writer = AsyncWriter(path=str(tmp_path))  # A directory
+    writer.write("line\n")
+    assert run_with_timeout(writer.flush)
+    assert "cannot open" in stderr.getvalue() and "line\n" in stderr.getvalue()
+
+
+def test_flush_reports_dropped_lines(monkeypatch):
+    stderr = io.StringIO()
+    monkeypatch.setattr(sys, "__stderr__", stderr)
+    out = io.StringIO()
+    writer = AsyncWriter(stream=out, max_queue=1)
+    writer.dropped = 3  # As if the queue had been full three times
+    writer.write("line\n")
+    writer.flush()
+    writer.flush()
+    assert stderr.getvalue().count("dropped 3 lines") == 1
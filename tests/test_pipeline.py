@@ -0,0 +1,182 @@
+"""
+PolicyPrefetcher against a local stub of the OpenAI chat completions endpoint:
+submission order, 429/Retry-After retries and the error path; policy cache keys
+(and their reuse when replaying a batch run) and latency accounting shared with LLMAgent;
+the API key only needed on a cache miss.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.agent import LLMAgent
+from lmp_driver.backends import MockBackend, OpenAICompatibleBackend, make_backend
+from lmp_driver.pipeline import PolicyPrefetcher
+from lmp_driver.policy_cache import PolicyCache
+
+POLICY = "def policy(api):\n    api.keep_speed()"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Replies according to the user instruction of the request:
+    - "slow": after 0.3 s; "rate-limited": 429 with Retry-After 0 the first time;
+    - "empty": a reply whose content is null; "bad-request": 400; anything else: POLICY.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        context = body["messages"][1]["content"]
+        self.server.requests.append(context)
+
+        if "rate-limited" in context and not self.server.rate_limited:
+            self.server.rate_limited = True
+            self._reply(429, {"error": {"message": "slow down"}}, {"Retry-After": "0"})
+            return
+        if "bad-request" in context:
+            self._reply(400, {"error": {"message": "bad request"}})
+            return
+        if "slow" in context:
+            time.sleep(0.3)
+        content = None if "empty" in context else f"```python\n{POLICY}\n```"
+        self._reply(200, {
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        })
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    server.rate_limited = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def prefetch(server, instructions, **options):
+    prefetcher = PolicyPrefetcher(model_name="stub-model", api_key="test",
+                                  base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", **options)
+    prefetcher.start([(i, instruction, {}) for i, instruction in enumerate(instructions)])
+    items = list(prefetcher)
+    assert prefetcher.get(timeout=1) is None  # The end of the stream is sticky
+    return items
+
+
+def test_items_keep_submission_order(server):
+    items = prefetch(server, ["slow", "fast", "slow", "fast"], max_in_flight=4)
+    assert [item["id"] for item in items] == [0, 1, 2, 3]
+    assert all(item["code"] == POLICY and item["error"] is None for item in items)
+
+
+def test_rate_limit_is_retried_after_retry_after(server):
+    start = time.perf_counter()
+    items = prefetch(server, ["rate-limited"], backoff_base=10.0)
+    assert items[0]["code"] == POLICY
+    assert sum("rate-limited" in context for context in server.requests) == 2
+    # Retry-After: 0 wins over the 10 s exponential backoff
+    assert time.perf_counter() - start < 5.0
+
+
+def test_failures_become_error_items(server, tmp_path):
+    cache = PolicyCache(str(tmp_path / "cache.sqlite"))
+    items = prefetch(server, ["empty", "bad-request", "fine"], policy_cache=cache)
+    assert [item["id"] for item in items] == [0, 1, 2]
+    assert items[0]["code"] is None and items[0]["error"]
+    assert items[1]["code"] is None and "bad request" in items[1]["error"]
+    assert items[2]["code"] == POLICY and items[2]["cache_hit"] is False
+    assert len(cache) == 1  # Failures are never cached
+
+
+def test_cache_errors_become_error_items(server, tmp_path):
+    cache = PolicyCache(str(tmp_path / "cache.sqlite"))
+    os.remove(cache.path)
+    os.mkdir(cache.path)  # sqlite3 can no longer open it
+    items = prefetch(server, ["fine", "fine too"], policy_cache=cache)
+    assert [item["id"] for item in items] == [0, 1]
+    assert all(item["code"] is None and item["error"] for item in items)
+
+
+def test_prefetcher_and_agent_share_cache_entries(server, tmp_path):
+    cache = PolicyCache(str(tmp_path / "cache.sqlite"))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    agent = LLMAgent(policy_cache=cache, backend=OpenAICompatibleBackend("stub-model", base_url, "test"))
+    agent.generate_policy("fine", {})
+    agent.close()
+
+    items = prefetch(server, ["fine"], policy_cache=cache)
+    assert items[0]["cache_hit"] is True
+    assert len(server.requests) == 1
+
+
+def test_batch_calls_count_once_and_keep_their_own_cache_entries(tmp_path):
+    class CountingBackend(MockBackend):
+        batches = 0
+
+        def complete_batch(self, system_prompt, contexts):
+            self.batches += 1
+            return super().complete_batch(system_prompt, contexts)
+
+        def reply_source(self, batch=False):
+            return "batch" if batch else "single"
+
+    cache = PolicyCache(str(tmp_path / "cache.sqlite"))
+    agent = LLMAgent(policy_cache=cache, backend=CountingBackend())
+    policies = agent.generate_policies([("a", {}), ("b", {}), ("a", {}), ("c", {})])
+    assert agent.backend.batches == 1
+    assert [latency is not None for _, _, latency in policies] == [True, False, False, False]
+    assert all(cache_hit is False for _, cache_hit, _ in policies)
+
+    # A single request is a different request shape: the batch's replies are not reused for it
+    agent.generate_policy("a", {})
+    assert agent.last_cache_hit is False
+    assert [cache_hit for _, cache_hit, _ in agent.generate_policies([("a", {})])] == [True]
+
+    # Re-running the batch run's episodes (recording, replay, run-one) gets its policies back
+    replayer = LLMAgent(policy_cache=cache, backend=CountingBackend(), replay_source="batch")
+    replayer.generate_policy("b", {})
+    assert replayer.last_cache_hit is True
+
+
+def test_a_cached_run_needs_no_api_key(server, tmp_path, monkeypatch):
+    cache = PolicyCache(str(tmp_path / "cache.sqlite"))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    agent = LLMAgent(policy_cache=cache, backend=OpenAICompatibleBackend("stub-model", base_url, "test"))
+    agent.generate_policy("fine", {})
+    agent.close()
+
+    monkeypatch.delenv("GROQ_KEY", raising=False)
+    monkeypatch.setattr("lmp_driver.backends.load_env", lambda: None)
+    keyless = LLMAgent(policy_cache=cache, backend=make_backend("groq", "stub-model", base_url))
+    assert keyless.generate_policy("fine", {}) == POLICY
+    with pytest.raises(ValueError, match="GROQ_KEY"):
+        keyless.generate_policy("other", {})
+
+    monkeypatch.setattr("lmp_driver.pipeline.load_env", lambda: None)
+    items = list(PolicyPrefetcher(model_name="stub-model", base_url=base_url, policy_cache=cache)
+                 .start([("1", "fine", {}), ("2", "other", {})]))
+    assert items[0]["cache_hit"] is True and "GROQ_KEY" in items[1]["error"]
+    assert len(server.requests) == 1
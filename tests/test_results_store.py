@@ -0,0 +1,75 @@
+"""
+ResultsStore recovery from a torn last line; RunningSummary memory bounds, early stops and policy failures.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.results_store import Reservoir, ResultsStore, RunningSummary
+from lmp_driver.termination import episode_success
+
+
+def test_append_after_a_torn_line_starts_a_new_one(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    store = ResultsStore(path)
+    store.append({"id": "1"})
+    store.close()
+    with open(path, "a") as f:
+        f.write('{"id": "2", "succ')  # Crash mid-write
+
+    store = ResultsStore(path)
+    assert [r["id"] for r in store.load()] == ["1"]
+    store.append({"id": "3"})
+    store.close()
+    assert [r["id"] for r in ResultsStore(path).load()] == ["1", "3"]
+
+
+def test_reservoir_is_bounded_and_exact_below_its_size():
+    small = Reservoir(size=100)
+    for value in range(50):
+        small.add(value)
+    assert small.values == list(range(50))
+
+    large = Reservoir(size=100)
+    for value in range(100000):
+        large.add(value)
+    assert len(large) == 100000
+    assert len(large.values) == 100
+    # A uniform sample: its median is near the stream's
+    assert 30000 < sorted(large.values)[50] < 70000
+
+
+def test_early_stops_are_left_out_of_the_outcome_figures():
+    def result(crashed, termination, distance):
+        return {"crashed": crashed, "termination": termination, "avg_speed": 20.0, "distance": distance,
+                "expected_risk": "High"}
+
+    summary = RunningSummary([result(False, "time_limit", 800.0), result(True, "done", 100.0),
+                              result(False, "steady_state", 50.0), result(True, "crash", 60.0)]).summary()
+    assert summary["total_scenarios"] == 4
+    assert summary["early_stopped"] == 1
+    assert summary["success_rate"] == "33.3%"
+    assert summary["collision_rate"] == "66.7%"
+    assert summary["high_risk_survival_rate"] == "33.3%"
+    assert summary["distance_covered_m"] == 960.0
+
+
+def test_policy_timeouts_and_errors_are_failures_not_successes():
+    def result(crashed, termination, avg_speed, distance):
+        return {"crashed": crashed, "termination": termination, "avg_speed": avg_speed, "distance": distance,
+                "success": episode_success(crashed, termination)}
+
+    results = [result(False, "policy_timeout", 0.0, 0.0), result(False, "runtime_error", 0.0, 0.0),
+               result(False, "time_limit", 20.0, 800.0), result(True, "done", 10.0, 100.0)]
+    assert [r["success"] for r in results] == [False, False, True, False]
+
+    summary = RunningSummary(results).summary()
+    assert summary["policy_failures"] == 2
+    assert summary["success_rate"] == "50.0%"
+    assert summary["collision_rate"] == "50.0%"
+    assert summary["average_speed_mps"] == 15.0
+    assert summary["distance_covered_m"] == 900.0
+
+    only_failures = RunningSummary(results[:2]).summary()
+    assert only_failures["success_rate"] == "N/A" and only_failures["collision_rate"] == "N/A"
@@ -0,0 +1,44 @@
+"""
+CostModel.save: periodic, concurrent read-merge-writes keep every run's entries;
+CostModel.observe: untimed (video) runs leave the timings alone.
+"""
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmp_driver.scheduler import CostModel
+
+FEATURES = ("highway-v0", 1.0, "Day", "Clear")
+
+
+def observe_and_save(job):
+    path, shard = job
+    model = CostModel.load(path)
+    for i in range(20):
+        model.observe({"id": f"{shard}-{i}", "steps": 40, "sim_time_s": 1.0 + i}, FEATURES)
+        model.save(path)
+    return len(model.observed)
+
+
+def test_concurrent_periodic_saves_keep_every_entry(tmp_path):
+    path = str(tmp_path / "costs.json")
+    with Pool(4) as pool:
+        unsaved = pool.map(observe_and_save, [(path, shard) for shard in range(4)])
+    assert unsaved == [0, 0, 0, 0]
+
+    with open(path) as f:
+        scenarios = json.load(f)["scenarios"]
+    assert len(scenarios) == 80
+
+
+def test_untimed_runs_keep_only_their_step_counts():
+    model = CostModel()
+    model.observe({"id": "1", "steps": 40, "sim_time_s": 2.0}, FEATURES)
+    model.observe({"id": "1", "steps": 40, "sim_time_s": 9.0}, FEATURES, timed=False)
+    assert model.history["1"]["sim_time_s"] == 2.0  # Same episode: the headless timing still holds
+
+    model.observe({"id": "1", "steps": 25, "sim_time_s": 9.0}, FEATURES, timed=False)
+    assert model.history["1"] == {"features": list(FEATURES), "steps": 25}